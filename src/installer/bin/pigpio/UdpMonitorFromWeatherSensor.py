@@ -1,15 +1,28 @@
 import os
+import asyncio
+import json
 import logging
 import signal
 import socket
-from datetime import datetime
 import db.weatherdb as wdb
+from psycopg2 import OperationalError
+from db.weatherbuffer import (WeatherBuffer, SpoolReplayer,
+                              DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL, DEFAULT_REPLAY_INTERVAL)
+from db.spool import WeatherSpool, DEFAULT_SEGMENT_RECORDS
+from db.partition import WeatherPartitioner, DEFAULT_MONTHS_AHEAD
+from db.summary import WeatherSummary
+from receiver.clock import ReceiveClock
+from receiver.packet import PacketParser
+from receiver.asyncudp import run_async, DEFAULT_QUEUE_SIZE
+from receiver.stats import IngestStats, StatsReporter, DEFAULT_STATS_INTERVAL
+from receiver.supervisor import Supervisor
 from log import logsetting
 from database.pgdatabase import PgDatabase 
 
 """
 raspi-4 UDP packet Monitor from ESP Weather sensors With Insert sensors_pgdb on PostgreSQL
 [UDP port] 2222
+[Supervisor mode] conf/ingest.json "workers" > 1 (with "unicast": true) or multiple "bind" addresses
 """
 
 # args option default
@@ -17,8 +30,15 @@ WEATHER_UDP_PORT = 2222
 BUFF_SIZE = 1024
 PATH_CONF = os.path.join(os.environ.get("PATH_LOGGER_CONF", os.path.expanduser("~/bin/pigpio/conf")))
 PATH_DBCONN_FILE = os.path.join(PATH_CONF, "dbconf.json")
+PATH_INGEST_CONF_FILE = os.path.join(PATH_CONF, "ingest.json")
 
 isLogLevelDebug = False
+# sync mode stats reporter
+stats_reporter = None
+# sync mode: set by SIGTERM, receive loop stops and cleanup flushes buffer
+stop_requested = False
+# sync mode: max seconds to wait for packet before checking stop_requested
+STOP_CHECK_INTERVAL = 1.0
 
 
 def detect_signal(signum, frame):
@@ -28,64 +48,196 @@ def detect_signal(signum, frame):
     :param frame: frame
     :return:
     """
+    global stop_requested
     logger.info("signum: {}, frame: {}".format(signum, frame))
     if signum == signal.SIGTERM or signum == signal.SIGSTOP:
-        # signal shutdown
-        cleanup()
-        # Current process terminate
-        exit(0)
+        # signal shutdown: Stop receive loop, cleanup in run_worker finally.
+        # ※ Not exit() here, SystemExit inside flush would lose the batch taken from buffer.
+        stop_requested = True
 
 
 def cleanup():
+    # Drain buffered readings before close connection.
+    try:
+        weather_buffer.flush()
+    except Exception as err:
+        logger.warning("flush at cleanup: {}".format(err))
+    spool_replayer.stop()
+    weather_spool.close()
     pgdb.close()
     udp_client.close()
+    if stats_reporter is not None:
+        stats_reporter.report()
+
+
+def load_ingest_conf():
+    """
+    Load ingest configuration, if not exists then default.
+    :return: dict
+    """
+    conf = {"mode": "sync",
+            "batch_size": DEFAULT_BATCH_SIZE, "flush_interval": DEFAULT_FLUSH_INTERVAL,
+            "queue_size": DEFAULT_QUEUE_SIZE, "stats_interval": DEFAULT_STATS_INTERVAL,
+            "spool_dir": "~/data/spool", "spool_segment_records": DEFAULT_SEGMENT_RECORDS,
+            "replay_interval": DEFAULT_REPLAY_INTERVAL,
+            "device_auto_register": True, "device_negative_ttl": wdb.DEFAULT_NEGATIVE_TTL,
+            "device_refresh_interval": wdb.DEFAULT_REFRESH_INTERVAL,
+            "partition_months_ahead": DEFAULT_MONTHS_AHEAD,
+            "workers": 1, "unicast": False, "bind": [{"host": "", "port": WEATHER_UDP_PORT}]}
+    if os.path.exists(PATH_INGEST_CONF_FILE):
+        with open(PATH_INGEST_CONF_FILE, 'r') as fp:
+            conf.update(json.load(fp))
+    return conf
 
 
-def loop(client, conn):
+def loop(client, buffer, reporter):
     server_ip = ''
-    while True:
-        data, addr = client.recvfrom(BUFF_SIZE)
+    parser = PacketParser(BUFF_SIZE)
+    clock = ReceiveClock()
+    stats = reporter.stats
+    while not stop_requested:
+        # Wait until time window of buffer expired or stats report.
+        timeout = min(reporter.seconds_until_report(), STOP_CHECK_INTERVAL)
+        remain = buffer.seconds_until_flush()
+        if remain is not None and remain < timeout:
+            timeout = remain
+        client.settimeout(timeout)
+        try:
+            nbytes, addr = parser.recv(client)
+            # Timestamp at received time, not at DB-write time.
+            received = clock.time()
+        except socket.timeout:
+            stats.inserted += buffer.flush_if_expired()
+            reporter.report_if_due()
+            continue
+
         if server_ip != addr:
             server_ip = addr
             logger.info("server ip: {}".format(server_ip))
 
+        stats.received += 1
         # from ESP output: device_name, temp_out, temp_in, humid, pressure
-        line = data.decode("utf-8")
-        record = line.split(",")
-        # Insert weather DB with local time
         if isLogLevelDebug:
-            logger.debug(line)
-        # PostgreSQL timestamp.
-        now_timestamp = datetime.now()
-        s_timestamp = now_timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        wdb.insert(*record, measurement_time=s_timestamp, conn=conn, logger=logger)
+            logger.debug(parser.view[:nbytes].tobytes())
+        # Insert weather DB with local time
+        try:
+            stats.inserted += buffer.append(parser.parse(nbytes, received))
+        except ValueError as err:
+            stats.invalid += 1
+            logger.warning(err)
+        stats.inserted += buffer.flush_if_expired()
+        reporter.report_if_due()
 
 
-if __name__ == '__main__':
-    # PostgreSQL database
-    global pgdb
+def create_socket(address, reuse_port=False):
+    """
+    Create UDP socket bound to address.
+    :param address: (host, port)
+    :param reuse_port: if True then SO_REUSEPORT (shared port by worker processes)
+    :return: socket
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(address)
+    return sock
 
-    logger = logsetting.create_logger("service_weather") # only fileHandler
-    isLogLevelDebug = logger.getEffectiveLevel() <= logging.DEBUG
-    signal.signal(signal.SIGTERM, detect_signal)
 
-    hostname = socket.gethostname()
-    # Receive broadcast.
-    broad_address = ("", WEATHER_UDP_PORT)
-    logger.info("{}: {}".format(hostname, broad_address))
+def run_worker(address, worker_id=None, reuse_port=False, health_queue=None):
+    """
+    Receive UDP packets on address and insert into weather DB until SIGTERM.
+    :param address: (host, port)
+    :param worker_id: worker id in supervisor mode or None (single process)
+    :param reuse_port: if True then SO_REUSEPORT
+    :param health_queue: multiprocessing.Queue to supervisor or None
+    """
+    global pgdb, udp_client, weather_buffer, weather_spool, spool_replayer, stats_reporter
+
+    signal.signal(signal.SIGTERM, detect_signal)
+    logger.info("{}: {}, worker: {}".format(hostname, address, worker_id))
     # UDP client
-    udp_client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    udp_client.bind(broad_address)
-    
+    udp_client = create_socket(address, reuse_port=reuse_port)
+
     # Insert immediately commit.
-    pgdb = PgDatabase(PATH_DBCONN_FILE, hostname, readonly=False, autocommit=True, logger=logger);
-    conn = pgdb.get_connection()
+    pgdb = PgDatabase(PATH_DBCONN_FILE, hostname, readonly=False, autocommit=True, logger=logger,
+                      lazy=True)
+    # Readings are spooled while PostgreSQL is unavailable, and replayed after reconnect.
+    spool_dir = ingest_conf["spool_dir"]
+    if worker_id is not None:
+        spool_dir = os.path.join(spool_dir, "worker_{}".format(worker_id))
+    weather_spool = WeatherSpool(spool_dir,
+                                 segment_records=ingest_conf["spool_segment_records"],
+                                 logger=logger)
+    # t_device cache shared by buffer and spool replay
+    device_registry = wdb.DeviceRegistry(auto_register=ingest_conf["device_auto_register"],
+                                         negative_ttl=ingest_conf["device_negative_ttl"],
+                                         refresh_interval=ingest_conf["device_refresh_interval"],
+                                         logger=logger)
+    # Monthly partitions of t_weather, if partitioned table.
+    partitioner = WeatherPartitioner(months_ahead=ingest_conf["partition_months_ahead"],
+                                     logger=logger)
+    # Derived tables of t_weather (calendar etc.) updated with inserted rows.
+    summary = WeatherSummary(logger=logger)
+    spool_replayer = SpoolReplayer(pgdb, weather_spool, interval=ingest_conf["replay_interval"],
+                                   registry=device_registry, partitioner=partitioner,
+                                   summary=summary, logger=logger)
+    # Flush as one multi-row INSERT when row count or time window reached.
+    weather_buffer = WeatherBuffer(pgdb,
+                                   batch_size=ingest_conf["batch_size"],
+                                   flush_interval=ingest_conf["flush_interval"],
+                                   spool=weather_spool,
+                                   registry=device_registry,
+                                   partitioner=partitioner,
+                                   summary=summary,
+                                   logger=logger)
     try:
+        pgdb.connect()
         # load device cache
-        wdb.load_device_cache(conn=conn, logger=logger)
-        loop(udp_client, conn)
+        device_registry.load(pgdb.get_connection())
+        partitioner.ensure(pgdb.get_connection())
+    except OperationalError as err:
+        # Start without database, SpoolReplayer connects later.
+        logger.warning(err)
+    spool_replayer.start()
+    try:
+        if ingest_conf["mode"] == "async":
+            # Receiver never blocks on database, SIGTERM handled in event loop.
+            asyncio.run(run_async(udp_client, weather_buffer,
+                                  queue_size=ingest_conf["queue_size"],
+                                  stats_interval=ingest_conf["stats_interval"],
+                                  worker_id=worker_id,
+                                  health_queue=health_queue,
+                                  logger=logger))
+        else:
+            stats_reporter = StatsReporter(IngestStats(), interval=ingest_conf["stats_interval"],
+                                           worker_id=worker_id, health_queue=health_queue,
+                                           logger=logger)
+            loop(udp_client, weather_buffer, stats_reporter)
     except KeyboardInterrupt:
         pass
     finally:
-        pgdb.close()
         cleanup()
+
+
+if __name__ == '__main__':
+    logger = logsetting.create_logger("service_weather") # only fileHandler
+    isLogLevelDebug = logger.getEffectiveLevel() <= logging.DEBUG
+
+    hostname = socket.gethostname()
+    ingest_conf = load_ingest_conf()
+    logger.info("ingest_conf: {}".format(ingest_conf))
+    # Receive broadcast.
+    bind_addresses = [(bind["host"], bind["port"]) for bind in ingest_conf["bind"]]
+    if ingest_conf["workers"] > 1 and not ingest_conf["unicast"]:
+        # A broadcast datagram is delivered to every SO_REUSEPORT socket,
+        # each worker would insert the same reading with its own receive time.
+        logger.warning("workers: {} requires unicast sensors, run 1 worker per address.".format(
+            ingest_conf["workers"]))
+        ingest_conf["workers"] = 1
+    if ingest_conf["workers"] > 1 or len(bind_addresses) > 1:
+        # Worker processes per address, each with own connection and buffer.
+        supervisor = Supervisor(run_worker, bind_addresses, workers=ingest_conf["workers"],
+                                health_interval=ingest_conf["stats_interval"], logger=logger)
+        supervisor.run()
+    else:
+        run_worker(bind_addresses[0])
@@ -0,0 +1,92 @@
+import random
+import socket
+import time
+from receiver.packet import pack_binary
+
+"""
+Synthetic ESP weather sensor packet generator for ingest benchmark.
+"""
+
+DEVICE_NAME = "bench_{:03d}"
+MALFORMED_PACKET = b"bench,malformed"
+# Pre-generated packets cycled by sender
+PACKET_POOL_SIZE = 1024
+# Packets sent between pacing checks
+BURST = 32
+
+
+def device_names(devices):
+    return [DEVICE_NAME.format(i) for i in range(devices)]
+
+
+class PacketBlaster(object):
+    def __init__(self, address, names, rate=1000, malformed_ratio=0.0, binary=False, seed=None):
+        """
+        :param address: receiver (host, port)
+        :param names: device name list, sent in round robin
+        :param rate: packets per second, if 0 then as fast as possible
+        :param malformed_ratio: ratio of malformed packets (0.0 - 1.0)
+        :param binary: if True then binary packet else text packet
+        :param seed: random seed of sensor values
+        """
+        self.address = address
+        self.names = names
+        self.rate = rate
+        self.malformed_ratio = malformed_ratio
+        self.binary = binary
+        self._random = random.Random(seed)
+        # Send errors (ENOBUFS etc.)
+        self.send_errors = 0
+
+    def _packet(self, name):
+        temp_out = round(self._random.uniform(-10.0, 35.0), 1)
+        temp_in = round(self._random.uniform(10.0, 30.0), 1)
+        humid = round(self._random.uniform(20.0, 90.0), 1)
+        pressure = round(self._random.uniform(990.0, 1030.0), 1)
+        if self.binary:
+            return pack_binary(name, temp_out, temp_in, humid, pressure)
+        return "{},{},{},{},{}".format(name, temp_out, temp_in, humid, pressure).encode("utf-8")
+
+    def _packet_pool(self):
+        packets = []
+        for i in range(PACKET_POOL_SIZE):
+            if self._random.random() < self.malformed_ratio:
+                packets.append(MALFORMED_PACKET)
+            else:
+                packets.append(self._packet(self.names[i % len(self.names)]))
+        return packets
+
+    def run(self, duration):
+        """
+        Send packets at rate for duration.
+        :param duration: seconds
+        :return: sent packet count
+        """
+        packets = self._packet_pool()
+        pool_size = len(packets)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sent = 0
+        start = time.monotonic()
+        end = start + duration
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= end:
+                    break
+                if self.rate > 0:
+                    due = int((now - start) * self.rate)
+                    if sent >= due:
+                        time.sleep(min((sent + 1) / self.rate + start - now, end - now))
+                        continue
+                    count = min(due - sent, BURST)
+                else:
+                    count = BURST
+                for _ in range(count):
+                    try:
+                        sock.sendto(packets[sent % pool_size], self.address)
+                    except OSError:
+                        self.send_errors += 1
+                    sent += 1
+        finally:
+            sock.close()
+        return sent
@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import socket
+import time
+import db.weatherdb as wdb
+import UdpMonitorFromWeatherSensor as monitor
+from database.pgdatabase import PgDatabase
+from receiver.asyncudp import run_async
+from receiver.stats import IngestStats, StatsReporter
+from .blaster import PacketBlaster, device_names
+from .sink import LatencyRecorder, TimedWeatherBuffer, MemorySinkBuffer
+
+"""
+Ingest throughput benchmark: packet blaster -> receiver process -> in-memory sink or PostgreSQL
+[usage] cd ~/bin/pigpio
+  python -m bench.ingest_bench --rates 1000,5000,20000 --duration 10 --devices 10 --malformed 0.01
+  python -m bench.ingest_bench --mode sync --db
+※ --db inserts into weather DB of conf/dbconf.json with existing t_device names, use a test database.
+[output] per rate: sent/received pps, kernel drops (/proc/net/udp), queue drops,
+  p50/p99 latency (receive to insert completed), receiver CPU milliseconds per 1k packets
+"""
+
+BENCH_PORT = 22222
+# Seconds to wait receiver catch up after blast
+DEFAULT_DRAIN = 3.0
+# Receiver never reports during benchmark
+STATS_INTERVAL = 86400
+# Seconds to wait receiver result after SIGTERM
+RESULT_TIMEOUT = 60
+
+
+def udp_drops(port):
+    """
+    Kernel drop count of UDP sockets bound to port.
+    :param port: local port
+    :return: drops or if /proc/net/udp not exists then None
+    """
+    total = None
+    for path in ("/proc/net/udp", "/proc/net/udp6"):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as fp:
+            next(fp)
+            for line in fp:
+                fields = line.split()
+                if int(fields[1].split(":")[1], 16) == port:
+                    total = (total or 0) + int(fields[-1])
+    return total
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _receiver(address, args, ready, result_queue):
+    """ Benchmark receiver process, run until SIGTERM and put result. """
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.ERROR)
+    sock = monitor.create_socket(address)
+    recorder = LatencyRecorder()
+    if args.db:
+        pgdb = PgDatabase(monitor.PATH_DBCONN_FILE, socket.gethostname(), autocommit=True)
+        registry = wdb.DeviceRegistry(auto_register=False)
+        registry.load(pgdb.get_connection())
+        buffer = TimedWeatherBuffer(pgdb, recorder, batch_size=args.batch_size,
+                                    flush_interval=args.flush_interval, registry=registry)
+    else:
+        buffer = MemorySinkBuffer(recorder, insert_delay=args.insert_delay,
+                                  batch_size=args.batch_size, flush_interval=args.flush_interval)
+    # CPU time of receiving only, without imports and connect
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_start = usage.ru_utime + usage.ru_stime
+    ready.set()
+    if args.mode == "async":
+        stats = asyncio.run(run_async(sock, buffer, queue_size=args.queue_size,
+                                      stats_interval=STATS_INTERVAL))
+    else:
+        signal.signal(signal.SIGTERM, _interrupt)
+        monitor.logger = logger
+        reporter = StatsReporter(IngestStats(), interval=STATS_INTERVAL)
+        try:
+            monitor.loop(sock, buffer, reporter)
+        except KeyboardInterrupt:
+            reporter.stats.inserted += buffer.flush()
+        stats = reporter.stats
+    sock.close()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    result = stats.to_dict()
+    result["cpu"] = usage.ru_utime + usage.ru_stime - cpu_start
+    result["p50"] = recorder.percentile(50)
+    result["p99"] = recorder.percentile(99)
+    result_queue.put(result)
+
+
+def run_bench(rate, args):
+    """
+    Run one benchmark at rate.
+    :return: result dict
+    """
+    address = ("127.0.0.1", args.port)
+    ready = multiprocessing.Event()
+    result_queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_receiver, args=(address, args, ready, result_queue))
+    proc.start()
+    if not ready.wait(30):
+        proc.terminate()
+        raise RuntimeError("receiver not ready")
+
+    if args.db:
+        names = device_names_in_db(args.devices)
+    else:
+        names = device_names(args.devices)
+    blaster = PacketBlaster(address, names, rate=rate, malformed_ratio=args.malformed,
+                            binary=args.binary)
+    start = time.monotonic()
+    sent = blaster.run(args.duration)
+    elapsed = time.monotonic() - start
+    time.sleep(args.drain)
+    kernel_drops = udp_drops(args.port)
+    proc.terminate()
+    try:
+        result = result_queue.get(timeout=RESULT_TIMEOUT)
+        timed_out = False
+    except queue.Empty:
+        # Receiver did not stop (ex. blocked in database insert): no receiver stats
+        result = {}
+        timed_out = True
+        proc.kill()
+    proc.join()
+
+    received = result.get("received", 0)
+    cpu = result.get("cpu")
+    result.update({"rate": rate, "sent": sent, "send_errors": blaster.send_errors,
+                   "sent_pps": sent / elapsed, "received_pps": received / elapsed,
+                   "kernel_drops": kernel_drops, "timed_out": timed_out,
+                   "loss": 1.0 - received / sent if sent > 0 and not timed_out else None,
+                   "cpu_ms_per_1k": cpu * 1000.0 / received * 1000.0
+                   if cpu is not None and received > 0 else None})
+    return result
+
+
+def device_names_in_db(devices):
+    """ Existing device names in t_device (benchmark does not register devices) """
+    pgdb = PgDatabase(monitor.PATH_DBCONN_FILE, socket.gethostname(), readonly=True)
+    try:
+        names = sorted(wdb.all_devices(pgdb.get_connection()).keys())
+    finally:
+        pgdb.close()
+    if len(names) == 0:
+        raise RuntimeError("t_device is empty")
+    return names[:devices]
+
+
+def _ms(seconds):
+    return "-" if seconds is None else "{:.1f}".format(seconds * 1000.0)
+
+
+def print_result(result):
+    if result.get("timed_out"):
+        print("rate {:>7}: sent {} ({:.0f} pps), receiver result timed out".format(
+            result.get("rate"), result.get("sent", 0), result.get("sent_pps", 0.0)))
+        print("  drops kernel: {}, send errors: {}".format(
+            result.get("kernel_drops"), result.get("send_errors")))
+        return
+
+    loss = result.get("loss")
+    print("rate {:>7}: sent {} ({:.0f} pps), received {} ({:.0f} pps), loss {}".format(
+        result.get("rate"), result.get("sent", 0), result.get("sent_pps", 0.0),
+        result.get("received", 0), result.get("received_pps", 0.0),
+        "-" if loss is None else "{:.2%}".format(loss)))
+    print("  drops kernel: {}, queue: {}, send errors: {}, invalid: {}, inserted: {}".format(
+        result.get("kernel_drops"), result.get("dropped"), result.get("send_errors"),
+        result.get("invalid"), result.get("inserted")))
+    cpu = result.get("cpu_ms_per_1k")
+    print("  latency p50: {} ms, p99: {} ms, cpu: {} ms/1k packets".format(
+        _ms(result.get("p50")), _ms(result.get("p99")),
+        "-" if cpu is None else "{:.1f}".format(cpu)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP weather ingest benchmark")
+    parser.add_argument("--rates", default="1000,5000,10000",
+                        help="comma separated packets per second, 0 is unlimited")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--malformed", type=float, default=0.0, help="malformed packet ratio")
+    parser.add_argument("--binary", action="store_true", help="binary packet")
+    parser.add_argument("--mode", choices=("async", "sync"), default="async")
+    parser.add_argument("--db", action="store_true", help="insert into PostgreSQL")
+    parser.add_argument("--insert-delay", type=float, default=0.0,
+                        help="in-memory sink delay seconds per flush")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--drain", type=float, default=DEFAULT_DRAIN)
+    parser.add_argument("--port", type=int, default=BENCH_PORT)
+    args = parser.parse_args()
+
+    for rate in [int(rate) for rate in args.rates.split(",")]:
+        print_result(run_bench(rate, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import time
+from db.weatherbuffer import WeatherBuffer
+
+"""
+Benchmark buffers: record end-to-end latency (receive timestamp to flush completed).
+"""
+
+
+class LatencyRecorder(object):
+    def __init__(self):
+        # seconds
+        self.latencies = []
+
+    def record(self, records):
+        done = time.time()
+        self.latencies.extend(done - rec.measurement_time.timestamp() for rec in records)
+
+    def percentile(self, p):
+        """
+        Nearest-rank percentile.
+        :param p: 0 - 100
+        :return: seconds or if no record then None
+        """
+        if len(self.latencies) == 0:
+            return None
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, max(0, int(round(p / 100.0 * len(latencies))) - 1))
+        return latencies[index]
+
+
+class TimedWeatherBuffer(WeatherBuffer):
+    """ WeatherBuffer with PostgreSQL, latency recorded after insert """
+    def __init__(self, pgdb, recorder, **kwargs):
+        super().__init__(pgdb, **kwargs)
+        self.recorder = recorder
+
+    def flush(self):
+        records = self._records
+        inserted = super().flush()
+        self.recorder.record(records)
+        return inserted
+
+
+class MemorySinkBuffer(WeatherBuffer):
+    """ In-memory stand-in for database, optional fixed delay per flush """
+    def __init__(self, recorder, insert_delay=0.0, **kwargs):
+        super().__init__(None, **kwargs)
+        self.recorder = recorder
+        self.insert_delay = insert_delay
+
+    def flush(self):
+        if len(self._records) == 0:
+            return 0
+
+        records, self._records = self._records, []
+        self._first_time = None
+        if self.insert_delay > 0:
+            time.sleep(self.insert_delay)
+        self.recorder.record(records)
+        return len(records)
@@ -1,9 +1,11 @@
 import json
+import threading
 import psycopg2
 
 
 class PgDatabase(object):
-    def __init__(self, configfile, hostname, readonly=False, autocommit=False, logger=None):
+    def __init__(self, configfile, hostname, readonly=False, autocommit=False, logger=None,
+                 lazy=False):
         self.logger = logger
         with open(configfile, 'r') as fp:
             dbconf = json.load(fp)
@@ -12,18 +14,52 @@ class PgDatabase(object):
         dbconf["host"] = dbconf["host"].format(hostname=hostname) #"format(**{'hostname':hostname})
         if self.logger is not None:
             self.logger.debug(f"dbconf: {dbconf}")
+        self.dbconf = dbconf
+        self.readonly = readonly
+        self.autocommit = autocommit
+        # Serialize connection use between receiver and spool replay threads.
+        self.lock = threading.RLock()
+        self.conn = None
+        if not lazy:
+            self.connect()
+
+    def connect(self):
+        """
+        Connect to database.
+        :return: connection
+        :exception psycopg2.OperationalError: database is unavailable
+        """
         # default connection is itarable curosr
-        self.conn = psycopg2.connect(**dbconf)
-        self.conn.set_session(readonly=readonly, autocommit=autocommit)
+        self.conn = psycopg2.connect(**self.dbconf)
+        self.conn.set_session(readonly=self.readonly, autocommit=self.autocommit)
         if self.logger is not None:
             self.logger.info(self.conn)
+        return self.conn
+
+    def reconnect(self):
+        """
+        Close broken connection and connect again.
+        :return: connection
+        :exception psycopg2.OperationalError: database is unavailable
+        """
+        self.close()
+        self.conn = None
+        return self.connect()
+
+    def is_connected(self):
+        """
+        Check connection is open. (closed by server shutdown is detected after next query)
+        :return: if open then True
+        """
+        return self.conn is not None and self.conn.closed == 0
 
     def get_connection(self):
         return self.conn
 
     def close(self):
         if self.conn is not None:
-            self.logger.info("Close {} ".format(self.conn))
+            if self.logger is not None:
+                self.logger.info("Close {} ".format(self.conn))
             try:
                 self.conn.close()
             except:
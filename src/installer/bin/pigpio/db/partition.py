@@ -0,0 +1,114 @@
+import time
+from datetime import date
+from psycopg2 import DatabaseError
+
+"""
+Monthly partitions of weather.t_weather (upgrade sql: weather/partition-weather-sql)
+If t_weather is partitioned table, create partitions of current and upcoming months in advance.
+"""
+
+QUERY_WEATHER_RELKIND = """
+SELECT c.relkind FROM pg_class c INNER JOIN pg_namespace n ON c.relnamespace = n.oid
+WHERE n.nspname = 'weather' AND c.relname = 't_weather'
+"""
+CREATE_WEATHER_PARTITION = """
+CREATE TABLE IF NOT EXISTS weather.{name} PARTITION OF weather.t_weather
+ FOR VALUES FROM (%(from_date)s) TO (%(to_date)s)
+"""
+PARTITION_NAME = "t_weather_{:%Y%m}"
+
+# Upcoming months of partition created in advance
+DEFAULT_MONTHS_AHEAD = 2
+# Check partitions interval seconds
+DEFAULT_CHECK_INTERVAL = 3600.0
+
+
+def add_months(month, months):
+    """
+    :param month: first day of month (date)
+    :param months: months to add
+    :return: first day of month (date)
+    """
+    year, month_index = divmod(month.month - 1 + months, 12)
+    return date(month.year + year, month_index + 1, 1)
+
+
+def is_partitioned(conn):
+    """
+    Check t_weather is partitioned table (relkind 'p').
+    :param conn: Weather database connection
+    :return: if partitioned then True
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(QUERY_WEATHER_RELKIND)
+        rec = cursor.fetchone()
+    return rec is not None and rec[0] == 'p'
+
+
+def create_partition(conn, month, logger=None):
+    """
+    Create partition of month if not exists.
+    :param conn: Weather database connection (autocommit)
+    :param month: first day of month (date)
+    :param logger: application logger or None
+    """
+    name = PARTITION_NAME.format(month)
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_WEATHER_PARTITION.format(name=name),
+                       {'from_date': month, 'to_date': add_months(month, 1)})
+    if logger is not None:
+        logger.debug("partition: {}".format(name))
+
+
+class WeatherPartitioner(object):
+    """
+    Create monthly partitions ahead of ingest.
+    ※ Caller serializes access with the database connection lock.
+    """
+    def __init__(self, months_ahead=DEFAULT_MONTHS_AHEAD, check_interval=DEFAULT_CHECK_INTERVAL,
+                 logger=None):
+        """
+        :param months_ahead: upcoming months of partition
+        :param check_interval: check partitions interval seconds
+        :param logger: application logger or None
+        """
+        self.months_ahead = months_ahead
+        self.check_interval = check_interval
+        self.logger = logger
+        # None: not checked yet
+        self.partitioned = None
+        # Created (or existing) partition months
+        self._months = set()
+        self._checked_time = None
+
+    def ensure(self, conn):
+        """
+        Create partitions of current and upcoming months if check interval expired.
+        :param conn: Weather database connection (autocommit)
+        :exception DatabaseError: if connection is lost
+        """
+        if self._checked_time is not None and \
+                time.monotonic() - self._checked_time < self.check_interval:
+            return
+
+        if self.partitioned is None:
+            self.partitioned = is_partitioned(conn)
+            if self.logger is not None:
+                self.logger.info("t_weather partitioned: {}".format(self.partitioned))
+        if self.partitioned:
+            current = date.today().replace(day=1)
+            for i in range(self.months_ahead + 1):
+                month = add_months(current, i)
+                if month in self._months:
+                    continue
+                try:
+                    create_partition(conn, month, self.logger)
+                except DatabaseError as err:
+                    if conn.closed:
+                        raise
+                    # ex. rows of the month exist in default partition
+                    if self.logger is not None:
+                        self.logger.warning("create partition {}: {}".format(month, err))
+                    continue
+                self._months.add(month)
+        self._checked_time = time.monotonic()
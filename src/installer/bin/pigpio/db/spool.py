@@ -0,0 +1,188 @@
+import glob
+import math
+import mmap
+import os
+import struct
+from datetime import datetime
+from .weatherdb import WeatherReading
+
+"""
+Write-ahead spool for weather readings while PostgreSQL is unavailable.
+Append-only, memory-mapped segment files:
+  [header] magic(4s), version(H), reserved(H), record count(Q)
+  [record] device name(20s), measurement epoch(d), temp_out, temp_in, humid, pressure(f) ※None is NaN
+"""
+
+SPOOL_MAGIC = b"WSPL"
+SPOOL_VERSION = 1
+HEADER_FORMAT = struct.Struct("<4sHHQ")
+RECORD_FORMAT = struct.Struct("<20sdffff")
+# Device name field bytes (UTF-8), struct pads or truncates silently
+DEVICE_NAME_BYTES = 20
+SEGMENT_NAME = "weather_{:08d}.seg"
+# Default records per segment file (8192 * 44 byte = 352KB)
+DEFAULT_SEGMENT_RECORDS = 8192
+
+
+def _to_epoch(measurement_time):
+    if isinstance(measurement_time, datetime):
+        return measurement_time.timestamp()
+    return datetime.strptime(measurement_time, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def _to_nan(value):
+    return math.nan if value is None else value
+
+
+def _from_nan(value):
+    return None if math.isnan(value) else value
+
+
+class _Segment(object):
+    def __init__(self, path, capacity):
+        self.path = path
+        exists = os.path.exists(path)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if not exists:
+            os.ftruncate(self.fd, HEADER_FORMAT.size + capacity * RECORD_FORMAT.size)
+        self.mm = mmap.mmap(self.fd, 0)
+        if exists:
+            magic, version, _, self.count = HEADER_FORMAT.unpack_from(self.mm, 0)
+            if magic != SPOOL_MAGIC or version != SPOOL_VERSION:
+                raise ValueError("invalid spool segment: {}".format(path))
+        else:
+            self.count = 0
+            self._write_header()
+        self.capacity = (len(self.mm) - HEADER_FORMAT.size) // RECORD_FORMAT.size
+
+    def _write_header(self):
+        HEADER_FORMAT.pack_into(self.mm, 0, SPOOL_MAGIC, SPOOL_VERSION, 0, self.count)
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def append(self, record):
+        """
+        :exception ValueError: device name longer than DEVICE_NAME_BYTES
+        """
+        name = record.device_name.encode("utf-8")
+        if len(name) > DEVICE_NAME_BYTES:
+            raise ValueError("device name too long for spool: {!r}".format(record.device_name))
+        RECORD_FORMAT.pack_into(self.mm, HEADER_FORMAT.size + self.count * RECORD_FORMAT.size,
+                                name,
+                                _to_epoch(record.measurement_time),
+                                _to_nan(record.temp_out), _to_nan(record.temp_in),
+                                _to_nan(record.humid), _to_nan(record.pressure))
+        self.count += 1
+
+    def sync(self):
+        # Count is updated after records, a crash between them loses only unsynced records.
+        self._write_header()
+        self.mm.flush()
+
+    def read_all(self):
+        records = []
+        for i in range(self.count):
+            name, epoch, temp_out, temp_in, humid, pressure = RECORD_FORMAT.unpack_from(
+                self.mm, HEADER_FORMAT.size + i * RECORD_FORMAT.size)
+            records.append(WeatherReading(name.rstrip(b"\0").decode("utf-8"),
+                                          datetime.fromtimestamp(epoch),
+                                          _from_nan(temp_out), _from_nan(temp_in),
+                                          _from_nan(humid), _from_nan(pressure)))
+        return records
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+
+class WeatherSpool(object):
+    def __init__(self, spool_dir, segment_records=DEFAULT_SEGMENT_RECORDS, logger=None):
+        """
+        :param spool_dir: spool directory, created if not exists
+        :param segment_records: records per segment file
+        :param logger: application logger or None
+        """
+        self.spool_dir = os.path.expanduser(spool_dir)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.segment_records = segment_records
+        self.logger = logger
+        self._active = None
+
+    def _segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.spool_dir, SEGMENT_NAME.replace("{:08d}", "*"))))
+
+    def _next_segment(self):
+        paths = self._segment_paths()
+        if len(paths) > 0:
+            last = paths[-1]
+            seq = int(os.path.basename(last)[len("weather_"):-len(".seg")])
+            segment = _Segment(last, self.segment_records)
+            if not segment.is_full():
+                return segment
+            segment.close()
+            seq += 1
+        else:
+            seq = 0
+        return _Segment(os.path.join(self.spool_dir, SEGMENT_NAME.format(seq)), self.segment_records)
+
+    def has_pending(self):
+        return len(self._segment_paths()) > 0
+
+    def append(self, records):
+        """
+        Append readings to active segment, and sync to disk.
+        Readings with device name longer than DEVICE_NAME_BYTES are discarded (logged).
+        :param records: list of WeatherReading
+        :return: spooled record count
+        """
+        spooled = 0
+        for record in records:
+            if self._active is None or self._active.is_full():
+                if self._active is not None:
+                    self._active.sync()
+                    self._active.close()
+                self._active = self._next_segment()
+            try:
+                self._active.append(record)
+                spooled += 1
+            except ValueError as err:
+                if self.logger is not None:
+                    self.logger.warning("{}, discarded: {}".format(err, record))
+        if self._active is not None:
+            self._active.sync()
+        if self.logger is not None:
+            self.logger.warning("spooled: {}".format(spooled))
+        return spooled
+
+    def replay(self, insert_func):
+        """
+        Load spooled segments in order, and delete segment after inserted.
+        :param insert_func: function(records) insert records, raise exception if failed
+        :return: replayed record count
+        :exception: insert_func exception, remaining segments are kept
+        """
+        if self._active is not None:
+            self._active.sync()
+            self._active.close()
+            self._active = None
+        replayed = 0
+        for path in self._segment_paths():
+            segment = _Segment(path, self.segment_records)
+            try:
+                records = segment.read_all()
+            finally:
+                segment.close()
+            if len(records) > 0:
+                insert_func(records)
+                replayed += len(records)
+            os.remove(path)
+            if self.logger is not None:
+                self.logger.info("replayed: {}, {}".format(len(records), path))
+        return replayed
+
+    def close(self):
+        if self._active is not None:
+            self._active.sync()
+            self._active.close()
+            self._active = None
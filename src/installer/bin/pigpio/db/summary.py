@@ -0,0 +1,223 @@
+from datetime import datetime
+from psycopg2 import DatabaseError
+from psycopg2.extras import execute_values
+
+"""
+Derived tables of t_weather, maintained per inserted batch by ingest.
+  t_weather_days: calendar of days with data per device (upgrade sql: weather/calendar-weather-sql)
+  t_weather_latest: latest reading per device (upgrade sql: weather/latest-weather-sql)
+  t_weather_hourly, t_weather_daily: sum, count, min, max, min/max time per hour/day
+    (upgrade sql: weather/rollup-weather-sql, rebuild by weather.rebuild_weather_rollup())
+A derived table that does not exist (upgrade sql not applied) is skipped.
+"""
+
+# Rollup metrics: {metric}_sum, {metric}_cnt, {metric}_min, {metric}_max,
+#  {metric}_min_time, {metric}_max_time
+ROLLUP_METRICS = ("temp_out", "temp_in", "humid", "pressure")
+
+QUERY_TABLE_EXISTS = "SELECT to_regclass(%(name)s) IS NOT NULL"
+UPSERT_WEATHER_DAYS = """
+INSERT INTO weather.t_weather_days(did, measurement_day) VALUES %s ON CONFLICT DO NOTHING
+"""
+# Replayed older readings never overwrite newer one.
+UPSERT_WEATHER_LATEST = """
+INSERT INTO weather.t_weather_latest(did, measurement_time, temp_out, temp_in, humid, pressure)
+ VALUES %s
+ ON CONFLICT (did) DO UPDATE SET
+  measurement_time = EXCLUDED.measurement_time,
+  temp_out = EXCLUDED.temp_out,
+  temp_in = EXCLUDED.temp_in,
+  humid = EXCLUDED.humid,
+  pressure = EXCLUDED.pressure
+ WHERE weather.t_weather_latest.measurement_time < EXCLUDED.measurement_time
+"""
+
+# Add batch aggregates to existing bucket. (LEAST/GREATEST ignore NULL)
+# min/max time follows the value only when the batch has a new min/max.
+UPSERT_WEATHER_ROLLUP = """
+INSERT INTO weather.{table}(did, bucket,
+ temp_out_sum, temp_out_cnt, temp_out_min, temp_out_max, temp_out_min_time, temp_out_max_time,
+ temp_in_sum, temp_in_cnt, temp_in_min, temp_in_max, temp_in_min_time, temp_in_max_time,
+ humid_sum, humid_cnt, humid_min, humid_max, humid_min_time, humid_max_time,
+ pressure_sum, pressure_cnt, pressure_min, pressure_max, pressure_min_time, pressure_max_time)
+ VALUES %s
+ ON CONFLICT (did, bucket) DO UPDATE SET
+  temp_out_sum = COALESCE(weather.{table}.temp_out_sum + EXCLUDED.temp_out_sum,
+    weather.{table}.temp_out_sum, EXCLUDED.temp_out_sum),
+  temp_out_cnt = weather.{table}.temp_out_cnt + EXCLUDED.temp_out_cnt,
+  temp_out_min = LEAST(weather.{table}.temp_out_min, EXCLUDED.temp_out_min),
+  temp_out_max = GREATEST(weather.{table}.temp_out_max, EXCLUDED.temp_out_max),
+  temp_out_min_time = CASE WHEN EXCLUDED.temp_out_min < weather.{table}.temp_out_min OR weather.{table}.temp_out_min IS NULL
+    THEN EXCLUDED.temp_out_min_time ELSE weather.{table}.temp_out_min_time END,
+  temp_out_max_time = CASE WHEN EXCLUDED.temp_out_max > weather.{table}.temp_out_max OR weather.{table}.temp_out_max IS NULL
+    THEN EXCLUDED.temp_out_max_time ELSE weather.{table}.temp_out_max_time END,
+  temp_in_sum = COALESCE(weather.{table}.temp_in_sum + EXCLUDED.temp_in_sum,
+    weather.{table}.temp_in_sum, EXCLUDED.temp_in_sum),
+  temp_in_cnt = weather.{table}.temp_in_cnt + EXCLUDED.temp_in_cnt,
+  temp_in_min = LEAST(weather.{table}.temp_in_min, EXCLUDED.temp_in_min),
+  temp_in_max = GREATEST(weather.{table}.temp_in_max, EXCLUDED.temp_in_max),
+  temp_in_min_time = CASE WHEN EXCLUDED.temp_in_min < weather.{table}.temp_in_min OR weather.{table}.temp_in_min IS NULL
+    THEN EXCLUDED.temp_in_min_time ELSE weather.{table}.temp_in_min_time END,
+  temp_in_max_time = CASE WHEN EXCLUDED.temp_in_max > weather.{table}.temp_in_max OR weather.{table}.temp_in_max IS NULL
+    THEN EXCLUDED.temp_in_max_time ELSE weather.{table}.temp_in_max_time END,
+  humid_sum = COALESCE(weather.{table}.humid_sum + EXCLUDED.humid_sum,
+    weather.{table}.humid_sum, EXCLUDED.humid_sum),
+  humid_cnt = weather.{table}.humid_cnt + EXCLUDED.humid_cnt,
+  humid_min = LEAST(weather.{table}.humid_min, EXCLUDED.humid_min),
+  humid_max = GREATEST(weather.{table}.humid_max, EXCLUDED.humid_max),
+  humid_min_time = CASE WHEN EXCLUDED.humid_min < weather.{table}.humid_min OR weather.{table}.humid_min IS NULL
+    THEN EXCLUDED.humid_min_time ELSE weather.{table}.humid_min_time END,
+  humid_max_time = CASE WHEN EXCLUDED.humid_max > weather.{table}.humid_max OR weather.{table}.humid_max IS NULL
+    THEN EXCLUDED.humid_max_time ELSE weather.{table}.humid_max_time END,
+  pressure_sum = COALESCE(weather.{table}.pressure_sum + EXCLUDED.pressure_sum,
+    weather.{table}.pressure_sum, EXCLUDED.pressure_sum),
+  pressure_cnt = weather.{table}.pressure_cnt + EXCLUDED.pressure_cnt,
+  pressure_min = LEAST(weather.{table}.pressure_min, EXCLUDED.pressure_min),
+  pressure_max = GREATEST(weather.{table}.pressure_max, EXCLUDED.pressure_max),
+  pressure_min_time = CASE WHEN EXCLUDED.pressure_min < weather.{table}.pressure_min OR weather.{table}.pressure_min IS NULL
+    THEN EXCLUDED.pressure_min_time ELSE weather.{table}.pressure_min_time END,
+  pressure_max_time = CASE WHEN EXCLUDED.pressure_max > weather.{table}.pressure_max OR weather.{table}.pressure_max IS NULL
+    THEN EXCLUDED.pressure_max_time ELSE weather.{table}.pressure_max_time END
+"""
+
+
+def table_exists(conn, name):
+    """
+    :param conn: Weather database connection
+    :param name: schema qualified table name
+    :return: if exists then True
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(QUERY_TABLE_EXISTS, {'name': name})
+        return cursor.fetchone()[0]
+
+
+def _to_datetime(measurement_time):
+    if isinstance(measurement_time, datetime):
+        return measurement_time
+    return datetime.strptime(measurement_time[:19], "%Y-%m-%d %H:%M:%S")
+
+
+def _to_day(measurement_time):
+    return _to_datetime(measurement_time).date()
+
+
+def _hour_bucket(measurement_time):
+    return _to_datetime(measurement_time).replace(minute=0, second=0, microsecond=0)
+
+
+def _day_bucket(measurement_time):
+    return _to_datetime(measurement_time).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# (table, bucket function)
+ROLLUP_TABLES = (("t_weather_hourly", _hour_bucket), ("t_weather_daily", _day_bucket))
+
+
+def aggregate(rows, bucket_func):
+    """
+    Aggregate rows per (did, bucket).
+    :param rows: t_weather rows (did, measurement_time, temp_out, temp_in, humid, pressure)
+    :param bucket_func: measurement_time to bucket timestamp
+    :return: list of (did, bucket, [sum, count, min, max, min time, max time] * metrics)
+    """
+    buckets = {}
+    for row in rows:
+        key = (row[0], bucket_func(row[1]))
+        values = buckets.get(key)
+        if values is None:
+            values = [None, 0, None, None, None, None] * len(ROLLUP_METRICS)
+            buckets[key] = values
+        for i, value in enumerate(row[2:]):
+            if value is None:
+                continue
+            pos = i * 6
+            values[pos] = value if values[pos] is None else values[pos] + value
+            values[pos + 1] += 1
+            if values[pos + 2] is None or value < values[pos + 2]:
+                values[pos + 2] = value
+                values[pos + 4] = _to_datetime(row[1])
+            if values[pos + 3] is None or value > values[pos + 3]:
+                values[pos + 3] = value
+                values[pos + 5] = _to_datetime(row[1])
+    return [key + tuple(values) for key, values in buckets.items()]
+
+
+class WeatherSummary(object):
+    """
+    Update derived tables with inserted rows.
+    ※ Caller serializes access with the database connection lock.
+    """
+    def __init__(self, logger=None):
+        self.logger = logger
+        # None: not checked yet
+        self.days_enabled = None
+        # (did, day) known in t_weather_days
+        self._days = set()
+        self.latest_enabled = None
+        self.rollup_enabled = None
+
+    def update(self, conn, rows):
+        """
+        Update derived tables.
+        :param conn: Weather database connection (autocommit)
+        :param rows: inserted t_weather rows (did, measurement_time, temp_out, temp_in, humid, pressure)
+        :exception DatabaseError: if connection is lost
+        """
+        if len(rows) == 0:
+            return
+
+        for update_table in (self._update_days, self._update_latest, self._update_rollups):
+            try:
+                update_table(conn, rows)
+            except DatabaseError as err:
+                if conn.closed:
+                    raise
+                if self.logger is not None:
+                    self.logger.warning("summary: {}".format(err))
+
+    def _update_days(self, conn, rows):
+        if self.days_enabled is None:
+            self.days_enabled = table_exists(conn, "weather.t_weather_days")
+            if self.logger is not None:
+                self.logger.info("t_weather_days: {}".format(self.days_enabled))
+        if not self.days_enabled:
+            return
+
+        days = {(row[0], _to_day(row[1])) for row in rows} - self._days
+        if len(days) == 0:
+            return
+        with conn.cursor() as cursor:
+            execute_values(cursor, UPSERT_WEATHER_DAYS, list(days))
+        self._days |= days
+
+    def _update_latest(self, conn, rows):
+        if self.latest_enabled is None:
+            self.latest_enabled = table_exists(conn, "weather.t_weather_latest")
+            if self.logger is not None:
+                self.logger.info("t_weather_latest: {}".format(self.latest_enabled))
+        if not self.latest_enabled:
+            return
+
+        # Latest row per device in batch
+        latest = {}
+        for row in rows:
+            current = latest.get(row[0])
+            if current is None or current[1] < row[1]:
+                latest[row[0]] = row
+        with conn.cursor() as cursor:
+            execute_values(cursor, UPSERT_WEATHER_LATEST, list(latest.values()))
+
+    def _update_rollups(self, conn, rows):
+        if self.rollup_enabled is None:
+            self.rollup_enabled = all(table_exists(conn, "weather." + table)
+                                      for table, _ in ROLLUP_TABLES)
+            if self.logger is not None:
+                self.logger.info("t_weather rollup: {}".format(self.rollup_enabled))
+        if not self.rollup_enabled:
+            return
+
+        with conn.cursor() as cursor:
+            for table, bucket_func in ROLLUP_TABLES:
+                execute_values(cursor, UPSERT_WEATHER_ROLLUP.format(table=table),
+                               aggregate(rows, bucket_func))
@@ -0,0 +1,164 @@
+import threading
+import time
+from psycopg2 import DatabaseError, InterfaceError
+from . import weatherdb as wdb
+
+"""
+Buffered ingest for t_weather: collect readings in memory and flush as one multi-row INSERT.
+If database write fails, readings are saved to spool and replayed after reconnect.
+"""
+
+# Flush when row count reached
+DEFAULT_BATCH_SIZE = 50
+# Flush when time window (seconds) elapsed since first buffered reading
+DEFAULT_FLUSH_INTERVAL = 30.0
+# Reconnect and replay spool interval seconds
+DEFAULT_REPLAY_INTERVAL = 30.0
+
+
+class WeatherBuffer(object):
+    def __init__(self, pgdb, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 spool=None, registry=None, partitioner=None, summary=None, logger=None):
+        """
+        :param pgdb: PgDatabase (autocommit connection)
+        :param batch_size: flush row count, if 1 then insert immediately (same as no buffering)
+        :param flush_interval: flush time window seconds
+        :param spool: WeatherSpool or None (discard readings if database write fails)
+        :param registry: DeviceRegistry or None (module default registry)
+        :param partitioner: WeatherPartitioner or None
+        :param summary: WeatherSummary or None
+        :param logger: application logger or None
+        """
+        self.pgdb = pgdb
+        self.spool = spool
+        self.registry = registry
+        self.partitioner = partitioner
+        self.summary = summary
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.logger = logger
+        self._records = []
+        # monotonic time of first buffered reading
+        self._first_time = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, record, flush=True):
+        """
+        Append reading record, and flush if row count reached.
+        :param record: WeatherReading
+        :param flush: if False then caller flushes when ready() (ex. in executor thread)
+        :return: flushed record count
+        """
+        if self._first_time is None:
+            self._first_time = time.monotonic()
+        self._records.append(record)
+        if flush and len(self._records) >= self.batch_size:
+            return self.flush()
+        return 0
+
+    def ready(self):
+        """
+        Check row count reached or time window expired.
+        :return: if need flush then True
+        """
+        if len(self._records) >= self.batch_size:
+            return True
+        remain = self.seconds_until_flush()
+        return remain is not None and remain <= 0.0
+
+    def seconds_until_flush(self):
+        """
+        Seconds until time window expired.
+        :return: if buffer empty then None
+        """
+        if self._first_time is None:
+            return None
+        return max(0.0, self._first_time + self.flush_interval - time.monotonic())
+
+    def flush_if_expired(self):
+        """
+        Flush if time window expired.
+        :return: flushed record count
+        """
+        remain = self.seconds_until_flush()
+        if remain is not None and remain <= 0.0:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """
+        Flush all buffered records to t_weather.
+        :return: inserted record count
+        """
+        if len(self._records) == 0:
+            return 0
+
+        records, self._records = self._records, []
+        self._first_time = None
+        with self.pgdb.lock:
+            if self.spool is not None and not self.pgdb.is_connected():
+                # Wait reconnect by SpoolReplayer
+                self.spool.append(records)
+                return 0
+            try:
+                conn = self.pgdb.get_connection()
+                if self.partitioner is not None:
+                    self.partitioner.ensure(conn)
+                inserted = wdb.insert_many(records, conn=conn, registry=self.registry,
+                                           summary=self.summary, logger=self.logger)
+            except (DatabaseError, InterfaceError) as err:
+                if self.logger is not None:
+                    self.logger.warning("flush error: {}".format(err))
+                if self.spool is None:
+                    return 0
+                self.spool.append(records)
+                return 0
+        if self.logger is not None:
+            self.logger.debug("flush: {}/{}".format(inserted, len(records)))
+        return inserted
+
+
+class SpoolReplayer(threading.Thread):
+    """ Background thread: reconnect database and load spooled readings in bulk """
+    def __init__(self, pgdb, spool, interval=DEFAULT_REPLAY_INTERVAL, registry=None,
+                 partitioner=None, summary=None, logger=None):
+        super().__init__(name="SpoolReplayer", daemon=True)
+        self.pgdb = pgdb
+        self.spool = spool
+        self.registry = registry
+        self.partitioner = partitioner
+        self.summary = summary
+        self.interval = interval
+        self.logger = logger
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.replay_once()
+
+    def replay_once(self):
+        """
+        Reconnect if connection is lost, and replay spool.
+        :return: replayed record count
+        """
+        with self.pgdb.lock:
+            if self.pgdb.is_connected() and not self.spool.has_pending():
+                return 0
+            try:
+                if not self.pgdb.is_connected():
+                    self.pgdb.reconnect()
+                conn = self.pgdb.get_connection()
+                if self.partitioner is not None:
+                    self.partitioner.ensure(conn)
+                return self.spool.replay(
+                    lambda records: wdb.insert_many(records, conn=conn, registry=self.registry,
+                                                    summary=self.summary, logger=self.logger))
+            except (DatabaseError, InterfaceError) as err:
+                if self.logger is not None:
+                    self.logger.warning("replay error: {}".format(err))
+                return 0
+
+    def stop(self):
+        self._stop_event.set()
@@ -1,4 +1,6 @@
+import time
 from psycopg2 import DatabaseError
+from psycopg2.extras import execute_values
 from .sqlite3conv import to_float
 
 """
@@ -22,53 +24,125 @@ INSERT INTO weather.t_weather(did, measurement_time, temp_out, temp_in, humid, p
  %(pressure)s
  )
 """
+# Multi-row insert: VALUES (...), (...), ... expanded by execute_values()
+INSERT_WEATHER_VALUES = """
+INSERT INTO weather.t_weather(did, measurement_time, temp_out, temp_in, humid, pressure) VALUES %s
+"""
 TRUNCATE_WEATHER = """
 TRUNCATE TABLE weather.t_weather;
 """
 
 # Global flag
 flag_truncating = False
-# t_device cache: {name: id}
-_cache_did_map = {}
-
 
-def load_device_cache(conn, logger):
-    _cache_did_map = all_devices(conn, logger)
-    if logger is not None:
-        logger.debug(_cache_did_map)
+# Unknown device name is not queried again while this seconds
+DEFAULT_NEGATIVE_TTL = 300.0
+# Reload all t_device records interval seconds
+DEFAULT_REFRESH_INTERVAL = 3600.0
 
 
-def get_did(conn, device_name, add_device=True, logger=None):
+class DeviceRegistry(object):
     """
-    Get the device ID corresponding to the device name.
-    1. if exist in cache, return from cache.
-    2. if not exist in cache, if exist in t_device return did
-    3. if not exist in t_device, insert into t_device and return did
-    :param conn: Weather Weather database connection
-    :param device_name: Device name
-    :param add_device: flag into t_device, if True then insert into t_device and cache
-    :param logger: application logger or None
-    :return: did
+    In-process t_device cache shared across the ingest path.
+    1. Preload all records in t_device, and reload periodically.
+    2. Unknown (or failed to register) device name is cached negatively with TTL.
+    ※ Caller serializes access with the database connection lock.
     """
-    try:
-        did = _cache_did_map[device_name]
-    except KeyError:
-        did = None
+    def __init__(self, auto_register=True, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL, logger=None):
+        """
+        :param auto_register: if True then insert unknown device into t_device
+        :param negative_ttl: negative cache TTL seconds
+        :param refresh_interval: reload t_device interval seconds
+        :param logger: application logger or None
+        """
+        self.auto_register = auto_register
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.logger = logger
+        # {name: id}
+        self._did_map = {}
+        # {name: expire monotonic time}
+        self._unknown_map = {}
+        self._loaded_time = None
+
+    def load(self, conn):
+        """
+        Load all records in t_device, and clear negative cache.
+        :param conn: Weather database connection
+        """
+        self._did_map = all_devices(conn, self.logger)
+        self._unknown_map = {}
+        self._loaded_time = time.monotonic()
+        if self.logger is not None:
+            self.logger.debug(self._did_map)
 
-    if did is not None:
-        return did
+    def _refresh_if_expired(self, conn):
+        if self._loaded_time is None or \
+                time.monotonic() - self._loaded_time >= self.refresh_interval:
+            self.load(conn)
 
-    did = find_device(conn, device_name, logger)
-    if did is not None:
-        _cache_did_map[device_name] = did
-        return did
+    def get_did(self, conn, device_name):
+        """
+        Get the device ID corresponding to the device name.
+        1. if exist in cache, return from cache.
+        2. if cached as unknown and not expired, return None.
+        3. if exist in t_device return did
+        4. if not exist in t_device and auto_register, insert into t_device and return did
+        :param conn: Weather database connection
+        :param device_name: Device name
+        :return: did or None (unknown device)
+        """
+        self._refresh_if_expired(conn)
+        did = self._did_map.get(device_name)
+        if did is not None:
+            return did
 
-    if not add_device:
+        expire = self._unknown_map.get(device_name)
+        if expire is not None:
+            if time.monotonic() < expire:
+                return None
+            del self._unknown_map[device_name]
+
+        did = find_device(conn, device_name, self.logger)
+        if did is None and self.auto_register:
+            did = add_device(conn, device_name, self.logger)
+            # add_device() return 0 if failed
+            if did == 0:
+                did = None
+        if did is not None:
+            self._did_map[device_name] = did
+            return did
+
+        self._unknown_map[device_name] = time.monotonic() + self.negative_ttl
+        if self.logger is not None:
+            self.logger.warning("Unknown device: {}, ignore while {} seconds".format(
+                device_name, self.negative_ttl))
         return None
 
-    did = add_device(conn, device_name, logger)
-    _cache_did_map[device_name] = did
-    return did
+
+# t_device cache for module functions
+_default_registry = DeviceRegistry()
+
+
+def load_device_cache(conn, logger):
+    _default_registry.logger = logger
+    _default_registry.load(conn)
+
+
+def get_did(conn, device_name, auto_register=True, logger=None):
+    """
+    Get the device ID corresponding to the device name with module default registry.
+    :param conn: Weather Weather database connection
+    :param device_name: Device name
+    :param auto_register: flag into t_device, if True then insert into t_device and cache
+    :param logger: application logger or None
+    :return: did or None
+    """
+    _default_registry.auto_register = auto_register
+    if logger is not None:
+        _default_registry.logger = logger
+    return _default_registry.get_did(conn, device_name)
 
 
 def all_devices(conn, logger=None):
@@ -147,6 +221,108 @@ def truncate(conn, logger=None):
             logger.info("Truncate finished.")
 
 
+class WeatherReading(object):
+    """ Buffered reading record """
+    __slots__ = ("device_name", "measurement_time", "temp_out", "temp_in", "humid", "pressure")
+
+    def __init__(self, device_name, measurement_time, temp_out, temp_in, humid, pressure):
+        self.device_name = device_name
+        self.measurement_time = measurement_time
+        self.temp_out = temp_out
+        self.temp_in = temp_in
+        self.humid = humid
+        self.pressure = pressure
+
+    def __repr__(self):
+        return "WeatherReading({}, {}, {}, {}, {}, {})".format(
+            self.device_name, self.measurement_time,
+            self.temp_out, self.temp_in, self.humid, self.pressure)
+
+
+def to_record(device_name, temp_out, temp_in, humid, pressure, measurement_time=None):
+    """
+    Convert ESP output fields to buffered reading record.
+    :param device_name: device name (required)
+    :param temp_out: Outdoor Temperature (numeric string)
+    :param temp_in: Indoor Temperature (numeric string)
+    :param humid: humidity (numeric string)
+    :param pressure: pressure (numeric string)
+    :param measurement_time: datetime (native timestamp adapted by psycopg2)
+    :return: WeatherReading
+    """
+    return WeatherReading(device_name,
+                          measurement_time,
+                          to_float(temp_out),
+                          to_float(temp_in),
+                          to_float(humid),
+                          to_float(pressure)
+                          )
+
+
+def insert_many(records, conn=None, registry=None, summary=None, logger=None):
+    """
+    Insert buffered weather records to t_weather with one multi-row INSERT.
+    If the multi-row INSERT fails (ex. duplicate key), fallback to insert one by one
+    so that only the invalid record is skipped.
+    :param records: list of WeatherReading
+    :param conn: database connection (autocommit)
+    :param registry: DeviceRegistry, if None then module default registry
+    :param summary: WeatherSummary (derived tables updated with inserted rows) or None
+    :param logger: application logger or None
+    :return: inserted record count
+    :exception DatabaseError: connection lost, records are not inserted (or partially)
+    """
+    if len(records) == 0:
+        return 0
+
+    if registry is None:
+        registry = _default_registry
+    rows = []
+    for rec in records:
+        did = registry.get_did(conn, rec.device_name)
+        # Skip unknown device
+        if did is not None:
+            rows.append((did, rec.measurement_time,
+                         rec.temp_out, rec.temp_in, rec.humid, rec.pressure))
+    if len(rows) == 0:
+        return 0
+
+    try:
+        with conn.cursor() as cursor:
+            execute_values(cursor, INSERT_WEATHER_VALUES, rows, page_size=len(rows))
+        if summary is not None:
+            summary.update(conn, rows)
+        return len(rows)
+    except DatabaseError as err:
+        if conn.closed:
+            raise
+        if logger is not None:
+            logger.warning("batch size: {}, error:{}".format(len(rows), err))
+
+    inserted_rows = []
+    for row in rows:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(INSERT_WEATHER,
+                               {
+                                   'did': row[0],
+                                   'measurement_time': row[1],
+                                   'temp_out': row[2],
+                                   'temp_in': row[3],
+                                   'humid': row[4],
+                                   'pressure': row[5],
+                               })
+            inserted_rows.append(row)
+        except DatabaseError as err:
+            if conn.closed:
+                raise
+            if logger is not None:
+                logger.warning("rec: {}\nerror:{}".format(row, err))
+    if summary is not None:
+        summary.update(conn, inserted_rows)
+    return len(inserted_rows)
+
+
 def insert(device_name, temp_out, temp_in, humid, pressure,
            measurement_time=None, conn=None, logger=None):
     """
@@ -161,6 +337,8 @@ def insert(device_name, temp_out, temp_in, humid, pressure,
     :param logger: application logger or None
     """
     did = get_did(conn, device_name, logger=logger)
+    if did is None:
+        return
     rec = (did,
            measurement_time,
            to_float(temp_out),
@@ -0,0 +1,152 @@
+import asyncio
+import signal
+from .clock import ReceiveClock
+from .packet import PacketParser
+from .stats import IngestStats, StatsReporter, DEFAULT_STATS_INTERVAL
+
+"""
+asyncio UDP receiver with decoupled database writer.
+  DatagramProtocol -> bounded queue -> writer task -> WeatherBuffer (flush in executor thread)
+A slow database never blocks receiving, overflowed packets are counted as dropped.
+"""
+
+# Bounded queue size
+DEFAULT_QUEUE_SIZE = 1000
+# Writer checks stop request at least this interval seconds
+STOP_POLL_INTERVAL = 1.0
+
+
+class WeatherDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, queue, stats, logger=None):
+        self.queue = queue
+        self.stats = stats
+        self.clock = ReceiveClock()
+        self.logger = logger
+        self.server_ip = ''
+
+    def datagram_received(self, data, addr):
+        self.stats.received += 1
+        if self.server_ip != addr:
+            self.server_ip = addr
+            if self.logger is not None:
+                self.logger.info("server ip: {}".format(self.server_ip))
+        # Timestamp at received time, not at DB-write time.
+        try:
+            self.queue.put_nowait((data, self.clock.time()))
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            return
+        depth = self.queue.qsize()
+        if depth > self.stats.max_queue_depth:
+            self.stats.max_queue_depth = depth
+
+    def error_received(self, exc):
+        if self.logger is not None:
+            self.logger.warning("error_received: {}".format(exc))
+
+
+async def _flush(buffer, stats, only_expired=False):
+    loop = asyncio.get_running_loop()
+    if only_expired:
+        inserted = await loop.run_in_executor(None, buffer.flush_if_expired)
+    else:
+        inserted = await loop.run_in_executor(None, buffer.flush)
+    stats.inserted += inserted
+
+
+async def _flush_safe(buffer, stats, logger, only_expired=False):
+    """ Flush in writer loop: log and count unexpected errors (ex. OSError from spool), keep receiving """
+    try:
+        await _flush(buffer, stats, only_expired=only_expired)
+    except Exception:
+        stats.flush_errors += 1
+        if logger is not None:
+            logger.exception("flush failed")
+
+
+def _append(parser, buffer, stats, data, received, logger):
+    try:
+        buffer.append(parser.parse_bytes(data, received), flush=False)
+    except ValueError as err:
+        stats.invalid += 1
+        if logger is not None:
+            logger.warning(err)
+
+
+async def _writer(queue, parser, buffer, stats, stop_event, logger):
+    while not stop_event.is_set():
+        timeout = buffer.seconds_until_flush()
+        if timeout is None or timeout > STOP_POLL_INTERVAL:
+            timeout = STOP_POLL_INTERVAL
+        try:
+            data, received = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            await _flush_safe(buffer, stats, logger, only_expired=True)
+            continue
+
+        _append(parser, buffer, stats, data, received, logger)
+        if buffer.ready():
+            await _flush_safe(buffer, stats, logger)
+
+
+async def _stats_reporter(queue, reporter):
+    while True:
+        await asyncio.sleep(reporter.seconds_until_report())
+        reporter.report(queue_depth=queue.qsize())
+
+
+async def run_async(sock, buffer, queue_size=DEFAULT_QUEUE_SIZE,
+                    stats_interval=DEFAULT_STATS_INTERVAL, worker_id=None, health_queue=None,
+                    logger=None):
+    """
+    Receive from bound UDP socket until SIGTERM or writer task failure, and drain queue and buffer at stop.
+    :param sock: bound UDP socket
+    :param buffer: WeatherBuffer
+    :param queue_size: bounded queue size
+    :param stats_interval: stats logging interval seconds
+    :param worker_id: worker id in supervisor mode or None
+    :param health_queue: multiprocessing.Queue to supervisor or None
+    :param logger: application logger or None
+    :return: IngestStats
+    :exception: writer task exception
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    stats = IngestStats()
+    stop_event = asyncio.Event()
+    parser = PacketParser()
+    loop.add_signal_handler(signal.SIGTERM, stop_event.set)
+
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: WeatherDatagramProtocol(queue, stats, logger=logger), sock=sock)
+    writer = asyncio.ensure_future(_writer(queue, parser, buffer, stats, stop_event, logger))
+
+    def _on_writer_done(task):
+        # Writer must not end before stop: stop the process (restarted by systemd or supervisor)
+        if not task.cancelled() and task.exception() is not None and logger is not None:
+            logger.error("writer stopped: {!r}".format(task.exception()))
+        stop_event.set()
+
+    writer.add_done_callback(_on_writer_done)
+    stats_reporter = StatsReporter(stats, interval=stats_interval, worker_id=worker_id,
+                                   health_queue=health_queue, logger=logger)
+    reporter = asyncio.ensure_future(_stats_reporter(queue, stats_reporter))
+    try:
+        await stop_event.wait()
+    finally:
+        if logger is not None:
+            logger.info("stop receiver, queue_depth: {}".format(queue.qsize()))
+        transport.close()
+        reporter.cancel()
+        # Wait current flush
+        await asyncio.wait([writer])
+        # Drain queue and buffer
+        while not queue.empty():
+            data, received = queue.get_nowait()
+            _append(parser, buffer, stats, data, received, logger)
+        await _flush(buffer, stats)
+        stats_reporter.report()
+    if not writer.cancelled() and writer.exception() is not None:
+        # Exit with error after draining (restarted by systemd or supervisor)
+        raise writer.exception()
+    return stats
@@ -0,0 +1,36 @@
+import time
+
+"""
+Receive timestamp clock: wall time derived from monotonic clock.
+Wall clock is read only at anchor time, so per packet cost is time.monotonic() and an addition,
+and a wall clock step (NTP sync after boot on Raspberry Pi without RTC) is applied at next anchor.
+"""
+
+# Re-anchor monotonic clock to wall clock interval seconds
+DEFAULT_RESYNC_INTERVAL = 60.0
+
+
+class ReceiveClock(object):
+    __slots__ = ("resync_interval", "_base_wall", "_base_mono")
+
+    def __init__(self, resync_interval=DEFAULT_RESYNC_INTERVAL):
+        """
+        :param resync_interval: re-anchor interval seconds
+        """
+        self.resync_interval = resync_interval
+        self._anchor()
+
+    def _anchor(self):
+        self._base_mono = time.monotonic()
+        self._base_wall = time.time()
+
+    def time(self):
+        """
+        Current wall time.
+        :return: epoch seconds (float)
+        """
+        elapsed = time.monotonic() - self._base_mono
+        if elapsed >= self.resync_interval:
+            self._anchor()
+            return self._base_wall
+        return self._base_wall + elapsed
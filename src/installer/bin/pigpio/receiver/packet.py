@@ -0,0 +1,172 @@
+import math
+import struct
+from datetime import datetime
+from db.weatherdb import WeatherReading
+
+"""
+ESP weather sensor UDP packet parser
+[text packet] device_name,temp_out,temp_in,humid,pressure[,epoch]
+[binary packet] magic(b"\0W"), version(B), device_name(20s), temp_out, temp_in, humid, pressure(f)
+  version 2: + epoch(q)
+  ※ Optional fixed-width format for firmware, missing value is NaN.
+Parse straight from the reused receive buffer, without decode and str split per packet.
+Measurement time is device epoch if supplied and plausible, else receive time.
+"""
+
+BUFF_SIZE = 1024
+BINARY_MAGIC = b"\0W"
+BINARY_VERSION = 1
+BINARY_FORMAT = struct.Struct("<2sB20sffff")
+BINARY_VERSION_EPOCH = 2
+BINARY_FORMAT_EPOCH = struct.Struct("<2sB20sffffq")
+# Binary device name field bytes (UTF-8, NUL padded), struct truncates silently
+DEVICE_NAME_BYTES = 20
+# Text packet field count (without, with device epoch)
+FIELD_COUNT = 5
+FIELD_COUNT_EPOCH = 6
+# Device epoch is ignored if differs from receive time more than seconds. (device clock not synced)
+DEVICE_CLOCK_TOLERANCE = 600
+# Device name str cache size
+NAME_CACHE_SIZE = 256
+
+
+def _to_float(field):
+    """
+    Numeric bytes convert to float value (float() accepts bytes without decode)
+    :param field: bytes or bytearray
+    :return: float value or if ValueError, None
+    """
+    try:
+        return float(field)
+    except ValueError:
+        return None
+
+
+def _from_nan(value):
+    return None if math.isnan(value) else value
+
+
+def _measurement_time(device_epoch, received):
+    """
+    :param device_epoch: device epoch seconds or None
+    :param received: receive epoch seconds
+    :return: datetime (local time)
+    """
+    if device_epoch and abs(device_epoch - received) <= DEVICE_CLOCK_TOLERANCE:
+        return datetime.fromtimestamp(device_epoch)
+    return datetime.fromtimestamp(received)
+
+
+class PacketParser(object):
+    __slots__ = ("buffer", "view", "_names")
+
+    def __init__(self, buff_size=BUFF_SIZE):
+        # Reused receive buffer
+        self.buffer = bytearray(buff_size)
+        self.view = memoryview(self.buffer)
+        # {device name bytes: str}
+        self._names = {}
+
+    def recv(self, sock):
+        """
+        Receive packet into reused buffer.
+        :param sock: UDP socket
+        :return: (nbytes, addr)
+        """
+        return sock.recvfrom_into(self.buffer)
+
+    def parse(self, nbytes, received):
+        """
+        Parse received packet in buffer.
+        :param nbytes: received size
+        :param received: receive epoch seconds (ReceiveClock.time())
+        :return: WeatherReading
+        :exception ValueError: invalid packet
+        """
+        if self.buffer.startswith(BINARY_MAGIC) and \
+                nbytes in (BINARY_FORMAT.size, BINARY_FORMAT_EPOCH.size):
+            return self._parse_binary(self.view[:nbytes], received)
+        return self._parse_text(self.view[:nbytes].tobytes(), received)
+
+    def parse_bytes(self, data, received):
+        """
+        Parse packet bytes. (for asyncio DatagramProtocol)
+        :param data: received bytes
+        :param received: receive epoch seconds (ReceiveClock.time())
+        :return: WeatherReading
+        :exception ValueError: invalid packet
+        """
+        if data.startswith(BINARY_MAGIC) and \
+                len(data) in (BINARY_FORMAT.size, BINARY_FORMAT_EPOCH.size):
+            return self._parse_binary(data, received)
+        return self._parse_text(data, received)
+
+    def _device_name(self, name):
+        device_name = self._names.get(name)
+        if device_name is None:
+            device_name = name.decode("utf-8")
+            if len(self._names) >= NAME_CACHE_SIZE:
+                self._names.clear()
+            self._names[name] = device_name
+        return device_name
+
+    def _parse_text(self, data, received):
+        fields = data.split(b",")
+        if len(fields) == FIELD_COUNT:
+            device_epoch = None
+        elif len(fields) == FIELD_COUNT_EPOCH:
+            try:
+                device_epoch = int(fields[5])
+            except ValueError:
+                raise ValueError("invalid epoch: {}".format(data))
+        else:
+            raise ValueError("invalid field count: {}".format(data))
+        try:
+            device_name = self._device_name(fields[0])
+        except UnicodeDecodeError:
+            raise ValueError("invalid device name: {}".format(data))
+        return WeatherReading(device_name, _measurement_time(device_epoch, received),
+                              _to_float(fields[1]), _to_float(fields[2]),
+                              _to_float(fields[3]), _to_float(fields[4]))
+
+    def _parse_binary(self, data, received):
+        if len(data) == BINARY_FORMAT_EPOCH.size:
+            _, version, name, temp_out, temp_in, humid, pressure, device_epoch = \
+                BINARY_FORMAT_EPOCH.unpack_from(data)
+            expected = BINARY_VERSION_EPOCH
+        else:
+            _, version, name, temp_out, temp_in, humid, pressure = BINARY_FORMAT.unpack_from(data)
+            device_epoch = None
+            expected = BINARY_VERSION
+        if version != expected:
+            raise ValueError("unsupported binary version: {}".format(version))
+        try:
+            device_name = self._device_name(name.rstrip(b"\0"))
+        except UnicodeDecodeError:
+            raise ValueError("invalid device name: {}".format(name))
+        return WeatherReading(device_name, _measurement_time(device_epoch, received),
+                              _from_nan(temp_out), _from_nan(temp_in),
+                              _from_nan(humid), _from_nan(pressure))
+
+
+def pack_binary(device_name, temp_out, temp_in, humid, pressure, epoch=None):
+    """
+    Pack binary packet. (firmware reference and test sender)
+    :param epoch: device epoch seconds, if not None then version 2
+    :return: bytes
+    :exception ValueError: device name longer than DEVICE_NAME_BYTES
+    """
+    def nan(value):
+        return math.nan if value is None else value
+
+    name = device_name.encode("utf-8")
+    if len(name) > DEVICE_NAME_BYTES:
+        raise ValueError("device name too long for binary packet: {!r}".format(device_name))
+
+    if epoch is not None:
+        return BINARY_FORMAT_EPOCH.pack(BINARY_MAGIC, BINARY_VERSION_EPOCH, name,
+                                        nan(temp_out), nan(temp_in), nan(humid), nan(pressure),
+                                        int(epoch))
+    return BINARY_FORMAT.pack(BINARY_MAGIC, BINARY_VERSION, name,
+                              nan(temp_out), nan(temp_in), nan(humid), nan(pressure))
+
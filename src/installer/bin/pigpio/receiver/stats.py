@@ -0,0 +1,69 @@
+import os
+import queue
+import time
+
+"""
+Ingest counters and periodic reporting (log and supervisor health queue)
+"""
+
+# Stats reporting interval seconds
+DEFAULT_STATS_INTERVAL = 600
+
+
+class IngestStats(object):
+    """ Receiver counters """
+    def __init__(self):
+        self.received = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.inserted = 0
+        # flush raised unexpected exception (records in that batch are lost)
+        self.flush_errors = 0
+        self.max_queue_depth = 0
+
+    def to_dict(self, queue_depth=None):
+        result = {"received": self.received,
+                  "dropped": self.dropped,
+                  "invalid": self.invalid,
+                  "inserted": self.inserted,
+                  "flush_errors": self.flush_errors,
+                  "max_queue_depth": self.max_queue_depth}
+        if queue_depth is not None:
+            result["queue_depth"] = queue_depth
+        return result
+
+
+class StatsReporter(object):
+    def __init__(self, stats, interval=DEFAULT_STATS_INTERVAL, worker_id=None, health_queue=None,
+                 logger=None):
+        """
+        :param stats: IngestStats
+        :param interval: reporting interval seconds
+        :param worker_id: worker id in supervisor mode or None
+        :param health_queue: multiprocessing.Queue to supervisor or None
+        :param logger: application logger or None
+        """
+        self.stats = stats
+        self.interval = interval
+        self.worker_id = worker_id
+        self.health_queue = health_queue
+        self.logger = logger
+        self._next_time = time.monotonic() + interval
+
+    def seconds_until_report(self):
+        return max(0.0, self._next_time - time.monotonic())
+
+    def report_if_due(self, queue_depth=None):
+        if time.monotonic() >= self._next_time:
+            self.report(queue_depth=queue_depth)
+
+    def report(self, queue_depth=None):
+        self._next_time = time.monotonic() + self.interval
+        stats = self.stats.to_dict(queue_depth=queue_depth)
+        if self.logger is not None:
+            self.logger.info("stats[{}]: {}".format(self.worker_id, stats))
+        if self.health_queue is not None:
+            try:
+                self.health_queue.put_nowait((self.worker_id, os.getpid(), stats))
+            except queue.Full:
+                pass
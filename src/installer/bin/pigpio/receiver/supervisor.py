@@ -0,0 +1,152 @@
+import multiprocessing
+import queue
+import signal
+import time
+
+"""
+Supervisor mode: spawn ingest worker processes and aggregate their health.
+  (1) bind: list of {"host", "port"}, one worker group per address.
+  (2) workers: processes per address, bound with SO_REUSEPORT if more than 1.
+Each worker has its own database connection, batch buffer and spool directory.
+※ Linux load balances unicast datagrams among SO_REUSEPORT sockets by source address,
+  but a broadcast datagram is delivered to every socket bound to the port.
+  Broadcasting sensors are scaled by separate ports in "bind", not by "workers".
+  ("workers" > 1 requires "unicast": true in conf/ingest.json)
+Workers are forked (not spawned): worker function uses configuration of the main module.
+"""
+
+# Supervisor checks worker process alive interval seconds
+CHECK_INTERVAL = 1.0
+# Minimum seconds between restarts of the same worker
+RESTART_BACKOFF = 5.0
+# Seconds to wait worker exit after SIGTERM
+STOP_TIMEOUT = 30.0
+
+
+class _WorkerSlot(object):
+    def __init__(self, worker_id, address, reuse_port):
+        self.worker_id = worker_id
+        self.address = address
+        self.reuse_port = reuse_port
+        self.process = None
+        self.started_time = 0.0
+        self.restarts = 0
+        # latest stats from worker
+        self.stats = {}
+
+
+class Supervisor(object):
+    def __init__(self, target, addresses, workers=1, health_interval=600, logger=None):
+        """
+        :param target: worker function(address, worker_id, reuse_port, health_queue)
+        :param addresses: list of (host, port)
+        :param workers: worker processes per address
+        :param health_interval: aggregated health logging interval seconds
+        :param logger: application logger or None
+        """
+        self.target = target
+        self.health_interval = health_interval
+        self.logger = logger
+        # fork regardless of platform default start method (spawn/forkserver re-import __main__)
+        self._context = multiprocessing.get_context("fork")
+        self.health_queue = self._context.Queue(maxsize=1000)
+        self.slots = []
+        reuse_port = workers > 1
+        for address in addresses:
+            for _ in range(workers):
+                self.slots.append(_WorkerSlot(len(self.slots), address, reuse_port))
+        self._stopping = False
+
+    def _start(self, slot):
+        slot.process = self._context.Process(
+            target=self.target,
+            args=(slot.address, slot.worker_id, slot.reuse_port, self.health_queue),
+            name="ingest-worker-{}".format(slot.worker_id))
+        slot.process.start()
+        slot.started_time = time.monotonic()
+        if self.logger is not None:
+            self.logger.info("worker[{}] pid: {}, address: {}, reuse_port: {}".format(
+                slot.worker_id, slot.process.pid, slot.address, slot.reuse_port))
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _collect_health(self, timeout):
+        try:
+            worker_id, pid, stats = self.health_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        stats["pid"] = pid
+        self.slots[worker_id].stats = stats
+
+    def health(self):
+        """
+        Aggregated worker health.
+        :return: dict
+        """
+        total = {"workers": len(self.slots),
+                 "alive": sum(1 for slot in self.slots
+                              if slot.process is not None and slot.process.is_alive()),
+                 "restarts": sum(slot.restarts for slot in self.slots)}
+        for slot in self.slots:
+            for key, value in slot.stats.items():
+                if key != "pid":
+                    total[key] = total.get(key, 0) + value
+        return total
+
+    def _restart_dead(self):
+        for slot in self.slots:
+            if slot.process.is_alive():
+                continue
+            if time.monotonic() - slot.started_time < RESTART_BACKOFF:
+                continue
+            if self.logger is not None:
+                self.logger.warning("worker[{}] exited: {}, restart.".format(
+                    slot.worker_id, slot.process.exitcode))
+            slot.restarts += 1
+            self._start(slot)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        for slot in self.slots:
+            self._start(slot)
+        # Worker sets its own SIGTERM handler after fork.
+        next_health = time.monotonic() + self.health_interval
+        try:
+            while not self._stopping:
+                self._collect_health(CHECK_INTERVAL)
+                self._restart_dead()
+                if time.monotonic() >= next_health:
+                    next_health = time.monotonic() + self.health_interval
+                    if self.logger is not None:
+                        self.logger.info("health: {}".format(self.health()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """ SIGTERM to workers, and wait drain buffers """
+        for slot in self.slots:
+            if slot.process is not None and slot.process.is_alive():
+                slot.process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for slot in self.slots:
+            if slot.process is None:
+                continue
+            slot.process.join(max(0.0, deadline - time.monotonic()))
+            if slot.process.is_alive():
+                if self.logger is not None:
+                    self.logger.warning("worker[{}] kill.".format(slot.worker_id))
+                slot.process.kill()
+                slot.process.join()
+        # Last reports from stopped workers
+        while True:
+            try:
+                worker_id, pid, stats = self.health_queue.get_nowait()
+            except queue.Empty:
+                break
+            stats["pid"] = pid
+            self.slots[worker_id].stats = stats
+        if self.logger is not None:
+            self.logger.info("health: {}".format(self.health()))
@@ -8,9 +8,65 @@ psql -Udeveloper -d sensors_pgdb -c "ALTER TABLE weather.t_weather DROP CONSTRAI
 
 # t_device.csv into t_device table
 psql -Udeveloper -d sensors_pgdb -c "\copy weather.t_device FROM '/home/pi/data/sql/csv/device.csv' DELIMITER ',' CSV HEADER;"
-# t_weather.csv into t_weather table
-psql -Udeveloper -d sensors_pgdb -c "\copy weather.t_weather FROM '/home/pi/data/sql/csv/weather.csv' DELIMITER ',' CSV HEADER;"
+# t_weather.csv into import table
+#  t_weather is partitioned by month: initdb creates only the current month and later,
+#  so past months are created from the imported data before the rows are moved.
+psql -Udeveloper -d sensors_pgdb -c "CREATE UNLOGGED TABLE weather.t_weather_import (LIKE weather.t_weather);"
+psql -Udeveloper -d sensors_pgdb -c "\copy weather.t_weather_import FROM '/home/pi/data/sql/csv/weather.csv' DELIMITER ',' CSV HEADER;"
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 <<'EOF'
+-- Monthly partitions from the first month of the imported data: t_weather_YYYYMM
+DO $$
+DECLARE
+   part_month DATE;
+   end_month DATE;
+BEGIN
+   SELECT date_trunc('month', COALESCE(min(measurement_time), now())),
+          GREATEST(date_trunc('month', COALESCE(max(measurement_time), now())),
+                   date_trunc('month', now())) + interval '1 month'
+     INTO part_month, end_month
+     FROM weather.t_weather_import;
+   WHILE part_month < end_month LOOP
+      EXECUTE format(
+         'CREATE TABLE IF NOT EXISTS weather.%I PARTITION OF weather.t_weather FOR VALUES FROM (%L) TO (%L)',
+         't_weather_' || to_char(part_month, 'YYYYMM'), part_month, part_month + interval '1 month');
+      part_month := part_month + interval '1 month';
+   END LOOP;
+END
+$$;
+
+INSERT INTO weather.t_weather(did, measurement_time, temp_out, temp_in, humid, pressure)
+  SELECT did, measurement_time, temp_out, temp_in, humid, pressure FROM weather.t_weather_import;
+DROP TABLE weather.t_weather_import;
+EOF
 
 # Rebuild constraint.
 psql -Udeveloper -d sensors_pgdb -c "ALTER TABLE weather.t_weather ADD CONSTRAINT pk_weather PRIMARY KEY (did, measurement_time);"
 psql -Udeveloper -d sensors_pgdb -c "ALTER TABLE weather.t_weather ADD CONSTRAINT fk_device FOREIGN KEY (did) REFERENCES weather.t_device (id);"
+psql -Udeveloper -d sensors_pgdb -c "ANALYZE weather.t_weather;"
+
+# Backfill derived tables (initdb creates them empty)
+#  same statements as the upgrade rollup/calendar/latest-weather-sql.
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 <<'EOF'
+SELECT weather.rebuild_weather_rollup(NULL, NULL);
+
+INSERT INTO weather.t_weather_days(did, measurement_day)
+  SELECT DISTINCT did, measurement_time::date FROM weather.t_weather
+  ON CONFLICT DO NOTHING;
+
+INSERT INTO weather.t_weather_latest(did, measurement_time, temp_out, temp_in, humid, pressure)
+  SELECT DISTINCT ON (did) did, measurement_time, temp_out, temp_in, humid, pressure
+  FROM weather.t_weather
+  ORDER BY did, measurement_time DESC
+  ON CONFLICT (did) DO UPDATE SET
+    measurement_time = EXCLUDED.measurement_time,
+    temp_out = EXCLUDED.temp_out,
+    temp_in = EXCLUDED.temp_in,
+    humid = EXCLUDED.humid,
+    pressure = EXCLUDED.pressure
+  WHERE weather.t_weather_latest.measurement_time < EXCLUDED.measurement_time;
+
+ANALYZE weather.t_weather_hourly;
+ANALYZE weather.t_weather_daily;
+ANALYZE weather.t_weather_days;
+ANALYZE weather.t_weather_latest;
+EOF
@@ -8,6 +8,8 @@ CREATE TABLE IF NOT EXISTS weather.t_device(
    CONSTRAINT pk_device PRIMARY KEY (id)
 );
 
+-- 測定時刻(measurement_time)の月単位の宣言的パーティションテーブル
+-- ※アップグレード(weather/partition-weather-sql)と同じ構成
 CREATE TABLE IF NOT EXISTS weather.t_weather(
    did INTEGER NOT NULL,
    measurement_time timestamp NOT NULL,
@@ -15,12 +17,183 @@ CREATE TABLE IF NOT EXISTS weather.t_weather(
    temp_in REAL,
    humid REAL,
    pressure REAL
-);
+) PARTITION BY RANGE (measurement_time);
 
 ALTER TABLE weather.t_weather ADD CONSTRAINT pk_weather PRIMARY KEY (did, measurement_time);
 
 ALTER TABLE weather.t_weather ADD CONSTRAINT fk_device FOREIGN KEY (did) REFERENCES weather.t_device (id);
 
+-- 時系列に追記されるため BRINインデックスはBツリーに比べて極めて小さい
+CREATE INDEX idx_weather_measurement_time ON weather.t_weather USING BRIN (measurement_time);
+
+-- 当月から翌々月までの月パーティション: t_weather_YYYYMM
+-- ※以降の月パーティションは気象データ受信サービスが作成する
+DO $$
+DECLARE
+   part_month DATE := date_trunc('month', now());
+   end_month DATE := date_trunc('month', now()) + interval '3 month';
+   part_name TEXT;
+BEGIN
+   WHILE part_month < end_month LOOP
+      part_name := 't_weather_' || to_char(part_month, 'YYYYMM');
+      EXECUTE format(
+         'CREATE TABLE IF NOT EXISTS weather.%I PARTITION OF weather.t_weather FOR VALUES FROM (%L) TO (%L)',
+         part_name, part_month, part_month + interval '1 month');
+      EXECUTE format('ALTER TABLE weather.%I OWNER TO developer', part_name);
+      part_month := part_month + interval '1 month';
+   END LOOP;
+END
+$$;
+
+-- 月パーティションがない測定時刻のレコード用
+CREATE TABLE IF NOT EXISTS weather.t_weather_default PARTITION OF weather.t_weather DEFAULT;
+
+CREATE TABLE IF NOT EXISTS weather.t_weather_days(
+   did INTEGER NOT NULL,
+   measurement_day DATE NOT NULL,
+   CONSTRAINT pk_weather_days PRIMARY KEY (did, measurement_day),
+   CONSTRAINT fk_weather_days_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+CREATE TABLE IF NOT EXISTS weather.t_weather_latest(
+   did INTEGER NOT NULL,
+   measurement_time timestamp NOT NULL,
+   temp_out REAL,
+   temp_in REAL,
+   humid REAL,
+   pressure REAL,
+   CONSTRAINT pk_weather_latest PRIMARY KEY (did),
+   CONSTRAINT fk_weather_latest_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+-- 気象データの1時間毎/1日毎の集計テーブル (合計, 件数, 最小, 最大, 最小/最大の測定時刻)
+-- 月/期間グラフで描画幅に対して十分な粒度の集計値を取得し、全レコードを転送しないため
+-- 平均値 = 合計 / 件数 ※気象データ受信サービスが挿入時に加算する
+-- 最小/最大の測定時刻はグラフで最小値と最大値を発生順に並べるため
+-- 1時間毎: bucket=時刻の時単位切り捨て
+CREATE TABLE IF NOT EXISTS weather.t_weather_hourly(
+   did INTEGER NOT NULL,
+   bucket timestamp NOT NULL,
+   temp_out_sum DOUBLE PRECISION,
+   temp_out_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_out_min REAL,
+   temp_out_max REAL,
+   temp_out_min_time timestamp,
+   temp_out_max_time timestamp,
+   temp_in_sum DOUBLE PRECISION,
+   temp_in_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_in_min REAL,
+   temp_in_max REAL,
+   temp_in_min_time timestamp,
+   temp_in_max_time timestamp,
+   humid_sum DOUBLE PRECISION,
+   humid_cnt INTEGER NOT NULL DEFAULT 0,
+   humid_min REAL,
+   humid_max REAL,
+   humid_min_time timestamp,
+   humid_max_time timestamp,
+   pressure_sum DOUBLE PRECISION,
+   pressure_cnt INTEGER NOT NULL DEFAULT 0,
+   pressure_min REAL,
+   pressure_max REAL,
+   pressure_min_time timestamp,
+   pressure_max_time timestamp,
+   CONSTRAINT pk_weather_hourly PRIMARY KEY (did, bucket),
+   CONSTRAINT fk_weather_hourly_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+-- 1日毎: bucket=日付の0時
+CREATE TABLE IF NOT EXISTS weather.t_weather_daily(
+   did INTEGER NOT NULL,
+   bucket timestamp NOT NULL,
+   temp_out_sum DOUBLE PRECISION,
+   temp_out_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_out_min REAL,
+   temp_out_max REAL,
+   temp_out_min_time timestamp,
+   temp_out_max_time timestamp,
+   temp_in_sum DOUBLE PRECISION,
+   temp_in_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_in_min REAL,
+   temp_in_max REAL,
+   temp_in_min_time timestamp,
+   temp_in_max_time timestamp,
+   humid_sum DOUBLE PRECISION,
+   humid_cnt INTEGER NOT NULL DEFAULT 0,
+   humid_min REAL,
+   humid_max REAL,
+   humid_min_time timestamp,
+   humid_max_time timestamp,
+   pressure_sum DOUBLE PRECISION,
+   pressure_cnt INTEGER NOT NULL DEFAULT 0,
+   pressure_min REAL,
+   pressure_max REAL,
+   pressure_min_time timestamp,
+   pressure_max_time timestamp,
+   CONSTRAINT pk_weather_daily PRIMARY KEY (did, bucket),
+   CONSTRAINT fk_weather_daily_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+-- 指定期間 [from_date, to_date) の集計を t_weather から再作成する ※NULLは全期間
+CREATE OR REPLACE FUNCTION weather.rebuild_weather_rollup(from_date DATE, to_date DATE)
+RETURNS VOID AS $$
+DECLARE
+   from_time timestamp := COALESCE(from_date::timestamp, '-infinity'::timestamp);
+   to_time timestamp := COALESCE(to_date::timestamp, 'infinity'::timestamp);
+   rollup RECORD;
+BEGIN
+   FOR rollup IN SELECT * FROM (VALUES ('t_weather_hourly', 'hour'), ('t_weather_daily', 'day'))
+                 AS t(table_name, unit) LOOP
+      EXECUTE format('DELETE FROM weather.%I WHERE bucket >= $1 AND bucket < $2', rollup.table_name)
+         USING from_time, to_time;
+      EXECUTE format(
+         'INSERT INTO weather.%I(did, bucket,
+            temp_out_sum, temp_out_cnt, temp_out_min, temp_out_max, temp_out_min_time, temp_out_max_time,
+            temp_in_sum, temp_in_cnt, temp_in_min, temp_in_max, temp_in_min_time, temp_in_max_time,
+            humid_sum, humid_cnt, humid_min, humid_max, humid_min_time, humid_max_time,
+            pressure_sum, pressure_cnt, pressure_min, pressure_max, pressure_min_time, pressure_max_time)
+          SELECT did, date_trunc(%L, measurement_time),
+            sum(temp_out::double precision), count(temp_out), min(temp_out), max(temp_out),
+            (array_agg(measurement_time ORDER BY temp_out, measurement_time) FILTER (WHERE temp_out IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY temp_out DESC, measurement_time) FILTER (WHERE temp_out IS NOT NULL))[1],
+            sum(temp_in::double precision), count(temp_in), min(temp_in), max(temp_in),
+            (array_agg(measurement_time ORDER BY temp_in, measurement_time) FILTER (WHERE temp_in IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY temp_in DESC, measurement_time) FILTER (WHERE temp_in IS NOT NULL))[1],
+            sum(humid::double precision), count(humid), min(humid), max(humid),
+            (array_agg(measurement_time ORDER BY humid, measurement_time) FILTER (WHERE humid IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY humid DESC, measurement_time) FILTER (WHERE humid IS NOT NULL))[1],
+            sum(pressure::double precision), count(pressure), min(pressure), max(pressure),
+            (array_agg(measurement_time ORDER BY pressure, measurement_time) FILTER (WHERE pressure IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY pressure DESC, measurement_time) FILTER (WHERE pressure IS NOT NULL))[1]
+          FROM weather.t_weather
+          WHERE measurement_time >= $1 AND measurement_time < $2
+          GROUP BY did, date_trunc(%L, measurement_time)',
+         rollup.table_name, rollup.unit, rollup.unit)
+         USING from_time, to_time;
+   END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+-- 観測デバイスの変更通知 (Webアプリのデバイス一覧の再読み込み)
+CREATE OR REPLACE FUNCTION weather.notify_device_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+   PERFORM pg_notify('weather_device_changed', TG_OP);
+   RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_device_changed
+   AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON weather.t_device
+   FOR EACH STATEMENT EXECUTE FUNCTION weather.notify_device_changed();
+
 ALTER SCHEMA weather OWNER TO developer;
 ALTER TABLE weather.t_device OWNER TO developer;
 ALTER TABLE weather.t_weather OWNER TO developer;
+ALTER TABLE weather.t_weather_default OWNER TO developer;
+ALTER TABLE weather.t_weather_days OWNER TO developer;
+ALTER TABLE weather.t_weather_latest OWNER TO developer;
+ALTER TABLE weather.t_weather_hourly OWNER TO developer;
+ALTER TABLE weather.t_weather_daily OWNER TO developer;
+ALTER FUNCTION weather.rebuild_weather_rollup(DATE, DATE) OWNER TO developer;
+ALTER FUNCTION weather.notify_device_changed() OWNER TO developer;
@@ -16,6 +16,42 @@ if [ $exit1 -ne 0 ]; then
    exit $exit1
 fi
 
+# データが存在する日のカレンダーテーブルを作成し既存データの日を登録する
+#  ※新しい気象データ受信サービス・Webアプリの年月/年月日リストが参照する
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/calendar-weather-sql/1_create_t_weather_days.sh"
+exit1=$?
+echo "1_create_t_weather_days.sh >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
+
+# デバイス毎の最新の気象データテーブルを作成し既存データの最新レコードを登録する
+#  ※新しい気象データ受信サービス・Webアプリの最新データ取得が参照する
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/latest-weather-sql/1_create_t_weather_latest.sh"
+exit1=$?
+echo "1_create_t_weather_latest.sh >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
+
+# 1時間毎/1日毎の気象データ集計テーブルを作成し既存データを集計する
+#  ※新しい気象データ受信サービス・Webアプリのグラフ表示が参照する
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/rollup-weather-sql/1_create_t_weather_rollup.sh"
+exit1=$?
+echo "1_create_t_weather_rollup.sh >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
+
+# 観測デバイステーブルの変更を通知するトリガーを作成する
+#  ※Webアプリは通知を受けてデバイス一覧を再読み込みする
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/device-notify-sql/1_create_t_device_notify.sh"
+exit1=$?
+echo "1_create_t_device_notify.sh >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
+
 # ※通常ならマイグレーション用の古いスクリプトとCSVディレクトリ削除
 #cd ~/data/sql
 #rm -rf csv sqlite3db
@@ -3,3 +3,14 @@
 # アップグレードしたデバイステーブルの確認
 docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/upgrade-device-sql/3_check_upgrade_t_device.sh"
 
+# データが存在する日のカレンダーテーブルの確認
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/calendar-weather-sql/2_check_t_weather_days.sh"
+
+# デバイス毎の最新の気象データテーブルの確認
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/latest-weather-sql/2_check_t_weather_latest.sh"
+
+# 1時間毎/1日毎の気象データ集計テーブルの確認
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/rollup-weather-sql/3_check_t_weather_rollup.sh"
+
+# 観測デバイステーブルの変更通知トリガーの確認
+docker exec -it postgres-12 sh -c "$HOME/data/sql/weather/device-notify-sql/2_check_t_device_notify.sh"
@@ -0,0 +1,16 @@
+-- 観測デバイス毎のデータが存在する日のカレンダーテーブル
+-- 年月リスト/年月日リストの取得で t_weather の全レコードを走査しないため
+-- ※気象データ受信サービスが挿入したレコードの日を追加する
+CREATE TABLE IF NOT EXISTS weather.t_weather_days(
+   did INTEGER NOT NULL,
+   measurement_day DATE NOT NULL,
+   CONSTRAINT pk_weather_days PRIMARY KEY (did, measurement_day),
+   CONSTRAINT fk_weather_days_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+-- 既存データの日を登録
+INSERT INTO weather.t_weather_days(did, measurement_day)
+  SELECT DISTINCT did, measurement_time::date FROM weather.t_weather
+  ON CONFLICT DO NOTHING;
+
+ANALYZE weather.t_weather_days;
@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# postgres-12 container on sensors_pgdb
+cd /home/pi/data/sql/weather/calendar-weather-sql
+# データが存在する日のカレンダーテーブル作成と既存データの日を登録
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 < 01_create_t_weather_days.sql
+exit1=$?
+echo "01_create_t_weather_days.sql >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
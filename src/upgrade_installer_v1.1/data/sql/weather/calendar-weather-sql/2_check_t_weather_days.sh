@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# デバイス毎の登録日数と最初/最後の日
+echo "SELECT td.name, count(*), min(measurement_day), max(measurement_day) FROM weather.t_weather_days wd INNER JOIN weather.t_device td ON wd.did = td.id GROUP BY td.name ORDER BY td.name;" | psql -Udeveloper -d sensors_pgdb
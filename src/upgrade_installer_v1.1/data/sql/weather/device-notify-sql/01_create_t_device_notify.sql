@@ -0,0 +1,14 @@
+-- t_device(観測デバイス)の変更を通知するトリガー
+--  Webアプリのデバイス一覧(キャッシュ)は通知を受けて再読み込みする
+CREATE OR REPLACE FUNCTION weather.notify_device_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+   PERFORM pg_notify('weather_device_changed', TG_OP);
+   RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_device_changed ON weather.t_device;
+CREATE TRIGGER trg_device_changed
+   AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON weather.t_device
+   FOR EACH STATEMENT EXECUTE FUNCTION weather.notify_device_changed();
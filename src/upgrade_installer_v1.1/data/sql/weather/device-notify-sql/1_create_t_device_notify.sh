@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# postgres-12 container on sensors_pgdb
+cd /home/pi/data/sql/weather/device-notify-sql
+# 観測デバイスの変更を通知するトリガー作成
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 < 01_create_t_device_notify.sql
+exit1=$?
+echo "01_create_t_device_notify.sql >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
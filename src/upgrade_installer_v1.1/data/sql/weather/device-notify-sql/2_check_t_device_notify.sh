@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# 観測デバイスのトリガー
+echo "SELECT tgname, tgenabled FROM pg_trigger WHERE tgrelid = 'weather.t_device'::regclass AND NOT tgisinternal;" | psql -Udeveloper -d sensors_pgdb
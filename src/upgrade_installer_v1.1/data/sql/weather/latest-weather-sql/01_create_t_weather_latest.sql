@@ -0,0 +1,26 @@
+-- 観測デバイス毎の最新の気象データテーブル (1デバイス1レコード)
+-- スマートホンの最新データ取得で t_weather を検索しないため
+-- ※気象データ受信サービスが挿入時に更新する
+CREATE TABLE IF NOT EXISTS weather.t_weather_latest(
+   did INTEGER NOT NULL,
+   measurement_time timestamp NOT NULL,
+   temp_out REAL,
+   temp_in REAL,
+   humid REAL,
+   pressure REAL,
+   CONSTRAINT pk_weather_latest PRIMARY KEY (did),
+   CONSTRAINT fk_weather_latest_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+-- 既存データの最新レコードを登録
+INSERT INTO weather.t_weather_latest(did, measurement_time, temp_out, temp_in, humid, pressure)
+  SELECT DISTINCT ON (did) did, measurement_time, temp_out, temp_in, humid, pressure
+  FROM weather.t_weather
+  ORDER BY did, measurement_time DESC
+  ON CONFLICT (did) DO UPDATE SET
+    measurement_time = EXCLUDED.measurement_time,
+    temp_out = EXCLUDED.temp_out,
+    temp_in = EXCLUDED.temp_in,
+    humid = EXCLUDED.humid,
+    pressure = EXCLUDED.pressure
+  WHERE weather.t_weather_latest.measurement_time < EXCLUDED.measurement_time;
@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# postgres-12 container on sensors_pgdb
+cd /home/pi/data/sql/weather/latest-weather-sql
+# デバイス毎の最新の気象データテーブル作成と既存データの最新レコードを登録
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 < 01_create_t_weather_latest.sql
+exit1=$?
+echo "01_create_t_weather_latest.sql >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
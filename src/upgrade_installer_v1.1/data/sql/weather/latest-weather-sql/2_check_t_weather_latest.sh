@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# デバイス毎の最新の気象データ
+echo "SELECT td.name, wl.* FROM weather.t_weather_latest wl INNER JOIN weather.t_device td ON wl.did = td.id ORDER BY td.name;" | psql -Udeveloper -d sensors_pgdb
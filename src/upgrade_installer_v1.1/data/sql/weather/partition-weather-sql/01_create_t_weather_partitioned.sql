@@ -0,0 +1,53 @@
+-- t_weatherテーブルを測定時刻(measurement_time)の月単位で宣言的パーティション化する
+-- 既存テーブルは t_weather_old に名前を変更してデータを移行する ※確認後に 02_drop_t_weather_old.sql で削除
+-- 月/期間指定の検索は該当する月のパーティションのみ参照される
+BEGIN;
+
+ALTER TABLE weather.t_weather RENAME TO t_weather_old;
+ALTER INDEX weather.pk_weather RENAME TO pk_weather_old;
+ALTER TABLE weather.t_weather_old RENAME CONSTRAINT fk_device TO fk_device_old;
+
+CREATE TABLE weather.t_weather(
+   did INTEGER NOT NULL,
+   measurement_time timestamp NOT NULL,
+   temp_out REAL,
+   temp_in REAL,
+   humid REAL,
+   pressure REAL
+) PARTITION BY RANGE (measurement_time);
+
+ALTER TABLE weather.t_weather ADD CONSTRAINT pk_weather PRIMARY KEY (did, measurement_time);
+
+ALTER TABLE weather.t_weather ADD CONSTRAINT fk_device FOREIGN KEY (did) REFERENCES weather.t_device (id);
+
+-- 時系列に追記されるため BRINインデックスはBツリーに比べて極めて小さい
+CREATE INDEX idx_weather_measurement_time ON weather.t_weather USING BRIN (measurement_time);
+
+-- 既存データの最初の月から翌月までの月パーティション: t_weather_YYYYMM
+-- ※翌々月以降のパーティションは気象データ受信サービスが作成する
+DO $$
+DECLARE
+   part_month DATE;
+   end_month DATE;
+BEGIN
+   SELECT date_trunc('month', COALESCE(min(measurement_time), now())) INTO part_month
+     FROM weather.t_weather_old;
+   end_month := date_trunc('month', now()) + interval '2 month';
+   WHILE part_month < end_month LOOP
+      EXECUTE format(
+         'CREATE TABLE IF NOT EXISTS weather.%I PARTITION OF weather.t_weather FOR VALUES FROM (%L) TO (%L)',
+         't_weather_' || to_char(part_month, 'YYYYMM'), part_month, part_month + interval '1 month');
+      part_month := part_month + interval '1 month';
+   END LOOP;
+END
+$$;
+
+-- 月パーティションがない測定時刻のレコード用
+CREATE TABLE weather.t_weather_default PARTITION OF weather.t_weather DEFAULT;
+
+INSERT INTO weather.t_weather(did, measurement_time, temp_out, temp_in, humid, pressure)
+  SELECT did, measurement_time, temp_out, temp_in, humid, pressure FROM weather.t_weather_old;
+
+COMMIT;
+
+ANALYZE weather.t_weather;
@@ -0,0 +1,3 @@
+-- パーティション化前のテーブルを削除する
+-- 3_check_partition_t_weather.sh で件数が一致することを確認後に実行すること
+DROP TABLE weather.t_weather_old;
@@ -0,0 +1,12 @@
+#!/bin/bash
+
+# postgres-12 container on sensors_pgdb
+# ※気象データ受信サービスを停止してから実行すること
+cd /home/pi/data/sql/weather/partition-weather-sql
+# 気象データテーブルを月パーティションテーブルに移行
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 < 01_create_t_weather_partitioned.sql
+exit1=$?
+echo "01_create_t_weather_partitioned.sql >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
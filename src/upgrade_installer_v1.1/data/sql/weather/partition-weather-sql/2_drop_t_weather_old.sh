@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# postgres-12 container on sensors_pgdb
+cd /home/pi/data/sql/weather/partition-weather-sql
+# 移行前の気象データテーブルを削除
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 < 02_drop_t_weather_old.sql
+exit1=$?
+echo "02_drop_t_weather_old.sql >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
@@ -0,0 +1,5 @@
+#!/bin/bash
+
+# 移行前後の件数と月パーティション毎の件数
+echo "SELECT (SELECT count(*) FROM weather.t_weather) AS partitioned, (SELECT count(*) FROM weather.t_weather_old) AS old;" | psql -Udeveloper -d sensors_pgdb
+echo "SELECT tableoid::regclass AS partition, count(*), min(measurement_time), max(measurement_time) FROM weather.t_weather GROUP BY tableoid ORDER BY 1;" | psql -Udeveloper -d sensors_pgdb
@@ -0,0 +1,133 @@
+-- 気象データの1時間毎/1日毎の集計テーブル (合計, 件数, 最小, 最大, 最小/最大の測定時刻)
+-- 月/期間グラフで描画幅に対して十分な粒度の集計値を取得し、全レコードを転送しないため
+-- 平均値 = 合計 / 件数 ※気象データ受信サービスが挿入時に加算する
+-- 最小/最大の測定時刻はグラフで最小値と最大値を発生順に並べるため
+-- 1時間毎: bucket=時刻の時単位切り捨て
+CREATE TABLE IF NOT EXISTS weather.t_weather_hourly(
+   did INTEGER NOT NULL,
+   bucket timestamp NOT NULL,
+   temp_out_sum DOUBLE PRECISION,
+   temp_out_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_out_min REAL,
+   temp_out_max REAL,
+   temp_out_min_time timestamp,
+   temp_out_max_time timestamp,
+   temp_in_sum DOUBLE PRECISION,
+   temp_in_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_in_min REAL,
+   temp_in_max REAL,
+   temp_in_min_time timestamp,
+   temp_in_max_time timestamp,
+   humid_sum DOUBLE PRECISION,
+   humid_cnt INTEGER NOT NULL DEFAULT 0,
+   humid_min REAL,
+   humid_max REAL,
+   humid_min_time timestamp,
+   humid_max_time timestamp,
+   pressure_sum DOUBLE PRECISION,
+   pressure_cnt INTEGER NOT NULL DEFAULT 0,
+   pressure_min REAL,
+   pressure_max REAL,
+   pressure_min_time timestamp,
+   pressure_max_time timestamp,
+   CONSTRAINT pk_weather_hourly PRIMARY KEY (did, bucket),
+   CONSTRAINT fk_weather_hourly_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+-- 1日毎: bucket=日付の0時
+CREATE TABLE IF NOT EXISTS weather.t_weather_daily(
+   did INTEGER NOT NULL,
+   bucket timestamp NOT NULL,
+   temp_out_sum DOUBLE PRECISION,
+   temp_out_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_out_min REAL,
+   temp_out_max REAL,
+   temp_out_min_time timestamp,
+   temp_out_max_time timestamp,
+   temp_in_sum DOUBLE PRECISION,
+   temp_in_cnt INTEGER NOT NULL DEFAULT 0,
+   temp_in_min REAL,
+   temp_in_max REAL,
+   temp_in_min_time timestamp,
+   temp_in_max_time timestamp,
+   humid_sum DOUBLE PRECISION,
+   humid_cnt INTEGER NOT NULL DEFAULT 0,
+   humid_min REAL,
+   humid_max REAL,
+   humid_min_time timestamp,
+   humid_max_time timestamp,
+   pressure_sum DOUBLE PRECISION,
+   pressure_cnt INTEGER NOT NULL DEFAULT 0,
+   pressure_min REAL,
+   pressure_max REAL,
+   pressure_min_time timestamp,
+   pressure_max_time timestamp,
+   CONSTRAINT pk_weather_daily PRIMARY KEY (did, bucket),
+   CONSTRAINT fk_weather_daily_device FOREIGN KEY (did) REFERENCES weather.t_device (id)
+);
+
+-- 最小/最大の測定時刻列がない集計テーブル (以前のバージョンで作成済み) に列を追加する
+ALTER TABLE weather.t_weather_hourly
+   ADD COLUMN IF NOT EXISTS temp_out_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS temp_out_max_time timestamp,
+   ADD COLUMN IF NOT EXISTS temp_in_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS temp_in_max_time timestamp,
+   ADD COLUMN IF NOT EXISTS humid_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS humid_max_time timestamp,
+   ADD COLUMN IF NOT EXISTS pressure_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS pressure_max_time timestamp;
+ALTER TABLE weather.t_weather_daily
+   ADD COLUMN IF NOT EXISTS temp_out_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS temp_out_max_time timestamp,
+   ADD COLUMN IF NOT EXISTS temp_in_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS temp_in_max_time timestamp,
+   ADD COLUMN IF NOT EXISTS humid_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS humid_max_time timestamp,
+   ADD COLUMN IF NOT EXISTS pressure_min_time timestamp,
+   ADD COLUMN IF NOT EXISTS pressure_max_time timestamp;
+
+-- 指定期間 [from_date, to_date) の集計を t_weather から再作成する ※NULLは全期間
+CREATE OR REPLACE FUNCTION weather.rebuild_weather_rollup(from_date DATE, to_date DATE)
+RETURNS VOID AS $$
+DECLARE
+   from_time timestamp := COALESCE(from_date::timestamp, '-infinity'::timestamp);
+   to_time timestamp := COALESCE(to_date::timestamp, 'infinity'::timestamp);
+   rollup RECORD;
+BEGIN
+   FOR rollup IN SELECT * FROM (VALUES ('t_weather_hourly', 'hour'), ('t_weather_daily', 'day'))
+                 AS t(table_name, unit) LOOP
+      EXECUTE format('DELETE FROM weather.%I WHERE bucket >= $1 AND bucket < $2', rollup.table_name)
+         USING from_time, to_time;
+      EXECUTE format(
+         'INSERT INTO weather.%I(did, bucket,
+            temp_out_sum, temp_out_cnt, temp_out_min, temp_out_max, temp_out_min_time, temp_out_max_time,
+            temp_in_sum, temp_in_cnt, temp_in_min, temp_in_max, temp_in_min_time, temp_in_max_time,
+            humid_sum, humid_cnt, humid_min, humid_max, humid_min_time, humid_max_time,
+            pressure_sum, pressure_cnt, pressure_min, pressure_max, pressure_min_time, pressure_max_time)
+          SELECT did, date_trunc(%L, measurement_time),
+            sum(temp_out::double precision), count(temp_out), min(temp_out), max(temp_out),
+            (array_agg(measurement_time ORDER BY temp_out, measurement_time) FILTER (WHERE temp_out IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY temp_out DESC, measurement_time) FILTER (WHERE temp_out IS NOT NULL))[1],
+            sum(temp_in::double precision), count(temp_in), min(temp_in), max(temp_in),
+            (array_agg(measurement_time ORDER BY temp_in, measurement_time) FILTER (WHERE temp_in IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY temp_in DESC, measurement_time) FILTER (WHERE temp_in IS NOT NULL))[1],
+            sum(humid::double precision), count(humid), min(humid), max(humid),
+            (array_agg(measurement_time ORDER BY humid, measurement_time) FILTER (WHERE humid IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY humid DESC, measurement_time) FILTER (WHERE humid IS NOT NULL))[1],
+            sum(pressure::double precision), count(pressure), min(pressure), max(pressure),
+            (array_agg(measurement_time ORDER BY pressure, measurement_time) FILTER (WHERE pressure IS NOT NULL))[1],
+            (array_agg(measurement_time ORDER BY pressure DESC, measurement_time) FILTER (WHERE pressure IS NOT NULL))[1]
+          FROM weather.t_weather
+          WHERE measurement_time >= $1 AND measurement_time < $2
+          GROUP BY did, date_trunc(%L, measurement_time)',
+         rollup.table_name, rollup.unit, rollup.unit)
+         USING from_time, to_time;
+   END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+-- 既存データの集計
+SELECT weather.rebuild_weather_rollup(NULL, NULL);
+
+ANALYZE weather.t_weather_hourly;
+ANALYZE weather.t_weather_daily;
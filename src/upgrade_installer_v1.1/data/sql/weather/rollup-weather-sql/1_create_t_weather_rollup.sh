@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# postgres-12 container on sensors_pgdb
+cd /home/pi/data/sql/weather/rollup-weather-sql
+# 1時間毎/1日毎の集計テーブル作成と既存データの集計
+psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1 < 01_create_t_weather_rollup.sql
+exit1=$?
+echo "01_create_t_weather_rollup.sql >> status=$exit1"
+if [ $exit1 -ne 0 ]; then
+   exit $exit1
+fi
@@ -0,0 +1,16 @@
+#!/bin/bash
+
+# 指定期間の集計を再作成する (開始日を含み終了日を含まない)
+#  ./2_rebuild_t_weather_rollup.sh 2023-01-01 2023-02-01
+#  ./2_rebuild_t_weather_rollup.sh  ※全期間
+if [ $# -eq 2 ]; then
+   from_date="'$1'"
+   to_date="'$2'"
+else
+   from_date="NULL"
+   to_date="NULL"
+fi
+echo "SELECT weather.rebuild_weather_rollup(${from_date}, ${to_date});" | psql -Udeveloper -d sensors_pgdb -v ON_ERROR_STOP=1
+exit1=$?
+echo "rebuild_weather_rollup(${from_date}, ${to_date}) >> status=$exit1"
+exit $exit1
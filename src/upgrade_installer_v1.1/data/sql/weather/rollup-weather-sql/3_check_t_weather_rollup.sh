@@ -0,0 +1,5 @@
+#!/bin/bash
+
+# デバイス毎の集計件数と期間
+echo "SELECT td.name, count(*), min(bucket), max(bucket), sum(temp_out_cnt) FROM weather.t_weather_hourly wh INNER JOIN weather.t_device td ON wh.did = td.id GROUP BY td.name ORDER BY td.name;" | psql -Udeveloper -d sensors_pgdb
+echo "SELECT td.name, count(*), min(bucket), max(bucket), sum(temp_out_cnt) FROM weather.t_weather_daily wd INNER JOIN weather.t_device td ON wd.did = td.id GROUP BY td.name ORDER BY td.name;" | psql -Udeveloper -d sensors_pgdb
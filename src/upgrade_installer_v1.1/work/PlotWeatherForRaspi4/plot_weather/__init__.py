@@ -1,13 +1,17 @@
 import enum
+import functools
 import logging
 import os
 import socket
+import threading
+import time
 import uuid
-from typing import Dict
+from typing import Dict, Optional
 
-from psycopg2.pool import SimpleConnectionPool
+import psycopg2
 from flask import Flask
 
+from plot_weather.db.connpool import BlockingConnectionPool
 from plot_weather.log import logsetting
 from plot_weather.util.file_util import read_json
 from plot_weather.util.image_util import image_to_base64encoded
@@ -23,6 +27,24 @@ class DebugOutRequest(enum.Enum):
 CONF_PATH: str = os.path.expanduser("~/bin/pigpio/conf")
 DB_CONF_PATH: str = os.path.join(CONF_PATH, "dbconf.json")
 DB_CONN_MAX: int = int(os.environ.get("DB_CONN_MAX", "5"))
+# 接続の空き待ち時間(秒)
+DB_CONN_TIMEOUT: float = float(os.environ.get("DB_CONN_TIMEOUT", "10"))
+# 未使用の接続を再利用前に確認するまでの時間(秒)
+DB_CONN_CHECK_INTERVAL: float = float(os.environ.get("DB_CONN_CHECK_INTERVAL", "30"))
+# 当日データバッファを使う ※0なら当日データは毎回全件検索する
+TODAY_BUFFER: bool = os.environ.get("TODAY_BUFFER", "1") != "0"
+# 気象データ画像キャッシュの最大件数 ※0ならキャッシュしない
+PLOT_CACHE_MAX: int = int(os.environ.get("PLOT_CACHE_MAX", "64"))
+# 気象データ画像のディスクキャッシュのディレクトリ ※未設定ならディスクキャッシュなし
+PLOT_CACHE_DIR: Optional[str] = os.environ.get("PLOT_CACHE_DIR")
+# 観測デバイス一覧を共有する ※0ならリクエスト毎にデバイスを検索する
+DEVICE_REGISTRY: bool = os.environ.get("DEVICE_REGISTRY", "1") != "0"
+# 観測デバイス一覧の再読み込み間隔(秒)
+DEVICE_REGISTRY_TTL: float = float(os.environ.get("DEVICE_REGISTRY_TTL", "600"))
+# 画像描画プロセス数 ※0ならリクエストのスレッドで描画する
+RENDER_PROCESSES: int = int(os.environ.get("RENDER_PROCESSES", "0"))
+# 起動後にバックグラウンドで初回リクエストの準備(DB接続, matplotlib読み込み, ダミー描画)をする
+PREWARM: bool = os.environ.get("PREWARM", "1") != "0"
 
 app = Flask(__name__, static_url_path='/static')
 # ロガーを本アプリ用のものに設定する
@@ -57,24 +79,101 @@ app.config["APPLICATION_ROOT"] = "/plot_weather"
 app.config["JSON_AS_ASCII"] = False
 if app_logger_debug:
     app_logger.debug(f"{app.config}")
-# "BAD REQUEST"用画像のbase64エンコード文字列ファイル
 curr_dir: str = os.path.dirname(__file__)
 cotent_path: str = os.path.join(curr_dir, "static", "content")
-file_bad_request: str = os.path.join(cotent_path, "BadRequest_png_base64encoded.txt")
-BAD_REQUEST_IMAGE_DATA: str = image_to_base64encoded(file_bad_request)
+# "BAD REQUEST"用画像のbase64エンコード文字列ファイル
+BAD_REQUEST_IMAGE_FILE: str = "BadRequest_png_base64encoded.txt"
 # "Internal Server Error"用画像のbase64エンコード文字列ファイル
-file_internal_error: str = os.path.join(
-    cotent_path, "InternalServerError_png_base64encoded.txt"
-)
-INTERNAL_SERVER_ERROR_IMAGE_DATA: str = image_to_base64encoded(file_internal_error)
+INTERNAL_SERVER_ERROR_IMAGE_FILE: str = "InternalServerError_png_base64encoded.txt"
+
+
+@functools.lru_cache(maxsize=None)
+def error_image_data(file_name: str) -> str:
+    """
+    エラー用画像のbase64画像形式文字列を取得する ※ファイルは最初のエラー時に読み込む
+    :param file_name: static/content のbase64エンコード文字列ファイル名
+    :return: base64画像形式文字列
+    """
+    return image_to_base64encoded(os.path.join(cotent_path, file_name))
+
+
 # Database connection pool
 dbconf: Dict[str, str] = read_json(DB_CONF_PATH)
 dbconf["host"] = dbconf["host"].format(hostname=socket.gethostname())
 if app_logger_debug:
     app_logger.debug(f"dbconf: {dbconf}")
-conn_pool = SimpleConnectionPool(1, DB_CONN_MAX, **dbconf)
-app_logger.info(f"postgreSQL_pool(max={DB_CONN_MAX}): {conn_pool}")
+# セッション(読み込み専用, autocommit)は接続毎に1回だけ設定する
+# 起動時は接続しない ※OS起動直後はDB(コンテナ)の起動を待たずに起動する, 接続は最初の利用時
+conn_pool = BlockingConnectionPool(0, DB_CONN_MAX, wait_timeout=DB_CONN_TIMEOUT,
+                                   check_interval=DB_CONN_CHECK_INTERVAL,
+                                   session={"readonly": True, "autocommit": True}, logger=app_logger,
+                                   **dbconf)
+app_logger.info(f"postgreSQL_pool(max={DB_CONN_MAX}, timeout={DB_CONN_TIMEOUT}): {conn_pool}")
 app.config["postgreSQL_pool"] = conn_pool
+# Plot image cache
+from plot_weather.plotter.plotcache import PlotCache
+plot_cache: Optional[PlotCache] = None
+if PLOT_CACHE_MAX > 0:
+    plot_cache = PlotCache(PLOT_CACHE_MAX, cache_dir=PLOT_CACHE_DIR, logger=app_logger)
+app_logger.info(f"plot_cache(max={PLOT_CACHE_MAX}, dir={PLOT_CACHE_DIR}): {plot_cache}")
+app.config["plot_cache"] = plot_cache
+# Today data buffer per device
+from plot_weather.dao.todaybuffer import TodayBuffer
+app.config["today_buffer"] = TodayBuffer(logger=app_logger) if TODAY_BUFFER else None
+app_logger.info(f"today_buffer: {app.config['today_buffer']}")
+# Plot rendering processes: リクエスト処理のスレッド開始前にforkする
+#  ※描画プロセスを使う場合のみ起動時にmatplotlibを読み込む
+app.config["render_pool"] = None
+if RENDER_PROCESSES > 0:
+    from plot_weather.plotter.renderpool import RenderPool
+    app.config["render_pool"] = RenderPool(RENDER_PROCESSES, logger=app_logger)
+app_logger.info(f"render_pool(processes={RENDER_PROCESSES}): {app.config['render_pool']}")
+# Device registry: スレッド(変更通知の受信)は描画プロセスのfork後に開始する
+from plot_weather.dao.deviceregistry import DeviceRegistry
+device_registry: Optional[DeviceRegistry] = None
+if DEVICE_REGISTRY:
+    # デバイス一覧は準備処理か初回のリクエストで読み込む
+    device_registry = DeviceRegistry(ttl=DEVICE_REGISTRY_TTL, logger=app_logger)
+    device_registry.startListener(dbconf)
+app.config["device_registry"] = device_registry
+
+
+def _prewarm(started: float) -> None:
+    prewarm_started: float = time.monotonic()
+    # DB接続 (OS起動直後はDBの起動を待つ), デバイス一覧
+    conn_ms: Optional[float] = None
+    try:
+        conn = conn_pool.getconn()
+        try:
+            if device_registry is not None:
+                device_registry.reload(conn)
+        finally:
+            conn_pool.putconn(conn)
+        conn_ms = (time.monotonic() - prewarm_started) * 1000
+    except psycopg2.Error as err:
+        # 初回のリクエストで接続する
+        app_logger.warning(f"prewarm: {err}")
+    # matplotlibの読み込み, フォントキャッシュの作成, ダミー描画
+    render_started: float = time.monotonic()
+    from plot_weather.plotter.plotterweather import warmup_render
+    warmup_render()
+    render_ms: float = (time.monotonic() - render_started) * 1000
+    app_logger.info(
+        f"prewarm: db connect {f'{conn_ms:.0f} ms' if conn_ms is not None else 'failed'}"
+        f", matplotlib and render {render_ms:.0f} ms"
+        f", cold start {(time.monotonic() - started) * 1000:.0f} ms")
+
+
+def start_prewarm(started: float) -> None:
+    """
+    初回リクエストの準備をバックグラウンドで開始する ※PREWARM=0 なら何もしない
+    リクエストの受付と並行して行うため、準備中のリクエストは待たずにそのまま処理する
+    :param started: プロセスの起動時刻 (time.monotonic()) ※起動時間のログ出力用
+    """
+    if not PREWARM:
+        return
+
+    threading.Thread(target=_prewarm, args=(started,), name="prewarm", daemon=True).start()
 
 # Application main program
 from plot_weather.views import app_main
@@ -1,5 +1,5 @@
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass, asdict
 
 from psycopg2.extensions import connection, cursor
@@ -31,7 +31,7 @@ class DeviceDao(object):
     # 指定したデバイス名の存在チェック
     _QUERY_EXISTS_DEVICE = "SELECT count(id) FROM weather.t_device WHERE name=%(name)s;"
 
-    def __init__(self, conn: connection, logger: logging.Logger = None):
+    def __init__(self, conn: connection, logger: Optional[logging.Logger] = None):
         self.logger = logger
         self.conn = conn
 
@@ -0,0 +1,138 @@
+import json
+import logging
+import select
+import threading
+import time
+from typing import Dict, FrozenSet, List, Optional
+
+import psycopg2
+from psycopg2.extensions import connection
+
+from .devicedao import DeviceDao, DeviceRecord
+
+""" 観測デバイス一覧 (Webアプリ共有) """
+
+# デバイス一覧を再読み込みする間隔(秒) ※変更通知を受信できない場合の上限
+DEFAULT_TTL: float = 600.0
+# t_device の変更通知チャネル (upgrade sql: weather/device-notify-sql)
+NOTIFY_CHANNEL: str = "weather_device_changed"
+# 変更通知の待ち時間(秒), 通知用接続の再接続間隔(秒)
+_LISTEN_TIMEOUT: float = 60.0
+_LISTEN_RETRY_INTERVAL: float = 30.0
+
+
+class _DeviceSnapshot:
+    def __init__(self, devices: List[DeviceRecord]):
+        self.names: FrozenSet[str] = frozenset(device.name for device in devices)
+        # /get_devices のレスポンス ※jsonifyと同じ出力
+        resp_obj: Dict[str, Dict] = {
+            "data": {"devices": DeviceDao.to_dict_without_id(devices)},
+            "status": {"code": 0, "message": "OK"}
+        }
+        self.devices_json: bytes = (json.dumps(
+            resp_obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True) + "\n"
+        ).encode("utf-8")
+        self.loaded_time: float = time.monotonic()
+
+
+class DeviceRegistry:
+    """観測デバイス一覧 (スレッドセーフ)
+    t_device を読み込んだスナップショットでデバイス名の存在チェックとデバイスリストを返却する
+    スナップショットは TTL 経過時か t_device の変更通知(LISTEN)を受けた後の最初の参照時に再読み込みする
+    """
+    def __init__(self, ttl: float = DEFAULT_TTL, logger: Optional[logging.Logger] = None):
+        """
+        :param ttl: デバイス一覧を再読み込みする間隔(秒)
+        :param logger: アプリケーションロガー
+        """
+        self.ttl = ttl
+        self.logger = logger
+        self._snapshot: Optional[_DeviceSnapshot] = None
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+
+    def reload(self, conn: connection) -> None:
+        """
+        デバイス一覧を再読み込みする
+        :param conn: 読み込み専用DBコネクション
+        :raise: DatabaseError
+        """
+        devices: List[DeviceRecord] = DeviceDao(conn, logger=self.logger).get_devices()
+        snapshot = _DeviceSnapshot(devices)
+        with self._lock:
+            self._snapshot = snapshot
+        if self.logger is not None:
+            self.logger.info(f"device_registry: {sorted(snapshot.names)}")
+
+    def invalidate(self) -> None:
+        """ 次の参照時に再読み込みさせる """
+        with self._lock:
+            self._snapshot = None
+
+    def _current(self, conn: connection) -> _DeviceSnapshot:
+        with self._lock:
+            snapshot: Optional[_DeviceSnapshot] = self._snapshot
+            if snapshot is not None and time.monotonic() - snapshot.loaded_time < self.ttl:
+                return snapshot
+            # 同時に再読み込みしないようにロック中に読み込む ※件数は数件
+            devices: List[DeviceRecord] = DeviceDao(conn, logger=self.logger).get_devices()
+            self._snapshot = _DeviceSnapshot(devices)
+            return self._snapshot
+
+    def exists(self, conn: connection, device_name: str) -> bool:
+        """
+        デバイス名が登録済みかチェックする
+        :param conn: 読み込み専用DBコネクション ※再読み込み時のみ使用
+        :param device_name: デバイス名
+        :return: 登録済みなら True
+        :raise: DatabaseError
+        """
+        return device_name in self._current(conn).names
+
+    def getDevicesJson(self, conn: connection) -> bytes:
+        """
+        /get_devices のレスポンス(JSON)を取得する
+        :param conn: 読み込み専用DBコネクション ※再読み込み時のみ使用
+        :return: JSON (UTF-8)
+        :raise: DatabaseError
+        """
+        return self._current(conn).devices_json
+
+    def startListener(self, dbconf: Dict[str, str]) -> None:
+        """
+        t_device の変更通知を受信するスレッドを開始する
+        :param dbconf: DB接続情報 ※通知の受信専用に接続する
+        """
+        self._listener = threading.Thread(
+            target=self._listen, args=(dbconf,), name="device_registry", daemon=True)
+        self._listener.start()
+
+    def _listen(self, dbconf: Dict[str, str]) -> None:
+        while True:
+            conn: Optional[connection] = None
+            try:
+                conn = psycopg2.connect(**dbconf)
+                conn.set_session(readonly=True, autocommit=True)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # 接続断の間の変更を取りこぼさないように受信開始後に一旦破棄する
+                self.invalidate()
+                while True:
+                    if select.select([conn], [], [], _LISTEN_TIMEOUT) == ([], [], []):
+                        # 通知がない間も接続断を検知する
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    if len(conn.notifies) > 0:
+                        conn.notifies.clear()
+                        self.invalidate()
+                        if self.logger is not None:
+                            self.logger.info("device_registry: t_device changed")
+            except psycopg2.Error as err:
+                if self.logger is not None:
+                    self.logger.warning(f"device_registry listen: {err}")
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(_LISTEN_RETRY_INTERVAL)
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from .weatherdao import WeatherDao
+if TYPE_CHECKING:
+    import pandas as pd
+
+""" 観測デバイス毎の当日データバッファ """
+
+# 当日データ全件を再取得する間隔(秒)
+#  受信サービスの再送(スプール)データは取得済みの最終測定時刻より前の時刻で追加されるため
+#  ※件数の不一致で再取得するため、これはデータの削除等に備えた上限
+DEFAULT_FULL_RELOAD_INTERVAL: float = 1800.0
+
+
+class _DeviceToday:
+    def __init__(self, s_today: str, df: Optional["pd.DataFrame"]):
+        self.s_today = s_today
+        # 当日データ ※追加時は新しいDataFrameに置き換える (返却済みのDataFrameは変更しない)
+        self.df = df
+        self.loaded_time: float = time.monotonic()
+        self.lock = threading.Lock()
+
+    def lastTime(self) -> Optional[datetime]:
+        if self.df is None:
+            return None
+        return self.df.index[-1].to_pydatetime()
+
+
+class TodayBuffer:
+    """観測デバイス毎の当日データ (スレッドセーフ)
+    初回(日付が変わった時)のみ当日データ全件を取得し、以降は最終測定時刻より後のデータのみ取得して追加する
+    追加後の件数がデータベースの当日の件数と一致しない(再送データが追加された)場合は全件を再取得する
+    """
+    def __init__(self,
+                 full_reload_interval: float = DEFAULT_FULL_RELOAD_INTERVAL,
+                 logger: Optional[logging.Logger] = None):
+        """
+        :param full_reload_interval: 当日データ全件を再取得する間隔(秒)
+        :param logger: アプリケーションロガー
+        """
+        self.full_reload_interval = full_reload_interval
+        self.logger = logger
+        self.logger_debug: bool = False
+        if self.logger is not None:
+            self.logger_debug = (self.logger.getEffectiveLevel() <= logging.DEBUG)
+        self._devices: Dict[str, _DeviceToday] = {}
+        self._lock = threading.Lock()
+
+    def getTodayData(self,
+                     dao: WeatherDao,
+                     device_name: str,
+                     s_today: str) -> Tuple[int, Optional["pd.DataFrame"]]:
+        """観測デバイスの当日データを取得する ※戻り値は WeatherDao.getTodayData と同じ
+        :param dao: 気象データDAO
+        :param device_name: 観測デバイス名
+        :param s_today: 当日(%Y-%m-%d)
+        :return: (件数, 気象データのDataFrame) ※件数0ならDataFrameはNone
+        """
+        with self._lock:
+            entry: Optional[_DeviceToday] = self._devices.get(device_name)
+            if entry is None or entry.s_today != s_today:
+                # 初回または日付が変わった
+                entry = _DeviceToday(s_today, None)
+                self._devices[device_name] = entry
+
+        with entry.lock:
+            rec_count: int
+            df: Optional["pd.DataFrame"]
+            last_time: Optional[datetime] = entry.lastTime()
+            if entry.df is None or last_time is None \
+                    or time.monotonic() - entry.loaded_time >= self.full_reload_interval:
+                rec_count, df = dao.getTodayData(device_name, s_today)
+                entry.df = df
+                entry.loaded_time = time.monotonic()
+                if self.logger is not None and self.logger_debug:
+                    self.logger.debug(f"today_buffer[{device_name}] reload: {rec_count}")
+            else:
+                db_count, db_last_time = dao.getRangeWatermark(device_name, s_today, s_today)
+                if db_count == len(entry.df) and db_last_time == last_time:
+                    # 追加データなし
+                    rec_count = 0
+                else:
+                    rec_count, df = dao.getTodayDataAfter(device_name, last_time)
+                    if rec_count > 0:
+                        # DataFrameの取得後のため pandas は読み込み済み
+                        import pandas as pd
+                        entry.df = pd.concat([entry.df, df])
+                    if len(entry.df) != db_count:
+                        # 最終測定時刻より前の再送データ
+                        rec_count, df = dao.getTodayData(device_name, s_today)
+                        entry.df = df
+                        entry.loaded_time = time.monotonic()
+                if self.logger is not None and self.logger_debug:
+                    self.logger.debug(f"today_buffer[{device_name}] after {last_time}: {rec_count}")
+
+            if entry.df is None:
+                return 0, None
+            return len(entry.df), entry.df
@@ -1,106 +1,248 @@
 import logging
-from io import StringIO
-from typing import List, Tuple, Optional
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
 from psycopg2.extensions import connection
+from ..db.prepared import PreparedQuery
 from ..db.sqlite3conv import strdate2timestamp
-from ..util.dateutil import addDayToString, nextYearMonth
+from ..util.dateutil import addDayToString, nextYearMonth, FMT_ISO_8601_DATE
+if TYPE_CHECKING:
+    import pandas as pd
 
 """ 気象データDAOクラス """
 
-HEADER_WEATHER: str = '"did","measurement_time","temp_out","temp_in","humid","pressure"'
-
-
-def _csvToStringIO(
-        tuple_list: List[Tuple[int, str, float, float, float, float]],
-        require_header=True) -> StringIO:
-    str_buffer = StringIO()
-    if require_header:
-        str_buffer.write(HEADER_WEATHER + "\n")
-
-    for (did, m_time, temp_in, temp_out, humid, pressure) in tuple_list:
-        line = f'{did},"{m_time}",{temp_in},{temp_out},{humid},{pressure}\n'
-        str_buffer.write(line)
-
-    # StringIO need Set first position
-    str_buffer.seek(0)
-    return str_buffer
+# 集計テーブル (集計単位の秒数, テーブル名, 1点目のオフセット, 2点目のオフセット) ※粗い順
+#  集計単位毎に最小値と最大値の2点を前半・後半の中央時刻に発生順に置く (描画時の最小/最大の間引きと同じ見た目)
+ROLLUP_TABLES: Tuple[Tuple[int, str, str, str], ...] = (
+    (86400, "t_weather_daily", "6 hours", "18 hours"),
+    (3600, "t_weather_hourly", "15 minutes", "45 minutes"),
+)
+# 折れ線グラフは描画幅の2ピクセルに1点あれば十分に描画される
+PIXELS_PER_POINT: int = 2
+# 集計テーブルの有無 (None: 未確認)
+_rollup_available: Optional[bool] = None
+# 受信サービスが更新する派生テーブル
+#  ※アップグレードSQL(calendar-weather-sql, latest-weather-sql)が未適用なら t_weather を直接検索する
+TABLE_WEATHER_DAYS: str = "weather.t_weather_days"
+TABLE_WEATHER_LATEST: str = "weather.t_weather_latest"
+# 派生テーブルの有無 {テーブル名: 有無} ※アプリ起動後の最初の検索で確認する
+_table_available: Dict[str, bool] = {}
 
 
 class WeatherDao:
+    # measurement_time is compared with timestamp constant (not to_char, to_timestamp):
+    #  btree/BRIN index and monthly partition pruning at plan time.
+    # 最新レコードは受信サービスが更新するデバイス毎の最新データ(t_weather_latest)から取得する
     _QUERY_LASTREC: str = """
 SELECT
   to_char(measurement_time,'YYYY-MM-DD HH24:MI') as measurement_time
   , temp_out, temp_in, humid, pressure
+FROM
+  weather.t_weather_latest wl INNER JOIN weather.t_device td ON wl.did = td.id
+WHERE
+  td.name=%(name)s;
+"""
+
+    # t_weather_latest がない場合の最新レコード
+    _QUERY_LASTREC_FROM_WEATHER: str = """
+SELECT
+  to_char(measurement_time,'YYYY-MM-DD HH24:MI') as measurement_time
+  , temp_out, temp_in, humid, pressure
 FROM
   weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
 WHERE
   td.name=%(name)s
-  AND
-  measurement_time = (SELECT max(measurement_time) FROM weather.t_weather);
+ORDER BY measurement_time DESC
+LIMIT 1;
 """
 
+    # 年月日/年月リストはデータが存在する日のカレンダー(t_weather_days)から取得する
     _QUERY_GROUPBY_DAYS: str = """
 SELECT
-  to_char(measurement_time, 'YYYY-MM-DD') as groupby_days
+  to_char(measurement_day, 'YYYY-MM-DD') as groupby_days
 FROM
-  weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
+  weather.t_weather_days wd INNER JOIN weather.t_device td ON wd.did = td.id
 WHERE
   td.name=%(name)s
   AND
-  to_char(measurement_time, 'YYYY-MM-DD') >= %(start_date)s
-GROUP BY to_char(measurement_time, 'YYYY-MM-DD')
-ORDER BY to_char(measurement_time, 'YYYY-MM-DD');
+  measurement_day >= %(start_date)s::date
+ORDER BY measurement_day;
     """
 
     _QUERY_GROUPBY_MONTHS: str = """
 SELECT
-  to_char(measurement_time, 'YYYY-MM') as groupby_months
+  to_char(date_trunc('month', measurement_day), 'YYYY-MM') as groupby_months
+FROM
+  weather.t_weather_days wd INNER JOIN weather.t_device td ON wd.did = td.id
+WHERE
+  td.name=%(name)s
+  GROUP BY date_trunc('month', measurement_day)
+  ORDER BY date_trunc('month', measurement_day) DESC;
+"""
+
+    # t_weather_days がない場合の年月日/年月リスト
+    _QUERY_GROUPBY_DAYS_FROM_WEATHER: str = """
+SELECT
+  to_char(measurement_time::date, 'YYYY-MM-DD') as groupby_days
+FROM
+  weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
+WHERE
+  td.name=%(name)s
+  AND
+  measurement_time >= %(start_date)s::timestamp
+GROUP BY measurement_time::date
+ORDER BY measurement_time::date;
+"""
+
+    _QUERY_GROUPBY_MONTHS_FROM_WEATHER: str = """
+SELECT
+  to_char(date_trunc('month', measurement_time), 'YYYY-MM') as groupby_months
 FROM
   weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
 WHERE
   td.name=%(name)s
-  GROUP BY to_char(measurement_time, 'YYYY-MM')
-  ORDER BY to_char(measurement_time, 'YYYY-MM') DESC;
+  GROUP BY date_trunc('month', measurement_time)
+  ORDER BY date_trunc('month', measurement_time) DESC;
 """
 
+    # 気象データ検索SQL: COPY (...) TO STDOUT (FORMAT binary) で実行する ※末尾の";"不可
     _QUERY_TODAY_DATA: str = """
 SELECT
-   did, to_char(measurement_time,'YYYY-MM-DD HH24:MI') as measurement_time
-   , temp_out, temp_in, humid, pressure
+   measurement_time
+   , COALESCE(temp_out, 'NaN') as temp_out, COALESCE(temp_in, 'NaN') as temp_in
+   , COALESCE(humid, 'NaN') as humid, COALESCE(pressure, 'NaN') as pressure
 FROM
   weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
 WHERE
    td.name=%(name)s
    AND
-   measurement_time >= to_timestamp(%(today)s, 'YYYY-MM-DD HH24:MI:SS')
-ORDER BY measurement_time;
+   measurement_time >= %(today)s::timestamp
+ORDER BY measurement_time
+"""
+
+    # 当日データの差分: 取得済みの最終測定時刻より後のレコード
+    #  ※数件以下のため COPY ではなく準備済み文で実行する
+    _QUERY_TODAY_DATA_AFTER: str = """
+SELECT
+   measurement_time
+   , COALESCE(temp_out, 'NaN') as temp_out, COALESCE(temp_in, 'NaN') as temp_in
+   , COALESCE(humid, 'NaN') as humid, COALESCE(pressure, 'NaN') as pressure
+FROM
+  weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
+WHERE
+   td.name=%(name)s
+   AND
+   measurement_time > %(after)s::timestamp
+ORDER BY measurement_time
 """
 
     _QUERY_RANGE_DATA: str = """
 SELECT
-   did, to_char(measurement_time,'YYYY-MM-DD HH24:MI') as measurement_time
-   , temp_out, temp_in, humid, pressure
+   measurement_time
+   , COALESCE(temp_out, 'NaN') as temp_out, COALESCE(temp_in, 'NaN') as temp_in
+   , COALESCE(humid, 'NaN') as humid, COALESCE(pressure, 'NaN') as pressure
 FROM
   weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
 WHERE
    td.name=%(name)s
    AND (
-     measurement_time >= to_timestamp(%(from_date)s, 'YYYY-MM-DD HH24::MI:SS')
+     measurement_time >= %(from_date)s::timestamp
      AND
-     measurement_time < to_timestamp(%(to_next_date)s, 'YYYY-MM-DD HH24:MI:SS')
+     measurement_time < %(to_next_date)s::timestamp
    )
-ORDER BY measurement_time;
+ORDER BY measurement_time
+"""
+
+    # 集計テーブルの期間データ: 集計単位毎に最小値と最大値の2点 ※平均値ではピーク値が欠ける
+    #  列毎に最小/最大の測定時刻の早い方を1点目にする ※測定時刻がなければ最小値が1点目
+    _QUERY_ROLLUP_RANGE_DATA: str = """
+SELECT
+   bucket + mm.time_offset as measurement_time
+   , COALESCE(CASE WHEN COALESCE(temp_out_max_time < temp_out_min_time, false) = mm.is_first
+       THEN temp_out_max ELSE temp_out_min END, 'NaN') as temp_out
+   , COALESCE(CASE WHEN COALESCE(temp_in_max_time < temp_in_min_time, false) = mm.is_first
+       THEN temp_in_max ELSE temp_in_min END, 'NaN') as temp_in
+   , COALESCE(CASE WHEN COALESCE(humid_max_time < humid_min_time, false) = mm.is_first
+       THEN humid_max ELSE humid_min END, 'NaN') as humid
+   , COALESCE(CASE WHEN COALESCE(pressure_max_time < pressure_min_time, false) = mm.is_first
+       THEN pressure_max ELSE pressure_min END, 'NaN') as pressure
+FROM
+  weather.{table} wr INNER JOIN weather.t_device td ON wr.did = td.id
+  CROSS JOIN (
+    VALUES (interval '{first_offset}', true), (interval '{second_offset}', false)
+  ) AS mm(time_offset, is_first)
+WHERE
+   td.name=%(name)s
+   AND (
+     bucket >= %(from_date)s::timestamp
+     AND
+     bucket < %(to_next_date)s::timestamp
+   )
+ORDER BY bucket, mm.time_offset
+"""
+
+    # 期間の件数と最新の測定時刻 (画像キャッシュの更新判定用)
+    #  再送(スプール)データは最新の測定時刻より前に追加されるため件数も含める
+    #  ※主キー(did, measurement_time)のインデックスのみで集計できる
+    _QUERY_RANGE_WATERMARK: str = """
+SELECT
+   count(*), max(measurement_time)
+FROM
+  weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
+WHERE
+   td.name=%(name)s
+   AND (
+     measurement_time >= %(from_date)s::timestamp
+     AND
+     measurement_time < %(to_next_date)s::timestamp
+   )
+"""
+
+    _QUERY_ROLLUP_AVAILABLE: str = """
+SELECT
+   to_regclass('weather.t_weather_hourly') IS NOT NULL
+   AND to_regclass('weather.t_weather_daily') IS NOT NULL
+"""
+
+    _QUERY_TABLE_AVAILABLE: str = """
+SELECT to_regclass(%(name)s) IS NOT NULL
 """
 
     _QUERY_FIRST_RECORD_WITH_DEVICE: str = """
+SELECT
+   to_char(min(measurement_day), 'YYYY-MM-DD') as min_measurement_day
+FROM
+   weather.t_weather_days wd INNER JOIN weather.t_device td ON wd.did = td.id
+WHERE
+   td.name=%(name)s
+"""
+
+    # t_weather_days がない場合の最初の登録日
+    _QUERY_FIRST_RECORD_FROM_WEATHER: str = """
 SELECT
    to_char(min(measurement_time), 'YYYY-MM-DD') as min_measurement_day
-FROM 
+FROM
    weather.t_weather tw INNER JOIN weather.t_device td ON tw.did = td.id
 WHERE
    td.name=%(name)s
 """
 
+    # 画面表示・スマホのポーリング毎に実行するSQLは接続毎に一度だけ PREPARE して実行計画を再利用する
+    #  ※COPY は EXECUTE を実行できないため対象外
+    _PREPARED_LASTREC = PreparedQuery("weather_lastrec", _QUERY_LASTREC)
+    _PREPARED_LASTREC_FROM_WEATHER = PreparedQuery("weather_lastrec_from_weather", _QUERY_LASTREC_FROM_WEATHER)
+    _PREPARED_GROUPBY_DAYS = PreparedQuery("weather_groupby_days", _QUERY_GROUPBY_DAYS)
+    _PREPARED_GROUPBY_MONTHS = PreparedQuery("weather_groupby_months", _QUERY_GROUPBY_MONTHS)
+    _PREPARED_GROUPBY_DAYS_FROM_WEATHER = PreparedQuery(
+        "weather_groupby_days_from_weather", _QUERY_GROUPBY_DAYS_FROM_WEATHER)
+    _PREPARED_GROUPBY_MONTHS_FROM_WEATHER = PreparedQuery(
+        "weather_groupby_months_from_weather", _QUERY_GROUPBY_MONTHS_FROM_WEATHER)
+    _PREPARED_RANGE_WATERMARK = PreparedQuery("weather_range_watermark", _QUERY_RANGE_WATERMARK)
+    _PREPARED_TODAY_DATA_AFTER = PreparedQuery("weather_today_data_after", _QUERY_TODAY_DATA_AFTER)
+    _PREPARED_FIRST_RECORD_WITH_DEVICE = PreparedQuery(
+        "weather_first_record_with_device", _QUERY_FIRST_RECORD_WITH_DEVICE)
+    _PREPARED_FIRST_RECORD_FROM_WEATHER = PreparedQuery(
+        "weather_first_record_from_weather", _QUERY_FIRST_RECORD_FROM_WEATHER)
+
     def __init__(self, conn: connection, logger: Optional[logging.Logger] = None):
         self.conn = conn
         self.logger = logger
@@ -116,26 +258,48 @@ WHERE
           tuple: (measurement_time[%Y %m %d %H %M], temp_out, temp_in, humid, pressure)
           ただし観測デバイス名に対応するレコードがない場合は None
         """
+        prepared: PreparedQuery = (
+            self._PREPARED_LASTREC if self._isTableAvailable(TABLE_WEATHER_LATEST)
+            else self._PREPARED_LASTREC_FROM_WEATHER
+        )
         with self.conn.cursor() as cursor:
-            cursor.execute(self._QUERY_WEATHER_LASTREC, {'name': device_name})
+            prepared.execute(cursor, {'name': device_name})
             row = cursor.fetchone()
             if self.logger is not None and self.logger_debug:
                 self.logger.debug("row: {}".format(row))
 
         return row
 
+    def getRangeWatermark(self,
+                          device_name: str,
+                          from_date: str,
+                          to_date: str) -> Tuple[int, Optional[datetime]]:
+        """観測デバイスの期間の件数と最新の測定時刻を取得する (画像キャッシュ・当日データの更新判定用)
+        :param device_name: 観測デバイス名
+        :param from_date: 検索開始日(%Y-%m-%d)
+        :param to_date: 検索終了日(%Y-%m-%d)
+        :return: (件数, 最新の測定時刻) ※件数0なら測定時刻はNone
+        """
+        with self.conn.cursor() as cursor:
+            self._PREPARED_RANGE_WATERMARK.execute(cursor, {
+                'name': device_name,
+                'from_date': from_date,
+                'to_next_date': addDayToString(to_date),
+            })
+            row = cursor.fetchone()
+
+        return row[0], row[1]
+
     def _getDateGroupByList(self,
-                            qrouping_sql: str,
+                            qrouping_sql: PreparedQuery,
                             device_name: str,
-                            start_date: str,
-                            groupby_name='groupby_days') -> List[str]:
+                            start_date: str) -> List[str]:
         """観測デバイスのグルーピングSQLに対応した日付リストを取得する
 
         Args:
-            qrouping_sql str: グルーピングSQL
+            qrouping_sql PreparedQuery: グルーピングSQL
             device_name str: 観測デバイス名
             start_date str: 検索開始日付
-            groupby_name: 'groupby_days' | 'groupby_months'
 
         Returns:
           list: 文字列の日付 (年月 | 年月日)
@@ -146,7 +310,7 @@ WHERE
         strdate2timestamp(start_date)
 
         with self.conn.cursor() as cursor:
-            cursor.execute(qrouping_sql, {'name': device_name, groupby_name: start_date})
+            qrouping_sql.execute(cursor, {'name': device_name, 'start_date': start_date})
             # fetchall() return tuple list [(?,), (?,), ..., (?,)]
             tuple_list: List[Tuple[str, ]] = cursor.fetchall()
             if self.logger is not None and self.logger_debug:
@@ -164,8 +328,9 @@ WHERE
             list[str]: 年月日リスト(%Y-%m-%d)
         """
         return self._getDateGroupByList(
-            self._QUERY_GROUPBY_DAYS, device_name, start_date,
-            groupby_name="groupby_days"
+            self._PREPARED_GROUPBY_DAYS if self._isTableAvailable(TABLE_WEATHER_DAYS)
+            else self._PREPARED_GROUPBY_DAYS_FROM_WEATHER,
+            device_name, start_date
         )
 
     def getGroupbyMonths(self, device_name: str, start_date: str) -> List[str]:
@@ -176,83 +341,170 @@ WHERE
                     list[str]: 降順の年月リスト(%Y-%m)
         """
         return self._getDateGroupByList(
-            self._QUERY_GROUPBY_MONTHS, device_name, start_date,
-            groupby_name="groupby_months"
+            self._PREPARED_GROUPBY_MONTHS if self._isTableAvailable(TABLE_WEATHER_DAYS)
+            else self._PREPARED_GROUPBY_MONTHS_FROM_WEATHER,
+            device_name, start_date
         )
 
+    def _isTableAvailable(self, name: str) -> bool:
+        """派生テーブルの有無を確認する (結果はプロセス内で共有する)
+        :param name: スキーマ付きのテーブル名
+        :return: テーブルがあれば True
+        """
+        available: Optional[bool] = _table_available.get(name)
+        if available is None:
+            with self.conn.cursor() as cursor:
+                cursor.execute(self._QUERY_TABLE_AVAILABLE, {'name': name})
+                available = bool(cursor.fetchone()[0])
+            _table_available[name] = available
+            if self.logger is not None:
+                self.logger.info(f"{name} available: {available}")
+        return available
+
+    def _isRollupAvailable(self) -> bool:
+        global _rollup_available
+        if _rollup_available is None:
+            with self.conn.cursor() as cursor:
+                cursor.execute(self._QUERY_ROLLUP_AVAILABLE)
+                _rollup_available = cursor.fetchone()[0]
+            if self.logger is not None:
+                self.logger.info(f"rollup_available: {_rollup_available}")
+        return _rollup_available
+
+    def _selectRangeQuery(self,
+                          from_date: str,
+                          to_next_date: str,
+                          plot_width: Optional[int]) -> str:
+        """描画幅を満たす最も粗い粒度の期間データSQLを選択する
+        :param from_date: 検索開始日(%Y-%m-%d)
+        :param to_next_date: 検索終了日の翌日(%Y-%m-%d)
+        :param plot_width: 描画幅(ピクセル) ※Noneなら生データ
+        :return: 期間データSQL
+        """
+        if plot_width is None or plot_width <= 0:
+            return self._QUERY_RANGE_DATA
+
+        span_seconds: float = (
+            datetime.strptime(to_next_date, FMT_ISO_8601_DATE)
+            - datetime.strptime(from_date, FMT_ISO_8601_DATE)
+        ).total_seconds()
+        # 描画時の最小/最大の間引きと同じバケット数 (1バケット最大2点)
+        min_buckets: float = plot_width / PIXELS_PER_POINT
+        for unit_seconds, table, first_offset, second_offset in ROLLUP_TABLES:
+            if span_seconds / unit_seconds >= min_buckets and self._isRollupAvailable():
+                if self.logger is not None and self.logger_debug:
+                    self.logger.debug(f"plot_width: {plot_width}, rollup: {table}")
+                return self._QUERY_ROLLUP_RANGE_DATA.format(
+                    table=table, first_offset=first_offset, second_offset=second_offset)
+
+        return self._QUERY_RANGE_DATA
+
+    def _getDataFrame(self, query: str, params: dict) -> Tuple[int, Optional["pd.DataFrame"]]:
+        from .weatherframe import copyToDataFrame
+
+        with self.conn.cursor() as cursor:
+            df: pd.DataFrame = copyToDataFrame(cursor, query, params)
+        rec_count: int = len(df)
+        if self.logger is not None and self.logger_debug:
+            self.logger.debug(f"rec_count: {rec_count}")
+
+        if rec_count == 0:
+            return 0, None
+        return rec_count, df
+
     def getTodayData(self,
                      device_name: str,
-                     s_today: str,
-                     require_header: bool = True) -> Tuple[int, Optional[StringIO]]:
+                     s_today: str) -> Tuple[int, Optional["pd.DataFrame"]]:
+        """観測デバイスの当日データを取得する
+        :param device_name: 観測デバイス名
+        :param s_today: 当日(%Y-%m-%d)
+        :return: (件数, 気象データのDataFrame) ※件数0ならDataFrameはNone
+        """
         if self.logger is not None and self.logger_debug:
             self.logger.debug("device_name: {}, today: {}".format(device_name, s_today))
 
+        return self._getDataFrame(self._QUERY_TODAY_DATA, {'name': device_name, 'today': s_today})
+
+    def getTodayDataAfter(self,
+                          device_name: str,
+                          after: datetime) -> Tuple[int, Optional["pd.DataFrame"]]:
+        """観測デバイスの指定時刻より後のデータを取得する (当日データの差分取得用)
+        :param device_name: 観測デバイス名
+        :param after: 取得済みの最終測定時刻
+        :return: (件数, 気象データのDataFrame) ※件数0ならDataFrameはNone
+        """
+        if self.logger is not None and self.logger_debug:
+            self.logger.debug("device_name: {}, after: {}".format(device_name, after))
+
         with self.conn.cursor() as cursor:
-            cursor.execute(self._QUERY_TODAY_DATA, {'name': device_name, 'today': s_today})
-            tuple_list = cursor.fetchall()
-            rec_count: int = len(tuple_list)
-            if self.logger is not None and self.logger_debug:
-                self.logger.debug(f"tuple_list.size: {rec_count}")
+            self._PREPARED_TODAY_DATA_AFTER.execute(cursor, {'name': device_name, 'after': after})
+            rows: List[tuple] = cursor.fetchall()
+        rec_count: int = len(rows)
+        if self.logger is not None and self.logger_debug:
+            self.logger.debug(f"rec_count: {rec_count}")
 
         if rec_count == 0:
             return 0, None
-        return rec_count, _csvToStringIO(tuple_list, require_header)
+        from .weatherframe import rowsToDataFrame
+
+        return rec_count, rowsToDataFrame(rows)
 
     def getMonthData(self,
                      device_name: str,
                      s_year_month: str,
-                     require_header: bool = True) -> Tuple[int, Optional[StringIO]]:
+                     plot_width: Optional[int] = None) -> Tuple[int, Optional["pd.DataFrame"]]:
+        """観測デバイスの年月データを取得する
+        :param device_name: 観測デバイス名
+        :param s_year_month: 年月(%Y-%m)
+        :param plot_width: 描画幅(ピクセル) ※Noneなら生データ
+        :return: (件数, 気象データのDataFrame) ※件数0ならDataFrameはNone
+        """
         s_start = s_year_month + "-01"
         s_end_exclude = nextYearMonth(s_start)
         if self.logger is not None and self.logger_debug:
             self.logger.debug("device_name: {}, from_date: {}, to_next_date: {}".format(
                 device_name, s_start, s_end_exclude))
 
-        with self.conn.cursor() as cursor:
-            cursor.execute(self._QUERY_RANGE_DATA, {
-                    'name': device_name,
-                    'from_date': s_start,
-                    'to_next_date': s_end_exclude,
-                }
-            )
-            tuple_list = cursor.fetchall()
-            rec_count: int = len(tuple_list)
-            if self.logger is not None and self.logger_debug:
-                self.logger.debug(f"tuple_list.size {rec_count}")
-
-        if rec_count == 0:
-            return 0, None
-        return rec_count, _csvToStringIO(tuple_list, require_header)
+        return self._getDataFrame(
+            self._selectRangeQuery(s_start, s_end_exclude, plot_width), {
+                'name': device_name,
+                'from_date': s_start,
+                'to_next_date': s_end_exclude,
+            }
+        )
 
     def getFromToRangeData(self,
                            device_name: str,
                            from_date: str,
                            to_date: str,
-                           require_header: bool = True) -> Tuple[int, Optional[StringIO]]:
+                           plot_width: Optional[int] = None) -> Tuple[int, Optional["pd.DataFrame"]]:
+        """観測デバイスの期間データを取得する
+        :param device_name: 観測デバイス名
+        :param from_date: 検索開始日(%Y-%m-%d)
+        :param to_date: 検索終了日(%Y-%m-%d)
+        :param plot_width: 描画幅(ピクセル) ※Noneなら生データ
+        :return: (件数, 気象データのDataFrame) ※件数0ならDataFrameはNone
+        """
         s_end_exclude: str = addDayToString(to_date)
         if self.logger is not None and self.logger_debug:
             self.logger.debug("device_name: {}, from_date: {}, to_next_date: {}".format(
                 device_name, from_date, s_end_exclude))
 
-        with self.conn.cursor() as cursor:
-            cursor.execute(self._QUERY_RANGE_DATA, {
-                    'name': device_name,
-                    'from_date': from_date,
-                    'to_next_date': s_end_exclude,
-                }
-            )
-            tuple_list = cursor.fetchall()
-            rec_count: int = len(tuple_list)
-            if self.logger is not None and self.logger_debug:
-                self.logger.debug(f"tuple_list.size {rec_count}")
-
-        if rec_count == 0:
-            return 0, None
-        return rec_count, _csvToStringIO(tuple_list, require_header)
+        return self._getDataFrame(
+            self._selectRangeQuery(from_date, s_end_exclude, plot_width), {
+                'name': device_name,
+                'from_date': from_date,
+                'to_next_date': s_end_exclude,
+            }
+        )
 
     def getFisrtRegisterDay(self, device_name: str) -> Optional[str]:
+        prepared: PreparedQuery = (
+            self._PREPARED_FIRST_RECORD_WITH_DEVICE if self._isTableAvailable(TABLE_WEATHER_DAYS)
+            else self._PREPARED_FIRST_RECORD_FROM_WEATHER
+        )
         with self.conn.cursor() as cursor:
-            cursor.execute(self._QUERY_FIRST_RECORD_WITH_DEVICE, {'name': device_name})
+            prepared.execute(cursor, {'name': device_name})
             row = cursor.fetchone()
             if self.logger is not None and self.logger_debug:
                 self.logger.debug("row: {}".format(row))
@@ -0,0 +1,130 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from psycopg2.extensions import cursor as pg_cursor
+
+""" 気象データ検索結果のDataFrame変換 ※WeatherDaoがDataFrameを返却する時に読み込む
+numpy/pandasの読み込みは時間がかかるため、アプリ起動時とDataFrameを使わないリクエストでは読み込まない
+"""
+
+# 気象データのDataFrame列 ※measurement_timeはインデックスにも設定する
+WEATHER_COLUMNS: Tuple[str, ...] = ("measurement_time", "temp_out", "temp_in", "humid", "pressure")
+
+# COPY BINARY 形式 (https://www.postgresql.org/docs/current/sql-copy.html)
+#  ヘッダー: シグネチャ(11) + フラグ(int32) + 拡張領域長(int32) + 拡張領域, トレーラー: int16(-1)
+#  行: フィールド数(int16) + フィールド毎に [データ長(int32) + データ] ※ビッグエンディアン
+#  測定値のNULLはSQLでNaNにするため全行が固定長になり、行単位の変換なしに配列に読み込める
+_COPY_SIGNATURE: bytes = b"PGCOPY\n\xff\r\n\x00"
+_COPY_HEADER_SIZE: int = len(_COPY_SIGNATURE) + 8
+_COPY_TRAILER_SIZE: int = 2
+_COPY_WEATHER_DTYPE: np.dtype = np.dtype([
+    ("fields", ">i2"),
+    ("measurement_time_len", ">i4"), ("measurement_time", ">i8"),
+    ("temp_out_len", ">i4"), ("temp_out", ">f4"),
+    ("temp_in_len", ">i4"), ("temp_in", ">f4"),
+    ("humid_len", ">i4"), ("humid", ">f4"),
+    ("pressure_len", ">i4"), ("pressure", ">f4"),
+])
+# timestamp: 2000-01-01 00:00:00 からのマイクロ秒
+_PG_EPOCH: np.datetime64 = np.datetime64("2000-01-01T00:00:00", "us")
+
+
+# COPY BINARYの受信データを変換する単位(バイト) ※受信済みの未変換データはこのサイズまで
+_COPY_DECODE_BYTES: int = 64 * 1024
+
+
+def _toDataFrame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    df = pd.DataFrame(columns, columns=list(WEATHER_COLUMNS))
+    # "measurement_time"列を残してインデックスに設定
+    df.set_index(WEATHER_COLUMNS[0], drop=False, inplace=True)
+    return df
+
+
+class _WeatherCopyWriter:
+    """COPY BINARYの受信データを逐次列毎の配列に変換する (copy_expertの出力先)
+    受信データ全体をバッファしないため、ピーク時のメモリは変換後の配列 + 変換単位になる
+    """
+    def __init__(self):
+        self._pending = bytearray()
+        self._header_done: bool = False
+        self._chunks: Dict[str, List[np.ndarray]] = {name: [] for name in WEATHER_COLUMNS}
+
+    def write(self, data: bytes) -> int:
+        self._pending += data
+        if len(self._pending) >= _COPY_DECODE_BYTES:
+            self._decode()
+        return len(data)
+
+    def _decodeHeader(self) -> bool:
+        if len(self._pending) < _COPY_HEADER_SIZE:
+            return False
+        if bytes(self._pending[:len(_COPY_SIGNATURE)]) != _COPY_SIGNATURE:
+            raise ValueError("Invalid COPY BINARY signature")
+        ext_len: int = int.from_bytes(self._pending[_COPY_HEADER_SIZE - 4:_COPY_HEADER_SIZE], "big")
+        if len(self._pending) < _COPY_HEADER_SIZE + ext_len:
+            return False
+        del self._pending[:_COPY_HEADER_SIZE + ext_len]
+        self._header_done = True
+        return True
+
+    def _decode(self) -> None:
+        if not self._header_done and not self._decodeHeader():
+            return
+
+        row_count: int = len(self._pending) // _COPY_WEATHER_DTYPE.itemsize
+        if row_count == 0:
+            return
+        size: int = row_count * _COPY_WEATHER_DTYPE.itemsize
+        rows: np.ndarray = np.frombuffer(bytes(self._pending[:size]), dtype=_COPY_WEATHER_DTYPE)
+        del self._pending[:size]
+        if np.any(rows["fields"] != len(WEATHER_COLUMNS)) or np.any(rows["measurement_time_len"] != 8):
+            raise ValueError("Unexpected COPY BINARY row")
+
+        self._chunks["measurement_time"].append(
+            _PG_EPOCH + rows["measurement_time"].astype("timedelta64[us]"))
+        for name in WEATHER_COLUMNS[1:]:
+            # ビッグエンディアンからネイティブのfloat32に変換
+            self._chunks[name].append(rows[name].astype(np.float32))
+
+    def toDataFrame(self) -> pd.DataFrame:
+        """ 受信完了後に残りを変換してDataFrameを生成する """
+        self._decode()
+        if not self._header_done or bytes(self._pending) != b"\xff\xff":
+            raise ValueError(f"Invalid COPY BINARY trailer: {bytes(self._pending[:8])!r}")
+
+        columns: Dict[str, np.ndarray] = {}
+        for name in WEATHER_COLUMNS:
+            chunks: List[np.ndarray] = self._chunks[name]
+            if len(chunks) == 0:
+                columns[name] = np.empty(0, dtype="datetime64[us]" if name == WEATHER_COLUMNS[0]
+                                         else np.float32)
+            else:
+                columns[name] = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+        return _toDataFrame(columns)
+
+
+def copyToDataFrame(cursor: pg_cursor, query: str, params: dict) -> pd.DataFrame:
+    """気象データ検索SQLをCOPY BINARYで実行し、列毎の配列からDataFrameを生成する
+    :param cursor: カーソル
+    :param query: 気象データ検索SQL ※列は WEATHER_COLUMNS, 測定値のNULLは 'NaN'
+    :param params: 検索パラメータ
+    :return: 気象データのDataFrame (インデックス: measurement_time)
+    :exception ValueError: COPY BINARYのデータが想定外
+    """
+    # COPYはバインド変数が使えないためパラメータを埋め込んだSQLにする
+    sql: str = cursor.mogrify(query, params).decode("utf-8")
+    writer = _WeatherCopyWriter()
+    cursor.copy_expert(f"COPY ({sql}) TO STDOUT (FORMAT binary)", writer)
+    return writer.toDataFrame()
+
+
+def rowsToDataFrame(rows: List[tuple]) -> pd.DataFrame:
+    """準備済み文の取得行(WEATHER_COLUMNSの順)からDataFrameを生成する"""
+    columns: Dict[str, np.ndarray] = {
+        WEATHER_COLUMNS[0]: np.array([row[0] for row in rows], dtype="datetime64[us]")
+    }
+    values: np.ndarray = np.array([row[1:] for row in rows], dtype=np.float32)
+    for i, name in enumerate(WEATHER_COLUMNS[1:]):
+        columns[name] = values[:, i]
+    return _toDataFrame(columns)
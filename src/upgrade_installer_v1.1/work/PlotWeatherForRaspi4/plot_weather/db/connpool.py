@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions as _ext
+from psycopg2.extensions import connection
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+"""
+Thread-safe PostgreSQL connection pool for the web application (waitress threads).
+"""
+
+# Seconds to wait for a free connection when all connections are in use
+DEFAULT_WAIT_TIMEOUT: float = 10.0
+# Idle seconds after which a connection is checked before reuse
+DEFAULT_CHECK_INTERVAL: float = 30.0
+_QUERY_PING: str = "SELECT 1"
+
+
+class PoolTimeoutError(PoolError):
+    """ No connection became free within the wait timeout """
+    pass
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that
+      - configures the session once per physical connection (readonly, autocommit)
+      - keeps up to maxconn idle connections (ThreadedConnectionPool closes above minconn)
+      - checks connections idle longer than check_interval and reconnects broken ones
+        (e.g. after the database container restarted)
+      - blocks up to wait_timeout instead of raising when exhausted
+    """
+    def __init__(self, minconn: int, maxconn: int,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 session: Optional[Dict[str, bool]] = None,
+                 logger: Optional[logging.Logger] = None,
+                 *args, **kwargs):
+        """
+        :param minconn: connections opened at start
+        :param maxconn: maximum connections
+        :param wait_timeout: seconds to wait for a free connection
+        :param check_interval: idle seconds after which a connection is checked before reuse
+        :param session: connection.set_session() arguments, default readonly and autocommit
+        :param logger: application logger
+        :param args, kwargs: psycopg2.connect() arguments
+        """
+        self.wait_timeout = wait_timeout
+        self.check_interval = check_interval
+        self.session: Dict[str, bool] = session if session is not None else \
+            {"readonly": True, "autocommit": True}
+        self.logger = logger
+        # id(conn): monotonic time the connection was put back
+        self._idle_since: Dict[int, float] = {}
+        # Metrics
+        self.connects: int = 0
+        self.reconnects: int = 0
+        self.waits: int = 0
+        self.timeouts: int = 0
+        self.max_wait: float = 0.0
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._cond = threading.Condition(self._lock)
+
+    def _connect(self, key=None) -> connection:
+        conn: connection = super()._connect(key)
+        conn.set_session(**self.session)
+        self.connects += 1
+        if key is None:
+            self._idle_since[id(conn)] = time.monotonic()
+        return conn
+
+    def _isAlive(self, conn: connection) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_QUERY_PING)
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as err:
+            if self.logger is not None:
+                self.logger.warning(f"connection pool: {err}")
+            return False
+
+    def getconn(self, key=None) -> connection:
+        """
+        Get a free connection, waiting up to wait_timeout.
+        :raise PoolTimeoutError: no connection became free
+        :raise PoolError: pool is closed
+        """
+        while True:
+            started: float = time.monotonic()
+            idle_since: Optional[float]
+            with self._cond:
+                waited: bool = False
+                while not self.closed and not self._pool and len(self._used) >= self.maxconn:
+                    remaining: float = self.wait_timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeoutError(
+                            f"no free connection within {self.wait_timeout} seconds")
+                    if not waited:
+                        self.waits += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                if waited:
+                    self.max_wait = max(self.max_wait, time.monotonic() - started)
+                conn: connection = self._getconn(key)
+                idle_since = self._idle_since.pop(id(conn), None)
+
+            # A new connection is used as is. A reused one is checked outside the lock
+            # (a broken connection can take a while to fail) and replaced if broken.
+            if idle_since is not None and (conn.closed or (
+                    time.monotonic() - idle_since >= self.check_interval
+                    and not self._isAlive(conn))):
+                self.reconnects += 1
+                self.putconn(conn, key=key, close=True)
+                continue
+            return conn
+
+    def putconn(self, conn: connection = None, key=None, close: bool = False) -> None:
+        """
+        Put back a connection, keeping it idle unless closed, broken or left in a transaction.
+        """
+        with self._cond:
+            if self.closed:
+                raise PoolError("connection pool is closed")
+            if key is None:
+                key = self._rused.get(id(conn))
+                if key is None:
+                    raise PoolError("trying to put unkeyed connection")
+            del self._used[key]
+            del self._rused[id(conn)]
+            if not close and not conn.closed \
+                    and conn.info.transaction_status == _ext.TRANSACTION_STATUS_IDLE:
+                self._pool.append(conn)
+                self._idle_since[id(conn)] = time.monotonic()
+            elif not conn.closed:
+                conn.close()
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: pool metrics
+        """
+        with self._cond:
+            return {
+                "maxconn": self.maxconn,
+                "in_use": len(self._used),
+                "idle": len(self._pool),
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+            }
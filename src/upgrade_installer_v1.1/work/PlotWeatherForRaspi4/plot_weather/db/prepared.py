@@ -0,0 +1,83 @@
+import re
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Set
+
+from psycopg2 import errors
+from psycopg2.extensions import connection, cursor as pg_cursor
+
+"""
+Server-side prepared statements (PREPARE / EXECUTE) tracked per connection.
+"""
+
+# psycopg2 named placeholder: %(name)s
+_PLACEHOLDER: "re.Pattern[str]" = re.compile(r"%\((\w+)\)s")
+
+# connection: names of the statements prepared in its session
+#  (psycopg2 connections do not accept attributes, closed connections drop out)
+_prepared: "weakref.WeakKeyDictionary[connection, Set[str]]" = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def _preparedNames(conn: connection) -> Set[str]:
+    with _prepared_lock:
+        names: Optional[Set[str]] = _prepared.get(conn)
+        if names is None:
+            names = set()
+            _prepared[conn] = names
+        return names
+
+
+class PreparedQuery:
+    """
+    Query prepared once per connection and executed by name, so PostgreSQL
+    parses and plans it only on the first execution in each session.
+    The query uses psycopg2 named placeholders (%(name)s) and returns rows
+    (COPY and DECLARE CURSOR cannot run a prepared statement).
+    """
+    def __init__(self, name: str, query: str):
+        """
+        :param name: statement name, unique in the application
+        :param query: SQL with %(name)s placeholders
+        """
+        self.name = name
+        # placeholder names in $1, $2, ... order
+        self.param_names: List[str] = []
+
+        def to_positional(match: "re.Match[str]") -> str:
+            if match.group(1) not in self.param_names:
+                self.param_names.append(match.group(1))
+            return f"${self.param_names.index(match.group(1)) + 1}"
+
+        sql: str = _PLACEHOLDER.sub(to_positional, query).strip().rstrip(";")
+        self.prepare_sql: str = f"PREPARE {name} AS {sql}"
+        self.execute_sql: str = f"EXECUTE {name}"
+        if len(self.param_names) > 0:
+            self.execute_sql += "(" + ", ".join(["%s"] * len(self.param_names)) + ")"
+
+    def _prepare(self, cursor: pg_cursor, names: Set[str]) -> None:
+        try:
+            cursor.execute(self.prepare_sql)
+        except errors.DuplicatePreparedStatement:
+            # prepared in this session but not tracked (autocommit: no aborted transaction)
+            pass
+        names.add(self.name)
+
+    def execute(self, cursor: pg_cursor, params: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Execute the statement, preparing it first if not yet prepared on the cursor's connection.
+        The result is fetched from the cursor as usual.
+        :param cursor: cursor of an autocommit connection
+        :param params: placeholder values, extra keys are ignored
+        """
+        args: List[Any] = [params[name] for name in self.param_names] if params else []
+        names: Set[str] = _preparedNames(cursor.connection)
+        if self.name not in names:
+            self._prepare(cursor, names)
+        try:
+            cursor.execute(self.execute_sql, args)
+        except errors.InvalidSqlStatementName:
+            # deallocated in the session (e.g. DISCARD ALL): prepare again once
+            names.discard(self.name)
+            self._prepare(cursor, names)
+            cursor.execute(self.execute_sql, args)
@@ -0,0 +1,42 @@
+import enum
+from typing import Dict
+
+""" 気象データ画像のパラメータ ※matplotlibを読み込まずに参照できる """
+
+
+class ImageDateType(enum.Enum):
+    """ 日付データ型 """
+    TODAY = 0      # 当日データ
+    YEAR_MONTH = 1 # 年月データ
+    RANGE = 2      # 期間データ: 当日を含む過去日(検索開始日)からN日後
+
+
+class ParamKey(enum.Enum):
+    TODAY = "today"
+    YEAR_MONTH = "yearMonth"
+    BEFORE_DAYS = "beforeDays"
+    START_DAY = "startDay"
+    PHONE_SIZE = "phoneSize"
+
+
+class ImageDateParams(object):
+    def __init__(self, imageDateType: ImageDateType = ImageDateType.TODAY):
+        self.imageDateType = imageDateType
+        self.typeParams: Dict[ImageDateType, Dict[ParamKey, str]] = {
+            ImageDateType.TODAY: {ParamKey.TODAY: "", ParamKey.PHONE_SIZE: ""},
+            ImageDateType.YEAR_MONTH: {ParamKey.YEAR_MONTH: ""},
+            ImageDateType.RANGE: {
+                ParamKey.START_DAY: "",
+                ParamKey.BEFORE_DAYS: "",
+                ParamKey.PHONE_SIZE: ""
+            }
+        }
+
+    def getParam(self) -> Dict[ParamKey, str]:
+        return self.typeParams[self.imageDateType]
+
+    def setParam(self, param: Dict[ParamKey, str]):
+        self.typeParams[self.imageDateType] = param
+
+    def getImageDateType(self) -> ImageDateType:
+        return self.imageDateType
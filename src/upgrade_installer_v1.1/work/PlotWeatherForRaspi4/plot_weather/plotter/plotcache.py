@@ -0,0 +1,281 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from psycopg2.extensions import connection
+
+from ..dao.todaybuffer import TodayBuffer
+from ..dao.weatherdao import WeatherDao
+from ..util.dateutil import FMT_ISO_8601_DATE
+from .imageparams import ImageDateParams, ImageDateType, ParamKey
+if TYPE_CHECKING:
+    from .renderpool import RenderPool
+
+""" 気象データ画像のキャッシュ """
+
+# キャッシュキー: (デバイス名, 日付データ型, パラメータ(PHONE_SIZEを含む))
+CacheKey = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+# キャッシュデータ: (データ件数, PNG画像)
+CacheValue = Tuple[int, bytes]
+
+# メモリキャッシュの最大件数 ※画像1件は 50〜70KB 程度
+DEFAULT_MAX_ENTRIES: int = 64
+# 期間が終了したデータの更新判定値 ※データが追加されることはない
+WATERMARK_CLOSED: str = "closed"
+# 期間終了後も受信サービスの再送(スプール)データが追加される可能性がある日数
+CLOSED_GRACE_DAYS: int = 1
+
+
+def _cacheKey(device_name: str, image_params: ImageDateParams) -> CacheKey:
+    param: Dict[ParamKey, str] = image_params.getParam()
+    return (device_name, image_params.getImageDateType().name,
+            tuple(sorted((key.value, value) for key, value in param.items())))
+
+
+def _periodRange(image_params: ImageDateParams) -> Tuple[date, date]:
+    """画像の期間
+    :param image_params: 画像パラメータ
+    :return: (期間の開始日, 期間の最終日)
+    """
+    param: Dict[ParamKey, str] = image_params.getParam()
+    image_date_type: ImageDateType = image_params.getImageDateType()
+    if image_date_type == ImageDateType.TODAY:
+        today: date = datetime.strptime(param.get(ParamKey.TODAY, ""), FMT_ISO_8601_DATE).date()
+        return today, today
+
+    if image_date_type == ImageDateType.YEAR_MONTH:
+        # 年月の末日: 翌月1日の前日
+        first_day: date = datetime.strptime(
+            param.get(ParamKey.YEAR_MONTH, "") + "-01", FMT_ISO_8601_DATE).date()
+        return first_day, (first_day + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    # 期間データ: 検索開始日の N日前 〜 検索開始日
+    start_day: date = datetime.strptime(param.get(ParamKey.START_DAY, ""), FMT_ISO_8601_DATE).date()
+    return start_day - timedelta(days=int(param.get(ParamKey.BEFORE_DAYS, ""))), start_day
+
+
+def _isClosedPeriod(image_params: ImageDateParams, end_day: date, today: date) -> bool:
+    """画像の期間が終了しているか
+    :param image_params: 画像パラメータ
+    :param end_day: 期間の最終日
+    :param today: 当日
+    :return: 期間の最終日から CLOSED_GRACE_DAYS 日を過ぎていれば True ※当日データは常に False
+    """
+    if image_params.getImageDateType() == ImageDateType.TODAY:
+        return False
+    return end_day + timedelta(days=CLOSED_GRACE_DAYS) < today
+
+
+def _toHttpTime(local_time: datetime) -> datetime:
+    """ローカル時刻(タイムゾーンなし)をHTTPヘッダ用のUTC時刻(秒単位)に変換する"""
+    return local_time.astimezone(timezone.utc).replace(microsecond=0)
+
+
+@dataclass(frozen=True)
+class PlotValidator:
+    """気象データ画像の更新判定 (HTTP条件付きリクエストの検証子を兼ねる)"""
+    # キャッシュキー
+    key: CacheKey
+    # 更新判定値
+    watermark: str
+    # ETag ※キャッシュキーと更新判定値のハッシュ
+    etag: str
+    # Last-Modified (UTC) ※データがなければNone
+    last_modified: Optional[datetime]
+
+
+def plot_validator(conn: connection, device_name: str, image_params: ImageDateParams,
+                   logger=None) -> PlotValidator:
+    """気象データ画像の更新判定を取得する ※画像は生成しない
+    終了した期間は固定値(最終更新時刻は猶予日数の経過時), 当日を含む期間は期間の件数と最新の測定時刻
+    当日を含む期間は Last-Modified なし (再送データは最新の測定時刻より前に追加されるため ETag のみ)
+    :param conn: 読み込み専用DBコネクション
+    :param device_name: 観測デバイス名
+    :param image_params: 画像パラメータ
+    :param logger: アプリケーションロガー
+    :return: 更新判定
+    """
+    watermark: str
+    last_modified: Optional[datetime]
+    from_day, end_day = _periodRange(image_params)
+    if _isClosedPeriod(image_params, end_day, date.today()):
+        watermark = WATERMARK_CLOSED
+        last_modified = _toHttpTime(
+            datetime.combine(end_day + timedelta(days=CLOSED_GRACE_DAYS + 1), time.min))
+    else:
+        # 当日を含む期間は期間の件数か最新の測定時刻が変わったら再生成する
+        dao = WeatherDao(conn, logger=logger)
+        rec_count, last_time = dao.getRangeWatermark(
+            device_name, from_day.strftime(FMT_ISO_8601_DATE), end_day.strftime(FMT_ISO_8601_DATE))
+        watermark = f"{rec_count}|{last_time.isoformat()}" if last_time is not None else ""
+        last_modified = None
+    key: CacheKey = _cacheKey(device_name, image_params)
+    etag: str = hashlib.sha1(f"{key}|{watermark}".encode("utf-8")).hexdigest()
+    return PlotValidator(key, watermark, etag, last_modified)
+
+
+class PlotCache:
+    """気象データ画像のキャッシュ (スレッドセーフ)
+    メモリ(LRU)と任意のディスクの2階層
+      キー: (デバイス名, 日付データ型, パラメータ) ※パラメータはスマホの画面サイズを含む
+      更新判定値: 当日を含む期間は期間の件数と最新の測定時刻, 終了した期間は固定値
+    更新判定値が一致しないデータは破棄して再生成する
+    ディスクには終了した期間の画像のみ保存する (アプリ再起動後も有効)
+    """
+    def __init__(self,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 cache_dir: Optional[str] = None,
+                 logger: Optional[logging.Logger] = None):
+        """
+        :param max_entries: メモリキャッシュの最大件数
+        :param cache_dir: ディスクキャッシュのディレクトリ ※Noneならディスクキャッシュなし
+        :param logger: アプリケーションロガー
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.logger = logger
+        self.logger_debug: bool = False
+        if self.logger is not None:
+            self.logger_debug = (self.logger.getEffectiveLevel() <= logging.DEBUG)
+        # key: (watermark, value)
+        self._entries: "OrderedDict[CacheKey, Tuple[str, CacheValue]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _diskPath(self, key: CacheKey) -> str:
+        assert self.cache_dir is not None
+        name: str = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name + ".dat")
+
+    def _readDisk(self, key: CacheKey) -> Optional[CacheValue]:
+        path: str = self._diskPath(key)
+        try:
+            with open(path, "rb") as fp:
+                # 1行目: データ件数, 2行目以降: PNG画像
+                rec_count: int = int(fp.readline())
+                png: bytes = fp.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            if self.logger is not None:
+                self.logger.warning(f"plot cache read {path}: {err}")
+            return None
+
+        return rec_count, png
+
+    def _writeDisk(self, key: CacheKey, value: CacheValue) -> None:
+        path: str = self._diskPath(key)
+        tmp_path: str = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, "wb") as fp:
+                fp.write(f"{value[0]}\n".encode("ascii"))
+                fp.write(value[1])
+            os.replace(tmp_path, path)
+        except OSError as err:
+            if self.logger is not None:
+                self.logger.warning(f"plot cache write {path}: {err}")
+
+    def get(self, key: CacheKey, watermark: str) -> Optional[CacheValue]:
+        """キャッシュデータを取得する
+        :param key: キャッシュキー
+        :param watermark: 更新判定値
+        :return: キャッシュデータ, ただしないか更新判定値が一致しない場合は None
+        """
+        with self._lock:
+            entry: Optional[Tuple[str, CacheValue]] = self._entries.get(key)
+            if entry is not None and entry[0] == watermark:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        value: Optional[CacheValue] = None
+        if self.cache_dir is not None and watermark == WATERMARK_CLOSED:
+            value = self._readDisk(key)
+        with self._lock:
+            if value is not None:
+                self._putMemory(key, watermark, value)
+                self.hits += 1
+            else:
+                self.misses += 1
+        return value
+
+    def _putMemory(self, key: CacheKey, watermark: str, value: CacheValue) -> None:
+        self._entries[key] = (watermark, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: CacheKey, watermark: str, value: CacheValue) -> None:
+        """キャッシュデータを保存する ※同一キーの古い更新判定値のデータは置き換える
+        :param key: キャッシュキー
+        :param watermark: 更新判定値
+        :param value: キャッシュデータ
+        """
+        with self._lock:
+            self._putMemory(key, watermark, value)
+        if self.cache_dir is not None and watermark == WATERMARK_CLOSED:
+            self._writeDisk(key, value)
+
+    def clear(self) -> None:
+        """ メモリキャッシュをクリアする """
+        with self._lock:
+            self._entries.clear()
+
+
+def gen_plot_png_cached(
+        cache: Optional[PlotCache],
+        conn: connection, device_name: str, image_params: ImageDateParams, logger=None,
+        today_buffer: Optional[TodayBuffer] = None,
+        render_pool: Optional["RenderPool"] = None,
+        validator: Optional[PlotValidator] = None
+) -> Tuple[int, Optional[bytes]]:
+    """キャッシュを使って気象データ画像を取得する ※引数と戻り値は gen_plot_png と同じ
+    キャッシュにない場合のみ画像を生成してキャッシュする (データ件数0は除く)
+    :param cache: 画像キャッシュ ※Noneならキャッシュしない
+    :param validator: 取得済みの更新判定 ※Noneなら取得する
+    """
+    # matplotlibは最初の画像生成時に読み込む (アプリ起動時間の短縮)
+    from .plotterweather import gen_plot_png
+
+    if cache is None:
+        return gen_plot_png(conn, device_name, image_params, logger=logger,
+                            today_buffer=today_buffer, render_pool=render_pool)
+
+    if validator is None:
+        validator = plot_validator(conn, device_name, image_params, logger=logger)
+    key: CacheKey = validator.key
+    watermark: str = validator.watermark
+    value: Optional[CacheValue] = cache.get(key, watermark)
+    if cache.logger is not None and cache.logger_debug:
+        cache.logger.debug(f"plot cache {key}, {watermark}: {'hit' if value else 'miss'}")
+    if value is not None:
+        return value
+
+    rec_count, png = gen_plot_png(conn, device_name, image_params, logger=logger,
+                                  today_buffer=today_buffer, render_pool=render_pool)
+    if rec_count > 0 and png is not None:
+        cache.put(key, watermark, (rec_count, png))
+    return rec_count, png
+
+
+def gen_plot_image_cached(
+        cache: Optional[PlotCache],
+        conn: connection, device_name: str, image_params: ImageDateParams, logger=None,
+        today_buffer: Optional[TodayBuffer] = None,
+        render_pool: Optional["RenderPool"] = None
+) -> Tuple[int, Optional[str]]:
+    """キャッシュを使って気象データ画像をbase64画像形式文字列で取得する
+    ※引数と戻り値は gen_plot_image と同じ
+    """
+    from .plotterweather import png_to_img_src
+
+    rec_count, png = gen_plot_png_cached(cache, conn, device_name, image_params, logger=logger,
+                                         today_buffer=today_buffer, render_pool=render_pool)
+    return rec_count, png_to_img_src(png)
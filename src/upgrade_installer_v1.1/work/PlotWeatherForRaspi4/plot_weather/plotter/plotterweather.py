@@ -1,13 +1,13 @@
 import base64
-import enum
 import logging
-from typing import Dict, List, Optional, Tuple, Union
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 from datetime import date, datetime, timedelta
 from io import BytesIO
-from io import StringIO
 
 from ..dao.weathercommon import PLOT_CONF
 from psycopg2.extensions import connection
+import numpy as np
 import pandas as pd
 import matplotlib.dates as mdates
 from matplotlib import rcParams
@@ -34,15 +34,21 @@ rcParams[font_family_font] = PLOT_CONF['japanese.font']
 #  (1) font.family: sans-serif
 #      "IPAexGothic" を先頭に追記する
 #  (2) font.sans-serif: IPAexGothic, DejaVu Sans, ..., sans-serif
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 from matplotlib.pyplot import setp
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox
 from matplotlib import axes
 
-from ..dao.weatherdao import WeatherDao
-from ..util.dateutil import (addDayToString, datetimeToJpDateWithWeek,
-                             strDateToDatetimeTime000000,
-                             FMT_ISO_8601_DATE, FMT_CUSTOM_DATETIME
-                             )
+from ..dao.todaybuffer import TodayBuffer
+from ..dao.weatherdao import PIXELS_PER_POINT, WeatherDao
+from .imageparams import ImageDateParams, ImageDateType, ParamKey
+from .weatherdata import loadBeforeDaysRangeDataFrame, loadMonthDataFrame, loadTodayDataFrame
+from ..util.dateutil import datetimeToJpDateWithWeek, FMT_ISO_8601_DATE, FMT_CUSTOM_DATETIME
+if TYPE_CHECKING:
+    from .renderpool import RenderPool
 
 """ 気象データ画像のbase64エンコードテキストデータを出力する """
 
@@ -54,242 +60,81 @@ LABEL_FONT_SIZE: int = 10
 GRID_STYLES: Dict[str, Union[str, float]] = {"linestyle": "- -", "linewidth": 1.0}
 
 
-class ImageDateType(enum.Enum):
-    """ 日付データ型 """
-    TODAY = 0      # 当日データ
-    YEAR_MONTH = 1 # 年月データ
-    RANGE = 2      # 期間データ: 当日を含む過去日(検索開始日)からN日後
-
-
-class ParamKey(enum.Enum):
-    TODAY = "today"
-    YEAR_MONTH = "yearMonth"
-    BEFORE_DAYS = "beforeDays"
-    START_DAY = "startDay"
-    PHONE_SIZE = "phoneSize"
-
-
-class ImageDateParams(object):
-    def __init__(self, imageDateType: ImageDateType = ImageDateType.TODAY):
-        self.imageDateType = imageDateType
-        self.typeParams: Dict[ImageDateType, Dict[ParamKey, str]] = {
-            ImageDateType.TODAY: {ParamKey.TODAY: "", ParamKey.PHONE_SIZE: ""},
-            ImageDateType.YEAR_MONTH: {ParamKey.YEAR_MONTH: ""},
-            ImageDateType.RANGE: {
-                ParamKey.START_DAY: "",
-                ParamKey.BEFORE_DAYS: "",
-                ParamKey.PHONE_SIZE: ""
-            }
-        }
-
-    def getParam(self) -> Dict[ParamKey, str]:
-        return self.typeParams[self.imageDateType]
-
-    def setParam(self, param: Dict[ParamKey, str]):
-        self.typeParams[self.imageDateType] = param
-
-    def getImageDateType(self) -> ImageDateType:
-        return self.imageDateType
-
-
-def _to_japanese_date(s_date: str) -> str:
+def _plotWidthPixel(s_phone_size: str) -> int:
+    """図の横幅(ピクセル) ※図の生成と同じ計算
+    :param s_phone_size: スマホの画面サイズ("幅x高さxdensity") ※PCブラウザは空文字
+    :return: 横幅(ピクセル)
     """
-    ISO8601日付文字列を日本語日付に変換
-    :param s_date: ISO8601日付文字列
-    :return 日本語日付
-    """
-    date_parts: List[str] = s_date.split("-")
-    return f"{date_parts[0]}年{date_parts[1]}月{date_parts[2]}日"
-
-
-def loadTodayDataFrame(
-        dao: WeatherDao, device_name: str, today_iso8601: str,
-        logger: Optional[Optional[logging.Logger]] = None, logger_debug: bool = False
-) -> Tuple[int, Optional[pd.DataFrame], Optional[str], Optional[datetime], Optional[datetime]]:
-    # dao return StringIO buffer(line'\n') on csv format with header
-    rec_count: int
-    csv_buffer: StringIO
-    rec_count, csv_buffer = dao.getTodayData(device_name, today_iso8601, require_header=True)
-    # 件数なし
-    if rec_count == 0:
-        return rec_count, None, None, None, None
-
-    df: pd.DataFrame = pd.read_csv(
-        csv_buffer,
-        header=0,
-        parse_dates=[WEATHER_IDX_COLUMN],
-        names=[WEATHER_IDX_COLUMN, 'temp_out', 'temp_in', 'humid', 'pressure']  # Use cols
-    )
-    if logger is not None and logger_debug:
-        logger.debug(f"Before df:\n{df}")
-        logger.debug(f"Before df.index:\n{df.index}")
-
-    # タイムスタンプをデータフレームのインデックスに設定
-    #  df.index: RangeIndex(start=0, stop=70, step=1) ※行番号 (0..)
-    #   drop=False: "measurement_time"列をDataFrameに残す
-    #   inplace=True: オリジナルのDataFrameのインデックスを"measurement_time"列にする
-    #   inplace=False: オリジナルのインデックスは更新されず、更新されたコピーが返却される
-    #    df = df.set_index(WEATHER_IDX_COLUMN)  とする必要がある
-    df.set_index(WEATHER_IDX_COLUMN, drop=False, inplace=True)
-    if logger is not None and logger_debug:
-        logger.debug(f"After df:\n{df}")
-        logger.debug(f"After df.index:\n{df.index}")
-    if not df.empty:
-        # 先頭の測定日付(Pandas Timestamp) から Pythonのdatetimeに変換
-        # https://pandas.pydata.org/pandas-docs/version/0.22/generated/pandas.Timestamp.to_datetime.html
-        first_datetime = df.index[0].to_pydatetime()
-    else:
-        # No data: Since the broadcast of observation data is every 10 minutes,
-        #          there may be cases where there is no data at the time of execution.
-        first_datetime = datetime.now()
-    # 当日の日付文字列 ※一旦 dateオブジェクトに変換して"年月日"を取得
-    s_first_date: str = first_datetime.date().isoformat()
-    # 表示範囲：当日の "00:00:00" から
-    x_day_min: datetime = strDateToDatetimeTime000000(s_first_date)
-    # 翌日の "00:00:00" 迄
-    s_nextday: str = addDayToString(s_first_date)
-    x_day_max: datetime = strDateToDatetimeTime000000(s_nextday)
-    # タイトル用の日本語日付(曜日)
-    s_title_date: str = datetimeToJpDateWithWeek(first_datetime)
-    return rec_count, df, s_title_date, x_day_min, x_day_max
-
-
-def loadMonthDataFrame(
-        dao: WeatherDao, device_name: str, year_month: str = "",
-        logger: Optional[logging.Logger] = None, logger_debug: bool = False
-) -> Tuple[int, Optional[pd.DataFrame], Optional[str]]:
-    rec_count: int
-    csv_buffer: StringIO
-    rec_count, csv_buffer = dao.getMonthData(device_name, year_month,
-                                             require_header=True)
-    # 件数なし
-    if rec_count == 0:
-        return rec_count, None, None
-
-    # タイムスタンプをデータフレームのインデックスに設定
-    df: pd.DataFrame = pd.read_csv(
-        csv_buffer,
-        header=0,
-        parse_dates=[WEATHER_IDX_COLUMN],
-        names=[WEATHER_IDX_COLUMN, 'temp_out', 'temp_in', 'humid', 'pressure']
-    )
-    if logger is not None and logger_debug:
-        logger.debug(df)
-
-    # タイムスタンプをデータフレームのインデックスに設定
-    df.set_index(WEATHER_IDX_COLUMN, drop=False, inplace=True)
-    # タイトル用の日本語日付(曜日)
-    date_parts: List[str] = year_month.split("-")
-    s_title_date = f"{date_parts[0]}年{date_parts[1]}月"
-    return rec_count, df, s_title_date
-
-
-def loadBeforeDaysRangeDataFrame(
-        dao: WeatherDao, device_name: str,
-        s_start_day: str,
-        before_days: int,
-        logger: Optional[logging.Logger] = None, logger_debug: bool = False
-) -> Tuple[int, Optional[pd.DataFrame], Optional[str]]:
-    start_day: datetime = datetime.strptime(s_start_day, FMT_ISO_8601_DATE)
-    from_date_val: datetime = start_day - timedelta(days=before_days)
-    s_from_date: str = from_date_val.strftime(FMT_ISO_8601_DATE)
-    s_to_date: str = start_day.strftime(FMT_ISO_8601_DATE)
-    if logger is not None and logger_debug:
-        logger.debug(f"from_date: {s_from_date}, to_date: {s_from_date}")
-    rec_count: int
-    csv_buffer: StringIO
-    rec_count, csv_buffer = dao.getFromToRangeData(
-        device_name, s_from_date, s_to_date, require_header=True)
-    # 件数なし
-    if rec_count == 0:
-        return rec_count, None, None
-
-    # タイムスタンプをデータフレームのインデックスに設定
-    df: pd.DataFrame = pd.read_csv(
-        csv_buffer,
-        header=0,
-        parse_dates=[WEATHER_IDX_COLUMN],
-        names=[WEATHER_IDX_COLUMN, 'temp_out', 'temp_in', 'humid', 'pressure']
-    )
-    if logger is not None and logger_debug:
-        logger.debug(df)
+    if s_phone_size is not None and len(s_phone_size) > 8:
+        sizes: List[str] = s_phone_size.split("x")
+        density: float = float(sizes[2])
+        return int(int(sizes[0]) / (2.0 if density > 2.0 else density))
 
-    # タイムスタンプをデータフレームのインデックスに設定
-    df.set_index(WEATHER_IDX_COLUMN, drop=False, inplace=True)
-    # タイトル用の日本語日付: from_date 〜 to_date
-    s_from_date = _to_japanese_date(s_from_date)
-    s_to_date = _to_japanese_date(s_to_date)
-    s_title_date: str = f"{s_from_date} 〜 {s_to_date}"
-    return rec_count, df, s_title_date
+    return int(PLOT_CONF["figsize"]["pc"][0] * rcParams["figure.dpi"])
 
 
 def _temperaturePlotting(
-        ax: axes.Axes, df: pd.DataFrame, titleDate: str, labelFontSize: int) -> None:
+        ax: axes.Axes, x_init: np.ndarray, labelFontSize: int) -> Tuple[Line2D, Line2D, Text]:
     """
-    温度サブプロット(axes)にタイトル、軸・軸ラベルを設定し、
-    DataFrameオプジェクトの外気温・室内気温データをプロットする
+    温度サブプロット(axes)にタイトル、軸・軸ラベルを設定し、外気温・室内気温の線を生成する
     :param ax:温度サブプロット(axes)
-    :param df:DataFrameオプジェクト
-    :param titleDate: タイトル日付文字列
+    :param x_init: 線の初期データ(x軸) ※x軸を日付軸にするため
     :param labelFontSize: ラベルフォントサイズ
+    :return: 外気温の線, 室内気温の線, タイトル
     """
-    ax.plot(df[WEATHER_IDX_COLUMN], df["temp_out"], color="blue", marker="", label="外気温")
-    ax.plot(df[WEATHER_IDX_COLUMN], df["temp_in"], color="red", marker="", label="室内気温")
+    y_init: List[float] = [np.nan] * len(x_init)
+    (line_temp_out,) = ax.plot(x_init, y_init, color="blue", marker="", label="外気温")
+    (line_temp_in,) = ax.plot(x_init, y_init, color="red", marker="", label="室内気温")
     ax.set_ylim(PLOT_CONF["ylim"]["temp"])
     ax.set_ylabel("気温 (℃)", fontsize=labelFontSize)
     ax.legend(loc="best")
-    ax.set_title(f"気象データ：{titleDate}")
+    title: Text = ax.set_title("気象データ：")
     # Hide xlabel
     ax.label_outer()
     ax.grid(GRID_STYLES)
+    return line_temp_out, line_temp_in, title
 
 
-def _humidPlotting(ax: axes.Axes, df: pd.DataFrame, labelFontSize) -> None:
+def _humidPlotting(ax: axes.Axes, x_init: np.ndarray, labelFontSize) -> Line2D:
     """
-    湿度サブプロット(axes)に軸・軸ラベルを設定し、DataFrameオプジェクトの室内湿度データをプロットする
+    湿度サブプロット(axes)に軸・軸ラベルを設定し、室内湿度の線を生成する
     :param ax:湿度サブプロット(axes)
-    :param df:DataFrameオプジェクト
+    :param x_init: 線の初期データ(x軸)
     :param labelFontSize: ラベルフォントサイズ
+    :return: 室内湿度の線
     """
-    ax.plot(df[WEATHER_IDX_COLUMN], df["humid"], color="green", marker="")
+    (line_humid,) = ax.plot(x_init, [np.nan] * len(x_init), color="green", marker="")
     ax.set_ylim([0, 100])
     ax.set_ylabel("室内湿度 (％)", fontsize=labelFontSize)
     # Hide xlabel
     ax.label_outer()
     ax.grid(GRID_STYLES)
+    return line_humid
 
 
-def _pressurePlotting(ax: axes.Axes, df: pd.DataFrame, labelFontSize: int) -> None:
+def _pressurePlotting(ax: axes.Axes, x_init: np.ndarray, labelFontSize: int) -> Line2D:
     """
-    気圧サブプロット(axes)に軸・軸ラベルを設定し、DataFrameオプジェクトの気圧データをプロットする
+    気圧サブプロット(axes)に軸・軸ラベルを設定し、気圧の線を生成する
     :param ax:気圧サブプロット(axes)
-    :param df:DataFrameオプジェクト
+    :param x_init: 線の初期データ(x軸)
     :param labelFontSize: ラベルフォントサイズ
+    :return: 気圧の線
     """
-    ax.plot(df[WEATHER_IDX_COLUMN], df["pressure"], color="fuchsia", marker="")
+    (line_pressure,) = ax.plot(x_init, [np.nan] * len(x_init), color="fuchsia", marker="")
     ax.set_ylim(PLOT_CONF["ylim"]["pressure"])
     ax.set_ylabel("hPa", fontsize=labelFontSize)
     ax.grid(GRID_STYLES)
+    return line_pressure
 
 
 def _axesPressureSettingWithBeforeDays(
-        ax: axes.Axes, start_day: str, beforeDays: int, xDateTickFontSize: int) -> None:
+        ax: axes.Axes, beforeDays: int, xDateTickFontSize: int) -> None:
     """
     気圧サブプロットの期間指定x軸ラベルを設定する
     :param ax:気圧サブプロット(axes)
-    :param start_day: 検索日 ※本日以外にアプリから過去の任意の日付を指定可能
     :param beforeDays: 当日からＮ日前のＮ
     :param xDateTickFontSize: 日付軸ラベルフォントサイズ
     """
-    # datetimeオブジェタクトに変更
-    start_datetime: datetime = datetime.strptime(start_day, FMT_ISO_8601_DATE)
-    # デフォルトでは最後の軸に対応する日付ラベルが表示されない
-    # 次の日の 00:30 までラベルを表示するための日付計算
-    next_day: datetime = start_datetime + timedelta(days=1)
-    s_next_day: str = next_day.strftime("%Y-%m-%d 00:30:00")
-    # datetimeオブジェクトに戻す
-    next_day = datetime.strptime(s_next_day, FMT_CUSTOM_DATETIME)
-    ax.set_xlim(xmax=next_day)
     if beforeDays == 7:
         ax.xaxis.set_major_formatter(mdates.DateFormatter("%m/%d"))
         ax.tick_params(axis='x', labelsize=xDateTickFontSize - 1)
@@ -299,13 +144,236 @@ def _axesPressureSettingWithBeforeDays(
         ax.tick_params(axis='x', labelsize=xDateTickFontSize - 1, labelrotation=45)
 
 
-def gen_plot_image(
-        conn: connection, device_name: str, image_params: ImageDateParams, logger=None
-) -> Tuple[int, Optional[str]]:
-    # for ImageDateType.TODAY
-    global x_day_min, x_day_max
-    # for ImageDateType.RANGE
-    global s_start_day, before_days
+def _beforeDaysXmax(start_day: str) -> datetime:
+    """
+    期間データのx軸の最大値
+    :param start_day: 検索日 ※本日以外にアプリから過去の任意の日付を指定可能
+    :return: 検索日の翌日 00:30
+    """
+    # datetimeオブジェタクトに変更
+    start_datetime: datetime = datetime.strptime(start_day, FMT_ISO_8601_DATE)
+    # デフォルトでは最後の軸に対応する日付ラベルが表示されない
+    # 次の日の 00:30 までラベルを表示するための日付計算
+    next_day: datetime = start_datetime + timedelta(days=1)
+    s_next_day: str = next_day.strftime("%Y-%m-%d 00:30:00")
+    # datetimeオブジェクトに戻す
+    return datetime.strptime(s_next_day, FMT_CUSTOM_DATETIME)
+
+
+# テンプレートキー: (図のサイズ(inch), 日付データ型, 期間データのN日前 ※期間データ以外は0)
+TemplateKey = Tuple[Tuple[float, float], ImageDateType, int]
+# 描画する線(気象データの列)毎の (x, y) 配列 ※描画プロセスへ渡すためDataFrameではなく配列
+#   間引き後は線毎に残す測定時刻が異なる
+PlotLines = Dict[str, Tuple[np.ndarray, np.ndarray]]
+# x軸の範囲 (最小, 最大) ※Noneはデータから自動計算
+PlotXlim = Tuple[Optional[datetime], Optional[datetime]]
+# 描画する気象データの列
+PLOT_LINES: Tuple[str, ...] = ("temp_out", "temp_in", "humid", "pressure")
+
+
+def _downsampleMinMax(x: np.ndarray, y: np.ndarray,
+                      buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    x軸を等間隔のバケットに分け、バケット毎に最小値と最大値の測定点のみ残す (時刻順)
+    ピーク値は残るため描画幅のバケットなら間引き前と見た目は変わらない
+    欠測(NaN)のみのバケットは欠測を1点残す (線を途切れさせる)
+    :param x: 測定時刻 (昇順)
+    :param y: 測定値
+    :param buckets: バケット数
+    :return: 間引き後の (x, y) ※件数がバケット数の2倍以下なら間引かない
+    """
+    size: int = len(x)
+    if size <= buckets * 2:
+        return x, y
+
+    x_int: np.ndarray = x.astype("datetime64[us]").astype(np.int64)
+    span: int = int(x_int[-1] - x_int[0])
+    if span <= 0:
+        return x, y
+
+    bucket: np.ndarray = np.minimum(
+        ((x_int - x_int[0]) * (buckets / span)).astype(np.int64), buckets - 1)
+    # xが昇順なのでバケット番号も昇順: バケットの先頭位置
+    starts: np.ndarray = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    # バケット内で値の昇順(降順)に並べた先頭が最小値(最大値) ※欠測は最小/最大の対象外
+    is_nan: np.ndarray = np.isnan(y)
+    idx_min: np.ndarray = np.lexsort((np.where(is_nan, np.inf, y), bucket))[starts]
+    idx_max: np.ndarray = np.lexsort((np.where(is_nan, np.inf, -y), bucket))[starts]
+    idx: np.ndarray = np.union1d(idx_min, idx_max)
+    return x[idx], y[idx]
+
+
+def _toPlotLines(df: pd.DataFrame, plot_width: int) -> PlotLines:
+    """
+    気象データを線毎の配列に変換する ※描画幅を超える測定点は線毎に間引く
+    :param df: 気象データ (測定時刻インデックス)
+    :param plot_width: 描画幅(ピクセル)
+    :return: 線毎の (x, y) 配列
+    """
+    x: np.ndarray = df.index.to_numpy()
+    buckets: int = max(plot_width // PIXELS_PER_POINT, 1)
+    return {name: _downsampleMinMax(x, df[name].to_numpy(), buckets) for name in PLOT_LINES}
+
+
+class _FigureTemplate:
+    """
+    図のテンプレート: 図, サブプロット, 軸ラベル, フォーマッター, 線を生成済み
+    リクエスト毎に線のデータ, タイトル, x軸の範囲のみ更新して描画する
+    レイアウト(constrained_layout)と画像の切り出し範囲(bbox_inches="tight")は初回の描画時に確定する
+    """
+    def __init__(self, key: TemplateKey):
+        self.key = key
+        figsize, image_date_type, before_days = key
+        fig = Figure(figsize=figsize, constrained_layout=True)
+        FigureCanvasAgg(fig)
+        # x軸を共有する3行1列のサブプロット生成
+        (ax_temp, ax_humid, ax_pressure) = fig.subplots(3, 1, sharex=True)
+
+        # 軸ラベルのフォントサイズを設定
+        #  ラベルフォントサイズ, y軸ラベルフォントサイズ, x軸(日付)ラベルフォントサイズ
+        labelFontSize: int = PLOT_CONF["label.sizes"][0]
+        yTickLabelsFontSize: int = PLOT_CONF["label.sizes"][1]
+        dateTickLablesFontSize: int = PLOT_CONF["label.sizes"][2]
+        for ax in [ax_temp, ax_humid, ax_pressure]:
+            setp(ax.get_xticklabels(), fontsize=dateTickLablesFontSize)
+            setp(ax.get_yticklabels(), fontsize=yTickLabelsFontSize)
+
+        # サブプロットの設定 ※x軸を日付軸にするため日時の初期データで線を生成する
+        x_init: np.ndarray = np.array([datetime(2000, 1, 1)], dtype="datetime64[us]")
+        # 1.外気温と室内気温
+        self.line_temp_out, self.line_temp_in, self.title = _temperaturePlotting(
+            ax_temp, x_init, labelFontSize)
+        # 2.室内湿度
+        self.line_humid = _humidPlotting(ax_humid, x_init, labelFontSize)
+        # 3.気圧
+        if image_date_type == ImageDateType.TODAY:
+            # 当日データのx軸フォーマット: 軸ラベルは時間 (00,03,06,09,12,15,18,21,翌日の00)
+            ax_pressure.xaxis.set_major_formatter(mdates.DateFormatter("%H"))
+        elif image_date_type == ImageDateType.YEAR_MONTH:
+            # 年月指定データのx軸フォーマット設定: 軸は"月/日"
+            ax_pressure.xaxis.set_major_formatter(mdates.DateFormatter("%m/%d"))
+        else:
+            # 期間データのx軸フォーマット設定
+            _axesPressureSettingWithBeforeDays(ax_pressure, before_days, dateTickLablesFontSize)
+        self.line_pressure = _pressurePlotting(ax_pressure, x_init, labelFontSize)
+
+        self.fig = fig
+        self.axes_list: List[axes.Axes] = [ax_temp, ax_humid, ax_pressure]
+        # 画像の切り出し範囲 ※初回の描画で確定
+        self.bbox: Optional[Bbox] = None
+
+    def render(self, lines: PlotLines, title_date: str, xlim: PlotXlim) -> bytes:
+        """
+        データを更新してPNG画像を出力する
+        :param lines: 線毎の (x, y) 配列
+        :param title_date: タイトル用の日付文字列
+        :param xlim: x軸の範囲 (最小, 最大) ※Noneはデータから自動計算
+        :return: PNG画像
+        """
+        self.line_temp_out.set_data(*lines["temp_out"])
+        self.line_temp_in.set_data(*lines["temp_in"])
+        self.line_humid.set_data(*lines["humid"])
+        self.line_pressure.set_data(*lines["pressure"])
+        self.title.set_text(f"気象データ：{title_date}")
+        # x軸の範囲: y軸は固定
+        ax_temp: axes.Axes = self.axes_list[0]
+        for ax in self.axes_list:
+            ax.relim()
+        ax_temp.set_autoscalex_on(True)
+        ax_temp.autoscale_view(scalex=True, scaley=False)
+        if xlim[0] is not None or xlim[1] is not None:
+            ax_temp.set_xlim(left=xlim[0], right=xlim[1])
+
+        buf = BytesIO()
+        if self.bbox is None:
+            # 初回: レイアウトを計算し、画像の切り出し範囲を確定してレイアウト計算を止める
+            canvas: FigureCanvasAgg = self.fig.canvas
+            canvas.draw()
+            self.bbox = self.fig.get_tightbbox(canvas.get_renderer()).padded(
+                rcParams["savefig.pad_inches"])
+            if hasattr(self.fig, "set_layout_engine"):
+                self.fig.set_layout_engine(None)
+            else:
+                # matplotlib < 3.6
+                self.fig.set_constrained_layout(False)
+        self.fig.savefig(buf, format="png", bbox_inches=self.bbox)
+        return buf.getvalue()
+
+
+class _FigureTemplatePool:
+    """
+    図のテンプレートのプール (スレッドセーフ)
+    テンプレートは同時に1リクエストのみ使用する, 使用中なら新たに生成する
+    未使用のテンプレートが最大数を超えたら最も古いものから破棄する
+    """
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self._idle: List[_FigureTemplate] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, key: TemplateKey) -> _FigureTemplate:
+        with self._lock:
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i].key == key:
+                    return self._idle.pop(i)
+        return _FigureTemplate(key)
+
+    def release(self, template: _FigureTemplate) -> None:
+        with self._lock:
+            self._idle.append(template)
+            if len(self._idle) > self.max_idle:
+                self._idle.pop(0)
+
+
+# 未使用の図のテンプレートの最大数 ※図のサイズ(端末)と日付データ型の組み合わせ数
+FIGURE_TEMPLATE_MAX: int = 8
+_template_pool = _FigureTemplatePool(FIGURE_TEMPLATE_MAX)
+# ダミー描画中はロック: 同時の描画は終了を待って図のテンプレートを再利用する
+_warmup_lock = threading.Lock()
+
+
+def _render(key: TemplateKey, lines: PlotLines, title_date: str, xlim: PlotXlim) -> bytes:
+    template: _FigureTemplate = _template_pool.acquire(key)
+    try:
+        return template.render(lines, title_date, xlim)
+    finally:
+        _template_pool.release(template)
+
+
+def render_png(key: TemplateKey, lines: PlotLines, title_date: str, xlim: PlotXlim) -> bytes:
+    """
+    図のテンプレートにデータを設定してPNG画像を出力する ※描画プロセスからも呼び出される
+    :param key: テンプレートキー
+    :param lines: 線毎の (x, y) 配列
+    :param title_date: タイトル用の日付文字列
+    :param xlim: x軸の範囲
+    :return: PNG画像
+    """
+    if _warmup_lock.locked():
+        with _warmup_lock:
+            pass
+    return _render(key, lines, title_date, xlim)
+
+
+def warmup_render() -> None:
+    """
+    ダミーデータを描画してフォントとテキスト描画のキャッシュを作成する (起動直後の描画用)
+    PCブラウザの当日データの図のテンプレートは最初のリクエストで再利用される
+    """
+    x_min: datetime = datetime(2000, 1, 1)
+    x_max: datetime = datetime(2000, 1, 2)
+    x: np.ndarray = np.array([x_min, x_max], dtype="datetime64[us]")
+    lines: PlotLines = {name: (x, np.zeros(len(x), dtype=np.float32)) for name in PLOT_LINES}
+    key: TemplateKey = (tuple(PLOT_CONF["figsize"]["pc"]), ImageDateType.TODAY, 0)
+    with _warmup_lock:
+        _render(key, lines, datetimeToJpDateWithWeek(x_min), (x_min, x_max))
+
+
+def gen_plot_png(
+        conn: connection, device_name: str, image_params: ImageDateParams, logger=None,
+        today_buffer: Optional[TodayBuffer] = None,
+        render_pool: Optional["RenderPool"] = None
+) -> Tuple[int, Optional[bytes]]:
     if logger is not None:
         logger_debug = (logger.getEffectiveLevel() <= logging.DEBUG)
     else:
@@ -313,6 +381,8 @@ def gen_plot_image(
 
     dao = WeatherDao(conn, logger=logger)
     s_phone_size: str = ""
+    before_days: int = 0
+    xlim: PlotXlim = (None, None)
     if image_params.getImageDateType() == ImageDateType.TODAY:
         param: Dict[ParamKey, str] = image_params.getParam()
         s_phone_size = param.get(ParamKey.PHONE_SIZE, "")
@@ -321,36 +391,44 @@ def gen_plot_image(
         if logger is not None and logger_debug:
             logger.debug(f"today: {s_today}, phone_size: {s_phone_size}")
         rec_count, df, title_date, x_day_min, x_day_max = loadTodayDataFrame(
-            dao, device_name, s_today, logger=logger, logger_debug=logger_debug
+            dao, device_name, s_today, today_buffer=today_buffer,
+            logger=logger, logger_debug=logger_debug
         )
+        # 当日データx軸の範囲: 当日 00時 から 翌日 00時
+        xlim = (x_day_min, x_day_max)
     elif image_params.getImageDateType() == ImageDateType.YEAR_MONTH:
         # 指定された年月データ
         param: Dict[ParamKey, str] = image_params.getParam()
         s_year_month: str = param.get(ParamKey.YEAR_MONTH, "")
         if logger is not None and logger_debug:
             logger.debug(f"s_year_month: {s_year_month}")
+        # 描画幅に見合った粒度のデータ(集計テーブル)を取得する
         rec_count, df, title_date = loadMonthDataFrame(
-            dao, device_name, year_month=s_year_month, logger=logger, logger_debug=logger_debug
+            dao, device_name, year_month=s_year_month, plot_width=_plotWidthPixel(s_phone_size),
+            logger=logger, logger_debug=logger_debug
         )
     else:
         # 範囲指定データ
         param: Dict[ParamKey, str]  = image_params.getParam()
         # [仕様変更] 検索開始日 (start_day)
-        s_start_day = param.get(ParamKey.START_DAY, "")
-        s_before_days = param.get(ParamKey.BEFORE_DAYS, "")
+        s_start_day: str = param.get(ParamKey.START_DAY, "")
+        s_before_days: str = param.get(ParamKey.BEFORE_DAYS, "")
         s_phone_size = param.get(ParamKey.PHONE_SIZE, "")
         if logger is not None and logger_debug:
             logger.debug(f"start_day: {s_start_day}, before_days: {s_before_days}")
         before_days = int(s_before_days)
         rec_count, df, title_date = loadBeforeDaysRangeDataFrame(
-            dao, device_name, s_start_day, before_days,
+            dao, device_name, s_start_day, before_days, plot_width=_plotWidthPixel(s_phone_size),
             logger=logger, logger_debug=logger_debug
         )
+        # 期間データx軸の最大値: 検索日の翌日 00:30
+        xlim = (None, _beforeDaysXmax(s_start_day))
     # 件数チェック
     if rec_count == 0:
         return rec_count, None
 
-    # 図の生成
+    # 図のサイズ
+    figsize: Tuple[float, float]
     if s_phone_size is not None and len(s_phone_size) > 8:
         sizes: List[str] = s_phone_size.split("x")
         widthPixel: int = int(sizes[0])
@@ -369,54 +447,46 @@ def gen_plot_image(
         if logger is not None and logger_debug:
             logger.debug(f"px: {px} / density : {density}")
             logger.debug(f"fig_width_px: {fig_width_px}, fig_height_px: {fig_height_px}")
-        fig = Figure(figsize=(fig_width_px, fig_height_px), constrained_layout=True)
+        figsize = (fig_width_px, fig_height_px)
     else:
         # PCブラウザはinch指定
-        fig = Figure(figsize=PLOT_CONF["figsize"]["pc"], constrained_layout=True)
-    if logger is not None and logger_debug:
-        logger.debug(f"fig: {fig}")
-
-    # x軸を共有する3行1列のサブプロット生成
-    (ax_temp, ax_humid, ax_pressure) = fig.subplots(3, 1, sharex=True)
-
-    # 軸ラベルのフォントサイズを設定
-    #  ラベルフォントサイズ, y軸ラベルフォントサイズ, x軸(日付)ラベルフォントサイズ
-    labelFontSize: int = PLOT_CONF["label.sizes"][0]
-    yTickLabelsFontSize: int = PLOT_CONF["label.sizes"][1]
-    dateTickLablesFontSize: int = PLOT_CONF["label.sizes"][2]
-    for ax in [ax_temp, ax_humid, ax_pressure]:
-        setp(ax.get_xticklabels(), fontsize=dateTickLablesFontSize)
-        setp(ax.get_yticklabels(), fontsize=yTickLabelsFontSize)
-
-    # サブプロットの設定
-    # 1.外気温と室内気温
-    _temperaturePlotting(ax_temp, df, title_date, labelFontSize)
-    # 2.室内湿度
-    _humidPlotting(ax_humid, df, labelFontSize)
-    # 3.気圧
-    if image_params.getImageDateType() == ImageDateType.TODAY:
-        # 当日データx軸の範囲: 当日 00時 から 翌日 00時
-        for ax in [ax_temp, ax_humid, ax_pressure]:
-            ax.set_xlim([x_day_min, x_day_max])
-        # 当日データのx軸フォーマット: 軸ラベルは時間 (00,03,06,09,12,15,18,21,翌日の00)
-        ax_pressure.xaxis.set_major_formatter(mdates.DateFormatter("%H"))
-    elif image_params.getImageDateType() == ImageDateType.YEAR_MONTH:
-        # 年月指定データのx軸フォーマット設定: 軸は"月/日"
-        ax_pressure.xaxis.set_major_formatter(mdates.DateFormatter("%m/%d"))
+        figsize = tuple(PLOT_CONF["figsize"]["pc"])
+
+    # 図のテンプレートにデータを設定して描画する ※描画プロセスプールがあればプロセスで描画する
+    key: TemplateKey = (figsize, image_params.getImageDateType(), before_days)
+    lines: PlotLines = _toPlotLines(df, _plotWidthPixel(s_phone_size))
+    png: bytes
+    if render_pool is not None:
+        png = render_pool.render(key, lines, title_date, xlim)
     else:
-        # 期間データのx軸フォーマット設定
-        _axesPressureSettingWithBeforeDays(
-            ax_pressure, s_start_day, before_days, dateTickLablesFontSize
-        )
-    # 気圧データプロット
-    _pressurePlotting(ax_pressure, df, labelFontSize)
+        png = render_png(key, lines, title_date, xlim)
+    if logger is not None and logger_debug:
+        logger.debug(f"template: {key}")
 
-    # 画像をバイトストリームに溜め込みそれをbase64エンコードしてレスポンスとして返す
-    buf = BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
-    data = base64.b64encode(buf.getbuffer()).decode("ascii")
     if logger is not None and logger_debug:
-        logger.debug(f"data.len: {len(data)}")
-    img_src = "data:image/png;base64," + data
+        logger.debug(f"png.len: {len(png)}")
     # 件数と画像
-    return rec_count, img_src
+    return rec_count, png
+
+
+def png_to_img_src(png: Optional[bytes]) -> Optional[str]:
+    """PNG画像をbase64画像形式文字列に変換する
+    :param png: PNG画像
+    :return: base64画像形式文字列 ('data:image/png;base64,...'), PNG画像がNoneならNone
+    """
+    if png is None:
+        return None
+    return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+
+
+def gen_plot_image(
+        conn: connection, device_name: str, image_params: ImageDateParams, logger=None,
+        today_buffer: Optional[TodayBuffer] = None,
+        render_pool: Optional["RenderPool"] = None
+) -> Tuple[int, Optional[str]]:
+    """気象データ画像をbase64画像形式文字列で取得する ※引数は gen_plot_png と同じ
+    :return: (データ件数, base64画像形式文字列) ※件数0なら画像はNone
+    """
+    rec_count, png = gen_plot_png(conn, device_name, image_params, logger=logger,
+                                  today_buffer=today_buffer, render_pool=render_pool)
+    return rec_count, png_to_img_src(png)
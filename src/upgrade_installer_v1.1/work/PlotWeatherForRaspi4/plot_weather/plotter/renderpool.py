@@ -0,0 +1,56 @@
+import logging
+import multiprocessing
+from multiprocessing.pool import Pool
+from typing import Optional
+
+from .plotterweather import PlotLines, PlotXlim, TemplateKey, render_png, warmup_render
+
+""" 気象データ画像の描画プロセスプール """
+
+# 描画結果の待ち時間(秒) ※超過したらリクエストのスレッドで描画する
+DEFAULT_RENDER_TIMEOUT: float = 30.0
+
+
+class RenderPool:
+    """
+    気象データ画像の描画プロセスプール
+    matplotlibの描画はCPU処理でGILを解放しないため、同時リクエストの描画を複数プロセス(CPUコア)で行う
+    描画プロセスはアプリ起動時(リクエスト処理のスレッド開始前)にforkで生成する
+      ※ spawn/forkserver はアプリケーション(Flask, DB接続プール)を再初期化するため使わない
+    データはNumPy配列をpickleで渡し、PNG画像(bytes)を受け取る
+    """
+    def __init__(self,
+                 processes: int,
+                 timeout: float = DEFAULT_RENDER_TIMEOUT,
+                 logger: Optional[logging.Logger] = None):
+        """
+        :param processes: 描画プロセス数
+        :param timeout: 描画結果の待ち時間(秒)
+        :param logger: アプリケーションロガー
+        """
+        self.processes = processes
+        self.timeout = timeout
+        self.logger = logger
+        context = multiprocessing.get_context("fork")
+        self._pool: Pool = context.Pool(processes, initializer=warmup_render)
+
+    def render(self, key: TemplateKey, lines: PlotLines, title_date: str,
+               xlim: PlotXlim) -> bytes:
+        """
+        描画プロセスでPNG画像を出力する ※引数と戻り値は render_png と同じ
+        描画プロセスの異常時とタイムアウト時はリクエストのスレッドで描画する
+        """
+        try:
+            return self._pool.apply_async(
+                render_png, (key, lines, title_date, xlim)).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            if self.logger is not None:
+                self.logger.warning(f"render timeout: {key}")
+        except Exception as err:
+            if self.logger is not None:
+                self.logger.warning(f"render process error: {err}")
+        return render_png(key, lines, title_date, xlim)
+
+    def close(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
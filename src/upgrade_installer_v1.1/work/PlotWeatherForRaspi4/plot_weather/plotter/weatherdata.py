@@ -0,0 +1,155 @@
+import logging
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from psycopg2.extensions import connection
+
+from ..dao.todaybuffer import TodayBuffer
+from ..dao.weatherdao import WeatherDao
+from ..util.dateutil import (addDayToString, datetimeToJpDateWithWeek,
+                             strDateToDatetimeTime000000, FMT_ISO_8601_DATE)
+from .imageparams import ImageDateParams, ImageDateType, ParamKey
+if TYPE_CHECKING:
+    import pandas as pd
+
+""" 気象データ画像の期間の気象データを取得する ※matplotlib, pandasを読み込まない """
+
+
+def _to_japanese_date(s_date: str) -> str:
+    """
+    ISO8601日付文字列を日本語日付に変換
+    :param s_date: ISO8601日付文字列
+    :return 日本語日付
+    """
+    date_parts: List[str] = s_date.split("-")
+    return f"{date_parts[0]}年{date_parts[1]}月{date_parts[2]}日"
+
+
+def loadTodayDataFrame(
+        dao: WeatherDao, device_name: str, today_iso8601: str,
+        today_buffer: Optional[TodayBuffer] = None,
+        logger: Optional[Optional[logging.Logger]] = None, logger_debug: bool = False
+) -> Tuple[int, Optional["pd.DataFrame"], Optional[str], Optional[datetime], Optional[datetime]]:
+    # dao return DataFrame: "measurement_time"(timestamp) is index and column
+    rec_count: int
+    df: pd.DataFrame
+    if today_buffer is not None:
+        # 当日データバッファ: 前回取得以降のデータのみ検索する
+        rec_count, df = today_buffer.getTodayData(dao, device_name, today_iso8601)
+    else:
+        rec_count, df = dao.getTodayData(device_name, today_iso8601)
+    # 件数なし
+    if rec_count == 0:
+        return rec_count, None, None, None, None
+
+    if logger is not None and logger_debug:
+        logger.debug(f"df:\n{df}")
+        logger.debug(f"df.index:\n{df.index}")
+    if not df.empty:
+        # 先頭の測定日付(Pandas Timestamp) から Pythonのdatetimeに変換
+        # https://pandas.pydata.org/pandas-docs/version/0.22/generated/pandas.Timestamp.to_datetime.html
+        first_datetime = df.index[0].to_pydatetime()
+    else:
+        # No data: Since the broadcast of observation data is every 10 minutes,
+        #          there may be cases where there is no data at the time of execution.
+        first_datetime = datetime.now()
+    # 当日の日付文字列 ※一旦 dateオブジェクトに変換して"年月日"を取得
+    s_first_date: str = first_datetime.date().isoformat()
+    # 表示範囲：当日の "00:00:00" から
+    x_day_min: datetime = strDateToDatetimeTime000000(s_first_date)
+    # 翌日の "00:00:00" 迄
+    s_nextday: str = addDayToString(s_first_date)
+    x_day_max: datetime = strDateToDatetimeTime000000(s_nextday)
+    # タイトル用の日本語日付(曜日)
+    s_title_date: str = datetimeToJpDateWithWeek(first_datetime)
+    return rec_count, df, s_title_date, x_day_min, x_day_max
+
+
+def loadMonthDataFrame(
+        dao: WeatherDao, device_name: str, year_month: str = "",
+        plot_width: Optional[int] = None,
+        logger: Optional[logging.Logger] = None, logger_debug: bool = False
+) -> Tuple[int, Optional["pd.DataFrame"], Optional[str]]:
+    rec_count: int
+    df: pd.DataFrame
+    rec_count, df = dao.getMonthData(device_name, year_month, plot_width=plot_width)
+    # 件数なし
+    if rec_count == 0:
+        return rec_count, None, None
+
+    if logger is not None and logger_debug:
+        logger.debug(df)
+
+    # タイトル用の日本語日付(曜日)
+    date_parts: List[str] = year_month.split("-")
+    s_title_date = f"{date_parts[0]}年{date_parts[1]}月"
+    return rec_count, df, s_title_date
+
+
+def loadBeforeDaysRangeDataFrame(
+        dao: WeatherDao, device_name: str,
+        s_start_day: str,
+        before_days: int,
+        plot_width: Optional[int] = None,
+        logger: Optional[logging.Logger] = None, logger_debug: bool = False
+) -> Tuple[int, Optional["pd.DataFrame"], Optional[str]]:
+    start_day: datetime = datetime.strptime(s_start_day, FMT_ISO_8601_DATE)
+    from_date_val: datetime = start_day - timedelta(days=before_days)
+    s_from_date: str = from_date_val.strftime(FMT_ISO_8601_DATE)
+    s_to_date: str = start_day.strftime(FMT_ISO_8601_DATE)
+    if logger is not None and logger_debug:
+        logger.debug(f"from_date: {s_from_date}, to_date: {s_from_date}")
+    rec_count: int
+    df: pd.DataFrame
+    rec_count, df = dao.getFromToRangeData(
+        device_name, s_from_date, s_to_date, plot_width=plot_width)
+    # 件数なし
+    if rec_count == 0:
+        return rec_count, None, None
+
+    if logger is not None and logger_debug:
+        logger.debug(df)
+
+    # タイトル用の日本語日付: from_date 〜 to_date
+    s_from_date = _to_japanese_date(s_from_date)
+    s_to_date = _to_japanese_date(s_to_date)
+    s_title_date: str = f"{s_from_date} 〜 {s_to_date}"
+    return rec_count, df, s_title_date
+
+
+def load_weather_data(
+        conn: connection, device_name: str, image_params: ImageDateParams, logger=None,
+        today_buffer: Optional[TodayBuffer] = None
+) -> Tuple[int, Optional["pd.DataFrame"]]:
+    """画像と同じ期間の気象データを取得する (クライアント描画用) ※集計テーブルは使わない
+    :param conn: 読み込み専用DBコネクション
+    :param device_name: 観測デバイス名
+    :param image_params: 画像パラメータ ※PHONE_SIZEは使わない
+    :param logger: アプリケーションロガー
+    :param today_buffer: 当日データバッファ
+    :return: (データ件数, 気象データのDataFrame) ※件数0ならDataFrameはNone
+    """
+    if logger is not None:
+        logger_debug = (logger.getEffectiveLevel() <= logging.DEBUG)
+    else:
+        logger_debug = False
+
+    dao = WeatherDao(conn, logger=logger)
+    param: Dict[ParamKey, str] = image_params.getParam()
+    if image_params.getImageDateType() == ImageDateType.TODAY:
+        rec_count, df, _, _, _ = loadTodayDataFrame(
+            dao, device_name, param.get(ParamKey.TODAY, ""), today_buffer=today_buffer,
+            logger=logger, logger_debug=logger_debug
+        )
+    elif image_params.getImageDateType() == ImageDateType.YEAR_MONTH:
+        rec_count, df, _ = loadMonthDataFrame(
+            dao, device_name, year_month=param.get(ParamKey.YEAR_MONTH, ""),
+            logger=logger, logger_debug=logger_debug
+        )
+    else:
+        rec_count, df, _ = loadBeforeDaysRangeDataFrame(
+            dao, device_name, param.get(ParamKey.START_DAY, ""),
+            int(param.get(ParamKey.BEFORE_DAYS, "")),
+            logger=logger, logger_debug=logger_debug
+        )
+    return rec_count, df
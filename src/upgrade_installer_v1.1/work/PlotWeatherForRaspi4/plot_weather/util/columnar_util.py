@@ -0,0 +1,105 @@
+import struct
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+""" 気象データの列形式変換ユーティリティ (クライアント描画用データ) """
+
+try:
+    # Prerequisites: pip install pyarrow ※ラズパイ(32bit)はwheelがないため任意
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# 測定値の列
+VALUE_COLUMNS: List[str] = ["temp_out", "temp_in", "humid", "pressure"]
+
+# リクエストパラメータ format の値
+FORMAT_JSON: str = "json"
+FORMAT_BINARY: str = "bin"
+FORMAT_ARROW: str = "arrow"
+FORMATS: List[str] = [FORMAT_JSON, FORMAT_BINARY, FORMAT_ARROW]
+MIMETYPES: Dict[str, str] = {
+    FORMAT_JSON: "application/json",
+    FORMAT_BINARY: "application/octet-stream",
+    FORMAT_ARROW: "application/vnd.apache.arrow.stream",
+}
+
+# バイナリ形式 (リトルエンディアン)
+#  ヘッダー: シグネチャ(4) + バージョン(uint16) + 測定値の列数(uint16) + 件数(uint32)
+#            + 先頭の測定時刻(int64: 1970-01-01 00:00:00 からの秒, ローカル時刻)
+#  測定時刻: 前の測定時刻からの秒数(int32) x 件数 ※先頭は0
+#  測定値: 列毎に float32 x 件数 (VALUE_COLUMNSの順, 欠測はNaN)
+BINARY_SIGNATURE: bytes = b"WCOL"
+BINARY_VERSION: int = 1
+_BINARY_HEADER: struct.Struct = struct.Struct("<4sHHIq")
+# JSON形式の測定値の小数桁数 ※センサーの精度は小数1桁
+JSON_DECIMALS: int = 2
+
+
+def _timeSeconds(df: pd.DataFrame) -> np.ndarray:
+    """ 測定時刻(インデックス)を 1970-01-01 00:00:00 からの秒に変換する ※タイムゾーンなし """
+    return df.index.to_numpy().astype("datetime64[s]").astype(np.int64)
+
+
+def _timeDeltas(seconds: np.ndarray) -> np.ndarray:
+    """ 前の測定時刻からの秒数 ※先頭は0 """
+    return np.diff(seconds, prepend=seconds[:1]).astype("<i4")
+
+
+def to_binary(df: pd.DataFrame) -> bytes:
+    """
+    気象データをバイナリ形式に変換する
+    :param df: 気象データ (測定時刻インデックス)
+    :return: バイナリ形式データ
+    """
+    seconds: np.ndarray = _timeSeconds(df)
+    base_time: int = int(seconds[0]) if len(seconds) > 0 else 0
+    parts: List[bytes] = [
+        _BINARY_HEADER.pack(BINARY_SIGNATURE, BINARY_VERSION, len(VALUE_COLUMNS), len(df), base_time),
+        _timeDeltas(seconds).tobytes(),
+    ]
+    for name in VALUE_COLUMNS:
+        parts.append(df[name].to_numpy(dtype="<f4").tobytes())
+    return b"".join(parts)
+
+
+def to_json_dict(df: pd.DataFrame) -> Dict[str, Union[str, List]]:
+    """
+    気象データをJSON形式の辞書オブジェクトに変換する
+    :param df: 気象データ (測定時刻インデックス)
+    :return: {"base_time": 先頭の測定時刻(ISO8601), "time_delta": [前の測定時刻からの秒数],
+              "temp_out": [...], ...} ※欠測はnull
+    """
+    seconds: np.ndarray = _timeSeconds(df)
+    result: Dict[str, Union[str, List]] = {
+        "base_time": df.index[0].isoformat() if len(df) > 0 else "",
+        "time_delta": _timeDeltas(seconds).tolist(),
+    }
+    for name in VALUE_COLUMNS:
+        values: np.ndarray = df[name].to_numpy(dtype=np.float64).round(JSON_DECIMALS)
+        items: np.ndarray = values.astype(object)
+        items[np.isnan(values)] = None
+        result[name] = items.tolist()
+    return result
+
+
+def to_arrow_ipc(df: pd.DataFrame) -> Optional[bytes]:
+    """
+    気象データをArrow IPC(ストリーム)形式に変換する
+    :param df: 気象データ (測定時刻インデックス)
+    :return: Arrow IPC形式データ, pyarrow がなければ None
+    """
+    if pyarrow is None:
+        return None
+
+    arrays: List = [pyarrow.array(df.index.to_numpy().astype("datetime64[s]"))]
+    arrays.extend(pyarrow.array(df[name].to_numpy(dtype=np.float32), from_pandas=True)
+                  for name in VALUE_COLUMNS)
+    table = pyarrow.Table.from_arrays(arrays, names=[df.index.name] + VALUE_COLUMNS)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -1,3 +1,8 @@
+import dataclasses
+import gzip
+import hashlib
+import json
+import zlib
 from datetime import date
 from typing import Dict, List, Optional, Tuple, Union
 
@@ -7,19 +12,22 @@ from flask import (
 from werkzeug.exceptions import (
     BadRequest, Forbidden, HTTPException, InternalServerError, NotFound
     )
-from plot_weather import (BAD_REQUEST_IMAGE_DATA,
-                          INTERNAL_SERVER_ERROR_IMAGE_DATA, DebugOutRequest,
-                          app, app_logger, app_logger_debug)
+from plot_weather import (BAD_REQUEST_IMAGE_FILE,
+                          INTERNAL_SERVER_ERROR_IMAGE_FILE, DebugOutRequest,
+                          app, app_logger, app_logger_debug, error_image_data)
 from plot_weather.dao.weathercommon import WEATHER_CONF
 from plot_weather.dao.weatherdao import WeatherDao
 from plot_weather.dao.devicedao import DeviceDao, DeviceRecord
+from plot_weather.dao.deviceregistry import DeviceRegistry
 from plot_weather.db.sqlite3conv import DateFormatError, strdate2timestamp
-from plot_weather.plotter.plotterweather import (
-    ImageDateType, gen_plot_image, ImageDateParams, ParamKey
+from plot_weather.plotter.imageparams import ImageDateType, ImageDateParams, ParamKey
+from plot_weather.plotter.weatherdata import load_weather_data
+from plot_weather.plotter.plotcache import (
+    WATERMARK_CLOSED, PlotValidator, gen_plot_image_cached, gen_plot_png_cached, plot_validator
 )
 from werkzeug.datastructures import Headers, MultiDict
 import psycopg2
-from psycopg2.pool import SimpleConnectionPool
+from plot_weather.db.connpool import BlockingConnectionPool
 from psycopg2.extensions import connection
 import plot_weather.util.dateutil as date_util
 
@@ -41,6 +49,7 @@ PARAM_DEVICE: str = "device_name"
 PARAM_START_DAY: str = "start_day"
 PARAM_BOFORE_DAYS: str = "before_days"
 PARAM_YEAR_MONTH: str = "year_month"
+PARAM_FORMAT: str = "format"
 # リクエストパラメータエラー時のコード: 421番台以降
 # デバイス名: 必須, 長さチェック (1-20byte), 未登録
 DEVICE_LENGTH: int = 20
@@ -59,6 +68,17 @@ INVALID_BOFORE_DAY: str = f"434,{PARAM_BOFORE_DAYS} {MSG_INVALID}"
 #   年月: 必須, 形式(YYYY-mm), 7文字一致
 REQUIRED_YEAR_MONTH: str = f"435,{PARAM_YEAR_MONTH} {MSG_REQUIRED}"
 INVALID_YEAR_MONTH: str = f"436,{PARAM_YEAR_MONTH} {MSG_INVALID}"
+# 気象データ取得リクエスト
+#   データ形式: 任意(json|bin|arrow) ※未指定ならjson, arrowはpyarrowがある場合のみ
+INVALID_FORMAT: str = f"437,{PARAM_FORMAT} {MSG_INVALID}"
+
+# PNG画像レスポンスのデータ件数ヘッダー
+HEADER_RECORD_COUNT: str = "X-Record-Count"
+# 終了した期間のPNG画像をブラウザ(端末)にキャッシュさせる秒数
+PNG_CLOSED_MAX_AGE: int = 86400
+# 気象データレスポンスの圧縮形式 (優先順) ※圧縮レベルは速度優先
+DATA_CONTENT_ENCODINGS: List[str] = ["gzip", "deflate"]
+DATA_COMPRESS_LEVEL: int = 6
 
 # エラーメッセージを格納する辞書オブジェクト定義
 MSG_DESCRIPTION: str = "error_message"
@@ -70,9 +90,9 @@ ABORT_DICT_BLANK_MESSAGE: Dict[str, str] = {MSG_DESCRIPTION: ""}
 
 def get_connection() -> connection:
     if 'db' not in g:
-        conn_pool: SimpleConnectionPool = app.config["postgreSQL_pool"]
+        conn_pool: BlockingConnectionPool = app.config["postgreSQL_pool"]
+        # 空き接続がなければ待つ, セッションは設定済み
         g.db: connection = conn_pool.getconn()
-        g.db.set_session(readonly=True, autocommit=True)
         if app_logger_debug:
             app_logger.debug(f"g.db:{g.db}")
     return g.db
@@ -115,8 +135,10 @@ def index() -> str:
         # データ件数, base64画像形式文字列
         rec_count: int
         img_base64_encoded: str
-        rec_count, img_base64_encoded = gen_plot_image(
-            conn, default_device_name, image_date_params, logger=app_logger
+        rec_count, img_base64_encoded = gen_plot_image_cached(
+            app.config["plot_cache"], conn, default_device_name, image_date_params,
+            logger=app_logger, today_buffer=app.config["today_buffer"],
+            render_pool=app.config["render_pool"]
         )
     except Exception as exp:
         app_logger.error(exp)
@@ -162,8 +184,10 @@ def getTodayImage() -> Response:
         # データ件数, base64画像形式文字列
         rec_count: int
         img_base64_encoded: str
-        rec_count, img_base64_encoded = gen_plot_image(
-            conn, default_device_name, image_date_params, logger=app_logger
+        rec_count, img_base64_encoded = gen_plot_image_cached(
+            app.config["plot_cache"], conn, default_device_name, image_date_params,
+            logger=app_logger, today_buffer=app.config["today_buffer"],
+            render_pool=app.config["render_pool"]
         )
     except psycopg2.Error as db_err:
         app_logger.error(db_err)
@@ -201,8 +225,10 @@ def getMonthImage(yearmonth) -> Response:
         # データ件数, base64画像形式文字列
         rec_count: int
         img_base64_encoded: str
-        rec_count, img_base64_encoded = gen_plot_image(
-            conn, default_device_name, image_date_params, logger=app_logger
+        rec_count, img_base64_encoded = gen_plot_image_cached(
+            app.config["plot_cache"], conn, default_device_name, image_date_params,
+            logger=app_logger, today_buffer=app.config["today_buffer"],
+            render_pool=app.config["render_pool"]
         )
     except DateFormatError as dfe:
         # BAD Request
@@ -343,8 +369,10 @@ def getTodayImageForPhone() -> Response:
         image_date_params.setParam(param)
         rec_count: int
         img_base64_encoded: str
-        rec_count, img_base64_encoded = gen_plot_image(
-            conn, param_device_name, image_date_params, logger=app_logger
+        rec_count, img_base64_encoded = gen_plot_image_cached(
+            app.config["plot_cache"], conn, param_device_name, image_date_params,
+            logger=app_logger, today_buffer=app.config["today_buffer"],
+            render_pool=app.config["render_pool"]
         )
         return _responseImageForPhone(rec_count, img_base64_encoded)
     except psycopg2.Error as db_err:
@@ -400,8 +428,10 @@ def getBeforeDateImageForPhone() -> Response:
         image_date_params.setParam(param)
         rec_count: int
         img_base64_encoded: str
-        rec_count, img_base64_encoded = gen_plot_image(
-            conn, param_device_name, image_date_params, logger=app_logger
+        rec_count, img_base64_encoded = gen_plot_image_cached(
+            app.config["plot_cache"], conn, param_device_name, image_date_params,
+            logger=app_logger, today_buffer=app.config["today_buffer"],
+            render_pool=app.config["render_pool"]
         )
         return _responseImageForPhone(rec_count,img_base64_encoded)
     except psycopg2.Error as db_err:
@@ -412,6 +442,274 @@ def getBeforeDateImageForPhone() -> Response:
         abort(InternalServerError.code, description=str(exp))
 
 
+@app.route("/plot_weather/gettodaypng", methods=["GET"])
+def getTodayPng() -> Response:
+    """本日データ画像取得リクエスト (PNG画像)
+
+    :return: PNG画像 (image/png), 画像が更新されていなければ 304
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+    try:
+        conn: connection = get_connection()
+        s_today = date.today().strftime('%Y-%m-%d')
+        image_date_params = ImageDateParams(ImageDateType.TODAY)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.TODAY] = s_today
+        image_date_params.setParam(param)
+        default_device_name: str = WEATHER_CONF["DEVICE_NAME"]
+        return _createPngResponse(conn, default_device_name, image_date_params)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
+@app.route("/plot_weather/getmonthpng/<yearmonth>", methods=["GET"])
+def getMonthPng(yearmonth) -> Response:
+    """要求された年月の月間データ画像取得 (PNG画像)
+
+    :param yearmonth str: 年月 (例) 2022-01
+    :return: PNG画像 (image/png), 画像が更新されていなければ 304
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+    try:
+        # 日付チェック(YYYY-mm-dd): 日付不正の場合例外スロー
+        strdate2timestamp(yearmonth + "-01", raise_error=True)
+    except DateFormatError as dfe:
+        app_logger.warning(dfe)
+        abort(BadRequest.code, _set_errormessage(INVALID_YEAR_MONTH))
+
+    try:
+        conn: connection = get_connection()
+        default_device_name: str = WEATHER_CONF["DEVICE_NAME"]
+        image_date_params = ImageDateParams(ImageDateType.YEAR_MONTH)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.YEAR_MONTH] = yearmonth
+        image_date_params.setParam(param)
+        return _createPngResponse(conn, default_device_name, image_date_params)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
+@app.route("/plot_weather/gettodaypngforphone", methods=["GET"])
+def getTodayPngForPhone() -> Response:
+    """本日データ画像取得リクエスト (スマートホン専用, PNG画像)
+       リクエストは gettodayimageforphone と同じ
+
+    :param: request parameter: device_name="xxxxx"
+    :return: PNG画像 (image/png), データ件数はヘッダー(X-Record-Count)
+         画像が更新されていなければ 304, データ件数0なら 204
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+        _debugOutRequestObj(request, debugout=DebugOutRequest.HEADERS)
+
+    headers: Headers = request.headers
+    if not _matchToken(headers):
+        abort(Forbidden.code, ABORT_DICT_UNMATCH_TOKEN)
+
+    param_device_name: str = _checkDeviceName(request.args)
+    str_img_size: str = _checkPhoneImageSize(headers)
+    try:
+        conn: connection = get_connection()
+        s_today = date.today().strftime('%Y-%m-%d')
+        image_date_params = ImageDateParams(ImageDateType.TODAY)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.TODAY] = s_today
+        param[ParamKey.PHONE_SIZE] = str_img_size
+        image_date_params.setParam(param)
+        return _createPngResponse(conn, param_device_name, image_date_params)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
+@app.route("/plot_weather/getbeforedayspngforphone", methods=["GET"])
+def getBeforeDatePngForPhone() -> Response:
+    """過去経過日指定データ画像取得リクエスト (スマートホン専用, PNG画像)
+       リクエストは getbeforedaysimageforphone と同じ
+
+    :param: request parameter: ?device_name=xxxxx&start_day=2023-05-01&before_days=(2|3|7)
+    :return: PNG画像 (image/png), データ件数はヘッダー(X-Record-Count)
+         画像が更新されていなければ 304, データ件数0なら 204
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+        _debugOutRequestObj(request, debugout=DebugOutRequest.BOTH)
+
+    headers = request.headers
+    if not _matchToken(headers):
+        abort(Forbidden.code, ABORT_DICT_UNMATCH_TOKEN)
+
+    param_device_name: str = _checkDeviceName(request.args)
+    str_start_day: Optional[str] = _checkStartDay(request.args)
+    if str_start_day is None:
+        str_start_day = date_util.getTodayIsoDate()
+    str_before_days: str = _checkBeforeDays(request.args)
+    str_img_size: str = _checkPhoneImageSize(headers)
+    try:
+        conn: connection = get_connection()
+        image_date_params = ImageDateParams(ImageDateType.RANGE)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.START_DAY] = str_start_day
+        param[ParamKey.BEFORE_DAYS] = str_before_days
+        param[ParamKey.PHONE_SIZE] = str_img_size
+        image_date_params.setParam(param)
+        return _createPngResponse(conn, param_device_name, image_date_params)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
+@app.route("/plot_weather/gettodaydata", methods=["GET"])
+def getTodayData() -> Response:
+    """本日データ取得リクエスト (クライアント描画用の気象データ)
+
+    :param: request parameter: format=(json|bin|arrow) ※任意
+    :return: 列形式の気象データ, データ件数はヘッダー(X-Record-Count)
+         データが更新されていなければ 304, データ件数0なら 204
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+    data_format: str = _checkFormat(request.args)
+    try:
+        conn: connection = get_connection()
+        s_today = date.today().strftime('%Y-%m-%d')
+        image_date_params = ImageDateParams(ImageDateType.TODAY)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.TODAY] = s_today
+        image_date_params.setParam(param)
+        default_device_name: str = WEATHER_CONF["DEVICE_NAME"]
+        return _createDataResponse(conn, default_device_name, image_date_params, data_format)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
+@app.route("/plot_weather/getmonthdata/<yearmonth>", methods=["GET"])
+def getMonthData(yearmonth) -> Response:
+    """要求された年月の月間データ取得 (クライアント描画用の気象データ)
+
+    :param yearmonth str: 年月 (例) 2022-01
+    :param: request parameter: format=(json|bin|arrow) ※任意
+    :return: 列形式の気象データ, データ件数はヘッダー(X-Record-Count)
+         データが更新されていなければ 304, データ件数0なら 204
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+    try:
+        strdate2timestamp(yearmonth + "-01", raise_error=True)
+    except DateFormatError as dfe:
+        app_logger.warning(dfe)
+        abort(BadRequest.code, _set_errormessage(INVALID_YEAR_MONTH))
+
+    data_format: str = _checkFormat(request.args)
+    try:
+        conn: connection = get_connection()
+        default_device_name: str = WEATHER_CONF["DEVICE_NAME"]
+        image_date_params = ImageDateParams(ImageDateType.YEAR_MONTH)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.YEAR_MONTH] = yearmonth
+        image_date_params.setParam(param)
+        return _createDataResponse(conn, default_device_name, image_date_params, data_format)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
+@app.route("/plot_weather/gettodaydataforphone", methods=["GET"])
+def getTodayDataForPhone() -> Response:
+    """本日データ取得リクエスト (スマートホン専用, クライアント描画用の気象データ)
+
+    :param: request parameter: device_name="xxxxx", format=(json|bin|arrow) ※formatは任意
+    :return: 列形式の気象データ, データ件数はヘッダー(X-Record-Count)
+         データが更新されていなければ 304, データ件数0なら 204
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+        _debugOutRequestObj(request, debugout=DebugOutRequest.BOTH)
+
+    headers: Headers = request.headers
+    if not _matchToken(headers):
+        abort(Forbidden.code, ABORT_DICT_UNMATCH_TOKEN)
+
+    param_device_name: str = _checkDeviceName(request.args)
+    data_format: str = _checkFormat(request.args)
+    try:
+        conn: connection = get_connection()
+        s_today = date.today().strftime('%Y-%m-%d')
+        image_date_params = ImageDateParams(ImageDateType.TODAY)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.TODAY] = s_today
+        image_date_params.setParam(param)
+        return _createDataResponse(conn, param_device_name, image_date_params, data_format)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
+@app.route("/plot_weather/getbeforedaysdataforphone", methods=["GET"])
+def getBeforeDateDataForPhone() -> Response:
+    """過去経過日指定データ取得リクエスト (スマートホン専用, クライアント描画用の気象データ)
+
+    :param: request parameter: ?device_name=xxxxx&start_day=2023-05-01&before_days=(2|3|7)
+                                &format=(json|bin|arrow) ※formatは任意
+    :return: 列形式の気象データ, データ件数はヘッダー(X-Record-Count)
+         データが更新されていなければ 304, データ件数0なら 204
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+        _debugOutRequestObj(request, debugout=DebugOutRequest.BOTH)
+
+    headers = request.headers
+    if not _matchToken(headers):
+        abort(Forbidden.code, ABORT_DICT_UNMATCH_TOKEN)
+
+    param_device_name: str = _checkDeviceName(request.args)
+    str_start_day: Optional[str] = _checkStartDay(request.args)
+    if str_start_day is None:
+        str_start_day = date_util.getTodayIsoDate()
+    str_before_days: str = _checkBeforeDays(request.args)
+    data_format: str = _checkFormat(request.args)
+    try:
+        conn: connection = get_connection()
+        image_date_params = ImageDateParams(ImageDateType.RANGE)
+        param: Dict[ParamKey, str] = image_date_params.getParam()
+        param[ParamKey.START_DAY] = str_start_day
+        param[ParamKey.BEFORE_DAYS] = str_before_days
+        image_date_params.setParam(param)
+        return _createDataResponse(conn, param_device_name, image_date_params, data_format)
+    except psycopg2.Error as db_err:
+        app_logger.error(db_err)
+        abort(InternalServerError.code, _set_errormessage(f"559,{db_err}"))
+    except Exception as exp:
+        app_logger.error(exp)
+        abort(InternalServerError.code, description=str(exp))
+
+
 @app.route("/plot_weather/get_devices", methods=["GET"])
 def getDevices() -> Response:
     """センサーディバイスリスト取得リクエスト
@@ -425,6 +723,12 @@ def getDevices() -> Response:
     devices_with_dict: List[Dict]
     try:
         conn: connection = get_connection()
+        device_registry: Optional[DeviceRegistry] = app.config["device_registry"]
+        if device_registry is not None:
+            # 共有のデバイス一覧から生成済みのJSON
+            return Response(device_registry.getDevicesJson(conn), status=200,
+                            content_type="application/json")
+
         dao: DeviceDao = DeviceDao(conn, logger=app_logger)
         devices: List[DeviceRecord] = dao.get_devices()
         devices_with_dict = DeviceDao.to_dict_without_id(devices)
@@ -441,6 +745,26 @@ def getDevices() -> Response:
         abort(InternalServerError.code, description=str(exp))
 
 
+@app.route("/plot_weather/getpoolstats", methods=["GET"])
+def getPoolStats() -> Response:
+    """DB接続プールの統計情報取得リクエスト (トークン必須)
+
+    :return: JSON形式 (出力内容) JSON({"data":{"db_pool":{"in_use":..,"waits":..,...}}})
+    """
+    if app_logger_debug:
+        app_logger.debug(request.path)
+
+    if not _matchToken(request.headers):
+        abort(Forbidden.code, ABORT_DICT_UNMATCH_TOKEN)
+
+    conn_pool: BlockingConnectionPool = app.config["postgreSQL_pool"]
+    resp_obj: Dict[str, Dict] = {
+        "data": {"db_pool": conn_pool.stats()},
+        "status": {"code": 0, "message": "OK"}
+    }
+    return _make_respose(resp_obj, 200)
+
+
 def _debugOutRequestObj(request, debugout=DebugOutRequest.ARGS) -> None:
     if debugout == DebugOutRequest.ARGS or debugout == DebugOutRequest.BOTH:
         app_logger.debug(f"reqeust.args: {request.args}")
@@ -533,8 +857,12 @@ def _checkDeviceName(args: MultiDict) -> str:
     exists: bool = False
     try:
         conn: connection = get_connection()
-        dao: DeviceDao = DeviceDao(conn, logger=app_logger)
-        exists = dao.exists(param_device_name)
+        device_registry: Optional[DeviceRegistry] = app.config["device_registry"]
+        if device_registry is not None:
+            exists = device_registry.exists(conn, param_device_name)
+        else:
+            dao: DeviceDao = DeviceDao(conn, logger=app_logger)
+            exists = dao.exists(param_device_name)
     except Exception as exp:
         app_logger.error(exp)
         abort(InternalServerError.code, description=str(exp))
@@ -545,6 +873,22 @@ def _checkDeviceName(args: MultiDict) -> str:
         abort(BadRequest.code, _set_errormessage(DEVICE_NOT_FOUND))
 
 
+def _checkFormat(args: MultiDict) -> str:
+    """データ形式チェック
+        パラメータなし: json
+        不正な形式 (pyarrowがない場合のarrowを含む): abort(BadRequest)
+    return データ形式
+    """
+    # numpy, pandas, pyarrow は最初のデータ取得リクエストで読み込む (アプリ起動時間の短縮)
+    import plot_weather.util.columnar_util as columnar_util
+
+    data_format: str = args.get(PARAM_FORMAT, default=columnar_util.FORMAT_JSON, type=str)
+    if data_format not in columnar_util.FORMATS or \
+            (data_format == columnar_util.FORMAT_ARROW and columnar_util.pyarrow is None):
+        abort(BadRequest.code, _set_errormessage(INVALID_FORMAT))
+    return data_format
+
+
 def _checkStartDay(args: MultiDict) -> Optional[str]:
     """検索開始日の形式チェック
         パラメータなし: OK
@@ -572,13 +916,122 @@ def _createImageResponse(img_src: str) -> Response:
     return _make_respose(resp_obj, 200)
 
 
+def _isNotModified(validator: PlotValidator) -> bool:
+    """条件付きリクエストの画像が更新されていないか
+       If-None-Match があれば ETag, なければ If-Modified-Since と Last-Modified で判定する
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(validator.etag)
+    if request.if_modified_since is not None and validator.last_modified is not None:
+        return validator.last_modified <= request.if_modified_since
+    return False
+
+
+def _setValidatorHeaders(response: Response, validator: PlotValidator) -> None:
+    """ETag, Last-Modified, Cache-Control を設定する
+       終了した期間の画像は一定時間キャッシュさせ、それ以外は毎回再検証させる
+    """
+    response.set_etag(validator.etag)
+    if validator.last_modified is not None:
+        response.last_modified = validator.last_modified
+    if validator.watermark == WATERMARK_CLOSED:
+        response.cache_control.max_age = PNG_CLOSED_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+
+
+def _createPngResponse(conn: connection, device_name: str,
+                       image_date_params: ImageDateParams) -> Response:
+    """PNG画像レスポンスを返却する
+       画像が更新されていなければ画像を生成せずに 304, データ件数0なら 204 を返却する
+    """
+    validator: PlotValidator = plot_validator(
+        conn, device_name, image_date_params, logger=app_logger)
+    if _isNotModified(validator):
+        response = Response(status=304)
+        _setValidatorHeaders(response, validator)
+        return response
+
+    rec_count: int
+    png: Optional[bytes]
+    rec_count, png = gen_plot_png_cached(
+        app.config["plot_cache"], conn, device_name, image_date_params,
+        logger=app_logger, today_buffer=app.config["today_buffer"],
+        render_pool=app.config["render_pool"], validator=validator
+    )
+    if rec_count == 0:
+        response = Response(status=204)
+    else:
+        response = Response(png, mimetype="image/png")
+        _setValidatorHeaders(response, validator)
+    response.headers[HEADER_RECORD_COUNT] = str(rec_count)
+    return response
+
+
+def _createDataResponse(conn: connection, device_name: str,
+                        image_date_params: ImageDateParams, data_format: str) -> Response:
+    """列形式の気象データレスポンスを返却する
+       クライアントが受け付ける場合は圧縮する (gzip, deflate)
+       データが更新されていなければデータを取得せずに 304, データ件数0なら 204 を返却する
+    """
+    import plot_weather.util.columnar_util as columnar_util
+
+    encoding: Optional[str] = request.accept_encodings.best_match(DATA_CONTENT_ENCODINGS)
+    validator: PlotValidator = plot_validator(
+        conn, device_name, image_date_params, logger=app_logger)
+    # ETag: 画像と区別するためデータ形式と圧縮形式を含める
+    validator = dataclasses.replace(validator, etag=hashlib.sha1(
+        f"{validator.etag}|{data_format}|{encoding}".encode("utf-8")).hexdigest())
+    if _isNotModified(validator):
+        response = Response(status=304)
+        _setValidatorHeaders(response, validator)
+        response.vary.add("Accept-Encoding")
+        return response
+
+    rec_count, df = load_weather_data(
+        conn, device_name, image_date_params, logger=app_logger,
+        today_buffer=app.config["today_buffer"]
+    )
+    if rec_count == 0:
+        response = Response(status=204)
+        response.headers[HEADER_RECORD_COUNT] = str(rec_count)
+        return response
+
+    body: bytes
+    if data_format == columnar_util.FORMAT_BINARY:
+        body = columnar_util.to_binary(df)
+    elif data_format == columnar_util.FORMAT_ARROW:
+        # pyarrow がなければ _checkFormat で arrow を受け付けない
+        arrow_body: Optional[bytes] = columnar_util.to_arrow_ipc(df)
+        assert arrow_body is not None
+        body = arrow_body
+    else:
+        resp_obj: Dict = {
+            "status": {"code": 0, "message": "OK"},
+            "data": dict(columnar_util.to_json_dict(df), rec_count=rec_count)
+        }
+        body = json.dumps(resp_obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if encoding == "gzip":
+        body = gzip.compress(body, compresslevel=DATA_COMPRESS_LEVEL)
+    elif encoding == "deflate":
+        body = zlib.compress(body, DATA_COMPRESS_LEVEL)
+
+    response = Response(body, mimetype=columnar_util.MIMETYPES[data_format])
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    _setValidatorHeaders(response, validator)
+    response.headers[HEADER_RECORD_COUNT] = str(rec_count)
+    return response
+
+
 def _createErrorImageResponse(err_code) -> Response:
     """エラー画像レスポンスを返却する (JavaScript用)"""
     resp_obj = {"status": "error", "code": err_code}
     if err_code == BadRequest.code:
-        resp_obj["data"] = {"img_src": BAD_REQUEST_IMAGE_DATA}
+        resp_obj["data"] = {"img_src": error_image_data(BAD_REQUEST_IMAGE_FILE)}
     elif err_code == InternalServerError.code:
-        resp_obj["data"] = {"img_src": INTERNAL_SERVER_ERROR_IMAGE_DATA}
+        resp_obj["data"] = {"img_src": error_image_data(INTERNAL_SERVER_ERROR_IMAGE_FILE)}
     return _make_respose(resp_obj, err_code)
 
 
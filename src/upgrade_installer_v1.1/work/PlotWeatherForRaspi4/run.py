@@ -1,18 +1,50 @@
-import os
-
-from plot_weather import app, app_logger
-
 """
 This module load after app(==__init__.py)
 """
+import time
+STARTED: float = time.monotonic()
+import os
+import socket
+from typing import Optional
+
+# 接続待ちキューの長さ (waitressのデフォルトと同じ)
+LISTEN_BACKLOG: int = 1024
+
+
+def _bindProdSocket() -> Optional[socket.socket]:
+    """
+    本番モードの待ち受けソケットをアプリの読み込み前に作成する
+    アプリの読み込み中(OS起動直後は数秒)の接続は拒否せずに待たせる
+    ※ホストとポートは plot_weather.SERVER_HOST と同じ環境変数から決める
+    :return: 待ち受けソケット, 作成できない場合は None (waitressが作成する)
+    """
+    host: str = os.environ.get("IP_HOST", "localhost")
+    port: int = int(os.environ.get("FLASK_PROD_PORT", "8080"))
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(LISTEN_BACKLOG)
+        return sock
+    except OSError:
+        return None
+
+
+has_prod = os.environ.get("FLASK_ENV") == "production"
+prod_sock: Optional[socket.socket] = _bindProdSocket() if has_prod and __name__ == "__main__" else None
+bound_ms: float = (time.monotonic() - STARTED) * 1000
+
+from plot_weather import app, app_logger, start_prewarm
 
 if __name__ == "__main__":
-    has_prod = os.environ.get("FLASK_ENV") == "production"
     # app config SERVER_NAME
     srv_host = app.config["SERVER_NAME"]
     srv_hosts = srv_host.split(":")
     host, port = srv_hosts[0], srv_hosts[1]
     app_logger.info("run.py in host: {}, port: {}".format(host, port))
+    app_logger.info(f"startup: listen {f'{bound_ms:.0f} ms' if prod_sock is not None else '-'}"
+                    f", app loaded {(time.monotonic() - STARTED) * 1000:.0f} ms")
+    start_prewarm(STARTED)
     if has_prod:
         # Production mode
         try:
@@ -20,11 +52,16 @@ if __name__ == "__main__":
             from waitress import serve
 
             app_logger.info("Production start.")
-            # console log for Reqeust suppress: _quiet=True  
-            serve(app, host=host, port=port, _quiet=True)
+            # console log for Reqeust suppress: _quiet=True
+            if prod_sock is not None:
+                serve(app, sockets=[prod_sock], _quiet=True)
+            else:
+                serve(app, host=host, port=port, _quiet=True)
         except ImportError:
             # Production with flask,debug False
             app_logger.info("Development start, without debug.")
+            if prod_sock is not None:
+                prod_sock.close()
             app.run(host=host, port=port, debug=False)
     else:
         # Development mode